@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Run benchmarks on a synthetic schedule and store results as JSON
+
+Usage:
+    $ python3 -m benchmarks -output results.json -flights-per-day 400
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+from argparse import ArgumentParser
+from kiwiflights import __version__ as kiwiflights_version, System
+from . import generator
+from .suite import BENCHMARKS, bench_load, bench_throughput, bench_memory, bench_serialization
+
+
+def run(path, benchmarks, engine=None, jobs=None):
+    """Run benchmarks on a schedule
+
+    :param path: path to CSV schedule
+    :param benchmarks: names of benchmarks to run, see suite.BENCHMARKS
+    :param engine: search engine to be used, see System.get_engines()
+    :param jobs: number of worker processes to search in
+    :return: results of benchmarks keyed by benchmark name
+    :rtype: dict
+    """
+    ret = {}
+
+    for name in benchmarks:
+        if name == 'load':
+            ret[name] = bench_load(path)
+        elif name == 'throughput':
+            ret[name] = bench_throughput(path, engine=engine, jobs=jobs)
+        elif name == 'memory':
+            ret[name] = bench_memory(path, engine=engine)
+        elif name == 'serialization':
+            ret[name] = bench_serialization(path)
+        print("%s: %s" % (name, json.dumps(ret[name], sort_keys=True)), file=sys.stderr)
+
+    return ret
+
+
+def main():
+    parser = ArgumentParser('benchmarks', description='Run kiwiflights benchmarks')
+    parser.add_argument('-output', dest='output', action='store', metavar='RESULTS.json',
+                        help='path to results file, if omitted stdout is used')
+    parser.add_argument('-input', dest='input', action='store', metavar='INPUT.csv',
+                        help='schedule to be used instead of a generated one')
+    parser.add_argument('-benchmark', dest='benchmarks', action='append',
+                        choices=sorted(BENCHMARKS),
+                        help='benchmark to run, can be repeated, default: all')
+    parser.add_argument('-engine', dest='engine', action='store', choices=System.get_engines(),
+                        help='search engine to be used')
+    parser.add_argument('-jobs', dest='jobs', action='store', type=int, metavar='N',
+                        help='number of worker processes to search in')
+    generator.add_arguments(parser)
+    args = parser.parse_args()
+
+    path = args.input
+    if not path:
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+
+    try:
+        if not args.input:
+            generator.generate_csv(path, **generator.get_parameters(args))
+
+        results = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'kiwiflights_version': kiwiflights_version,
+            'python_version': platform.python_version(),
+            'platform': platform.platform(),
+            'schedule': args.input or generator.get_parameters(args),
+            'results': run(path, args.benchmarks or sorted(BENCHMARKS),
+                           engine=args.engine, jobs=args.jobs),
+        }
+    finally:
+        if not args.input:
+            os.unlink(path)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, sort_keys=True, indent=2)
+            f.write('\n')
+    else:
+        json.dump(results, sys.stdout, sort_keys=True, indent=2)
+        sys.stdout.write('\n')
+
+
+if __name__ == "__main__":
+    main()
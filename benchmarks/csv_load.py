@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Benchmark CSV loading - the original line-by-line dateutil based loader against
+System.from_csv_file
+
+Usage:
+    $ python3 -m benchmarks.csv_load -rows 5000000
+"""
+
+import os
+import time
+import tempfile
+from argparse import ArgumentParser
+from kiwiflights import System, Flight
+from .generator import generate_csv
+
+# Flights are spread uniformly over airports during one year
+_AIRPORT_COUNT = 200
+_DAYS = 365
+
+
+def legacy_from_csv_file(file):
+    """The original loader - readline(), split() and two dateutil calls per line
+
+    :param file: opened file-like object, CSV header is expected
+    :return: system with parsed flights
+    """
+    from dateutil import parser as datetime_parser
+
+    system = System()
+    file.readline()
+    line = file.readline()
+
+    while line:
+        items = line.split(',')
+        departure_datetime = datetime_parser.parse(items[2])
+        arrival_datetime = datetime_parser.parse(items[3])
+
+        if departure_datetime >= arrival_datetime:
+            raise ValueError("Departure after arrival detected, flight '%s'" % items[4])
+
+        source_airport = system.airport_database.get_airport_or_create(items[0])
+        destination_airport = system.airport_database.get_airport_or_create(items[1])
+
+        new_flight = Flight(
+            source=source_airport,
+            destination=destination_airport,
+            departure=departure_datetime,
+            arrival=arrival_datetime,
+            flight_number=items[4],
+            price=float(items[5]),
+            bags_allowed=int(items[6]),
+            bag_price=float(items[7])
+        )
+
+        system.flight_database.register(new_flight)
+        destination_airport.register_flight(new_flight)
+        source_airport.register_flight(new_flight)
+        line = file.readline()
+
+    return system
+
+
+def measure(loader, path):
+    """Measure time spent in loader
+
+    :param loader: loader to be called with opened file
+    :param path: path to CSV file
+    :return: elapsed time in seconds
+    """
+    with open(path, 'r') as f:
+        start = time.perf_counter()
+        system = loader(f)
+        elapsed = time.perf_counter() - start
+
+    assert len(system.flight_database.flights) > 0
+    return elapsed
+
+
+def main():
+    parser = ArgumentParser('csv_load', description='Benchmark CSV loading')
+    parser.add_argument('-rows', dest='rows', action='store', type=int, default=5000000,
+                        help='number of flights to generate, default: %(default)s')
+    parser.add_argument('-skip-legacy', dest='skip_legacy', action='store_true',
+                        help='do not measure the original loader')
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+
+    try:
+        rows = generate_csv(path, airport_count=_AIRPORT_COUNT, hub_count=0, hub_skew=0,
+                            flights_per_day=max(1, args.rows // _DAYS), days=_DAYS,
+                            connection_density=0)
+        print("rows: %d" % rows)
+        if not args.skip_legacy:
+            print("legacy loader: %.2fs" % measure(legacy_from_csv_file, path))
+        print("System.from_csv_file: %.2fs" % measure(System.from_csv_file, path))
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
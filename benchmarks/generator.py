@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Deterministic generator of synthetic flight schedules in CSV format read by System.from_csv_file
+
+Usage:
+    $ python3 -m benchmarks.generator -output schedule.csv -airports 100 -flights-per-day 500
+"""
+
+import sys
+import random
+import datetime
+from argparse import ArgumentParser
+
+_CSV_HEADER = "source,destination,departure,arrival,flight_number,price,bags_allowed,bag_price\n"
+_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+# Flights depart on 5 minute boundaries
+_TIME_STEP = datetime.timedelta(minutes=5)
+_STEPS_PER_DAY = 24 * 12
+# Wait window connections are scheduled in, the default one of System
+_MIN_WAIT_STEPS = 12
+_MAX_WAIT_STEPS = 48
+
+DEFAULT_PARAMETERS = {
+    'airport_count': 50,
+    'hub_count': 5,
+    'hub_skew': 0.5,
+    'flights_per_day': 300,
+    'days': 3,
+    'connection_density': 0.3,
+    'seed': 42,
+}
+
+
+class ScheduleGenerator(object):
+    """Generator of synthetic flight schedules
+
+    Airports are named A000, A001, ... and the first hub_count of them are hubs. With probability
+    hub_skew a flight flies from or to a hub, otherwise both airports are chosen uniformly. With
+    probability connection_density a flight is scheduled as a connection - it departs from
+    destination of an already generated flight inside the default wait window after its arrival,
+    so the density controls how many connections itineraries can take.
+    """
+    def __init__(self, airport_count=50, hub_count=5, hub_skew=0.5, flights_per_day=300, days=3,
+                 connection_density=0.3, seed=42, start=datetime.datetime(2017, 1, 1)):
+        """
+        :param airport_count: number of airports
+        :param hub_count: number of hubs among airports
+        :param hub_skew: probability of a flight flying from or to a hub, 0 to 1
+        :param flights_per_day: number of flights generated per day
+        :param days: number of days schedule spans
+        :param connection_density: probability of a flight being a connection, 0 to 1
+        :param seed: seed for random generator, the same parameters give the same schedule
+        :param start: the very first day of schedule
+        :type start: datetime.datetime
+        """
+        if airport_count < 2:
+            raise ValueError("At least 2 airports are required, got %d" % airport_count)
+
+        if not 0 <= hub_count <= airport_count:
+            raise ValueError("Number of hubs has to be between 0 and %d, got %d"
+                             % (airport_count, hub_count))
+
+        for name, value in (('hub_skew', hub_skew), ('connection_density', connection_density)):
+            if not 0 <= value <= 1:
+                raise ValueError("Parameter %s has to be between 0 and 1, got %s" % (name, value))
+
+        self.airport_count = airport_count
+        self.hub_count = hub_count
+        self.hub_skew = hub_skew
+        self.flights_per_day = flights_per_day
+        self.days = days
+        self.connection_density = connection_density
+        self.seed = seed
+        self.start = start
+
+    def get_parameters(self):
+        """
+        :return: parameters of generator, see DEFAULT_PARAMETERS
+        :rtype: dict
+        """
+        return {name: getattr(self, name) for name in DEFAULT_PARAMETERS}
+
+    def _pick_route(self, rand, airports, source=None):
+        """Pick source and destination of a flight
+
+        :param rand: random generator
+        :param airports: airport codes
+        :param source: source airport code, picked if None
+        :return: a tuple (source, destination)
+        """
+        hubs = airports[:self.hub_count]
+
+        if source is None:
+            if hubs and rand.random() < self.hub_skew / 2:
+                source = rand.choice(hubs)
+            else:
+                source = rand.choice(airports)
+
+        destination = source
+        while destination == source:
+            # a flight from a spoke prefers a hub, hubs are connected to anything
+            if hubs and source not in hubs and rand.random() < self.hub_skew:
+                destination = rand.choice(hubs)
+            else:
+                destination = rand.choice(airports)
+
+        return source, destination
+
+    def iter_rows(self):
+        """Generate flights as CSV rows, flights of a day are generated before the next day
+
+        :return: a generator of CSV lines (without header)
+        :rtype: generator(str)
+        """
+        rand = random.Random(self.seed)
+        airports = ['A%03d' % i for i in range(self.airport_count)]
+        # (destination, arrival step) of flights generated so far, connections follow them
+        arrivals = []
+        flight_idx = 0
+
+        for day in range(self.days):
+            for _ in range(self.flights_per_day):
+                if arrivals and rand.random() < self.connection_density:
+                    source, arrival_step = arrivals[rand.randrange(len(arrivals))]
+                    source, destination = self._pick_route(rand, airports, source=source)
+                    departure_step = arrival_step + rand.randint(_MIN_WAIT_STEPS, _MAX_WAIT_STEPS)
+                else:
+                    source, destination = self._pick_route(rand, airports)
+                    departure_step = day * _STEPS_PER_DAY + rand.randrange(_STEPS_PER_DAY)
+
+                # flights take 30 minutes to 6 hours
+                arrival_step = departure_step + rand.randint(6, 72)
+                arrivals.append((destination, arrival_step))
+
+                departure = self.start + departure_step * _TIME_STEP
+                arrival = self.start + arrival_step * _TIME_STEP
+                yield "%s,%s,%s,%s,BM%07d,%d,%d,%d\n" % (source, destination,
+                                                          departure.strftime(_DATETIME_FORMAT),
+                                                          arrival.strftime(_DATETIME_FORMAT),
+                                                          flight_idx,
+                                                          rand.randrange(20, 500),
+                                                          rand.randrange(0, 3),
+                                                          rand.randrange(5, 50))
+                flight_idx += 1
+
+    def write_csv(self, file):
+        """Write schedule in CSV format including header
+
+        :param file: opened file-like object
+        :return: number of flights written
+        """
+        file.write(_CSV_HEADER)
+
+        count = 0
+        for row in self.iter_rows():
+            file.write(row)
+            count += 1
+
+        return count
+
+
+def generate_csv(path, **parameters):
+    """Generate schedule to a CSV file
+
+    :param path: path to the output file
+    :param parameters: parameters of ScheduleGenerator
+    :return: number of flights written
+    """
+    with open(path, 'w') as f:
+        return ScheduleGenerator(**parameters).write_csv(f)
+
+
+def add_arguments(parser):
+    """Add arguments of ScheduleGenerator to argument parser
+
+    :param parser: argument parser
+    :type parser: argparse.ArgumentParser
+    """
+    parser.add_argument('-airports', dest='airport_count', action='store', type=int,
+                        default=DEFAULT_PARAMETERS['airport_count'],
+                        help='number of airports, default: %(default)s')
+    parser.add_argument('-hubs', dest='hub_count', action='store', type=int,
+                        default=DEFAULT_PARAMETERS['hub_count'],
+                        help='number of hubs among airports, default: %(default)s')
+    parser.add_argument('-hub-skew', dest='hub_skew', action='store', type=float,
+                        default=DEFAULT_PARAMETERS['hub_skew'],
+                        help='probability of a flight flying from or to a hub, '
+                             'default: %(default)s')
+    parser.add_argument('-flights-per-day', dest='flights_per_day', action='store', type=int,
+                        default=DEFAULT_PARAMETERS['flights_per_day'],
+                        help='number of flights per day, default: %(default)s')
+    parser.add_argument('-days', dest='days', action='store', type=int,
+                        default=DEFAULT_PARAMETERS['days'],
+                        help='number of days schedule spans, default: %(default)s')
+    parser.add_argument('-connection-density', dest='connection_density', action='store',
+                        type=float, default=DEFAULT_PARAMETERS['connection_density'],
+                        help='probability of a flight departing inside wait window after '
+                             'another flight, default: %(default)s')
+    parser.add_argument('-seed', dest='seed', action='store', type=int,
+                        default=DEFAULT_PARAMETERS['seed'],
+                        help='seed of random generator, default: %(default)s')
+
+
+def get_parameters(args):
+    """
+    :param args: arguments parsed by parser set up by add_arguments()
+    :return: parameters of ScheduleGenerator
+    :rtype: dict
+    """
+    return {name: getattr(args, name) for name in DEFAULT_PARAMETERS}
+
+
+def main():
+    parser = ArgumentParser('generator', description='Generate synthetic flight schedule')
+    parser.add_argument('-output', dest='output', action='store', metavar='OUTPUT.csv',
+                        help='path to output file, if omitted stdout is used')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    generator = ScheduleGenerator(**get_parameters(args))
+    if args.output:
+        with open(args.output, 'w') as f:
+            generator.write_csv(f)
+    else:
+        generator.write_csv(sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
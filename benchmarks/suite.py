@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Benchmarks of loading, itinerary computation, memory and serialization
+
+Each benchmark gets a path to a CSV schedule and returns a dict of measured values.
+"""
+
+import io
+import time
+import tracemalloc
+from kiwiflights import System
+from kiwiflights.utils import dict2json, write_itineraries_json
+
+
+def _load(path, columnar=False):
+    """
+    :param path: path to CSV schedule
+    :param columnar: keep flights in columnar storage
+    :return: loaded system
+    :rtype: System
+    """
+    with open(path, 'r') as f:
+        return System.from_csv_file(f, columnar=columnar)
+
+
+def bench_load(path, columnar=False):
+    """Measure time spent in System.from_csv_file
+
+    :param path: path to CSV schedule
+    :param columnar: keep flights in columnar storage
+    :return: measured values
+    :rtype: dict
+    """
+    start = time.perf_counter()
+    system = _load(path, columnar=columnar)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'seconds': elapsed,
+        'flights': len(system.flight_database),
+        'flights_per_second': len(system.flight_database) / elapsed if elapsed else None,
+    }
+
+
+def bench_throughput(path, engine=None, jobs=None):
+    """Measure itineraries computed per second
+
+    :param path: path to CSV schedule
+    :param engine: search engine to be used, see System.get_engines()
+    :param jobs: number of worker processes to search in
+    :return: measured values
+    :rtype: dict
+    """
+    system = _load(path)
+    if engine:
+        system.engine = engine
+
+    count = 0
+    start = time.perf_counter()
+    for _ in system.iter_itineraries(jobs=jobs):
+        count += 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        'engine': system.engine,
+        'jobs': jobs,
+        'seconds': elapsed,
+        'itineraries': count,
+        'itineraries_per_second': count / elapsed if elapsed else None,
+    }
+
+
+def bench_memory(path, engine=None):
+    """Measure peak memory allocated by loading and computing all itineraries
+
+    Memory is traced using tracemalloc, so allocations are slower than usual - run timing
+    benchmarks separately.
+
+    :param path: path to CSV schedule
+    :param engine: search engine to be used, see System.get_engines()
+    :return: measured values
+    :rtype: dict
+    """
+    tracemalloc.start()
+    try:
+        system = _load(path)
+        load_current, load_peak = tracemalloc.get_traced_memory()
+
+        if engine:
+            system.engine = engine
+        itineraries = system.compute_itineraries()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'engine': system.engine,
+        'load_bytes': load_current,
+        'load_peak_bytes': load_peak,
+        'itineraries': len(itineraries),
+        'bytes': current,
+        'peak_bytes': peak,
+    }
+
+
+def bench_serialization(path, pretty=True):
+    """Measure Itinerary.to_dict() and dict2json() serialization of all itineraries, and streaming
+    output through write_itineraries_json()
+
+    :param path: path to CSV schedule
+    :param pretty: use pretty (indented) output
+    :return: measured values
+    :rtype: dict
+    """
+    itineraries = _load(path).compute_itineraries()
+
+    start = time.perf_counter()
+    dicts = [i.to_dict() for i in itineraries]
+    to_dict_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    output = dict2json({'itineraries': dicts}, pretty=pretty)
+    dict2json_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    write_itineraries_json(itineraries, io.StringIO(), pretty=pretty)
+    write_elapsed = time.perf_counter() - start
+
+    return {
+        'itineraries': len(itineraries),
+        'pretty': pretty,
+        'to_dict_seconds': to_dict_elapsed,
+        'dict2json_seconds': dict2json_elapsed,
+        'write_seconds': write_elapsed,
+        'bytes': len(output),
+    }
+
+
+BENCHMARKS = {
+    'load': bench_load,
+    'throughput': bench_throughput,
+    'memory': bench_memory,
+    'serialization': bench_serialization,
+}
@@ -3,6 +3,7 @@
 __version__ = '0.1.0rc1'
 
 from .flight_database import FlightDatabase
+from .columnar_flight_database import ColumnarFlightDatabase
 from .airport_database import AirportDatabase
 from .system import System
 from .flight import Flight
@@ -19,9 +19,14 @@
 # ####################################################################
 """Airport representation"""
 
+from bisect import bisect_left, bisect_right
+
 
 class Airport(object):
     """Airport representation"""
+    __slots__ = ('code', 'arrivals', 'departures', '_departure_times', '_departure_positions',
+                 '_arrival_times', '_arrival_positions')
+
     def __init__(self, code):
         """
         :param code: airport unique code
@@ -29,6 +34,12 @@ class Airport(object):
         self.code = code
         self.arrivals = []
         self.departures = []
+        # departure index - departure times sorted, lazily built on first query
+        self._departure_times = None
+        self._departure_positions = None
+        # arrival index - arrival times sorted, lazily built on first query
+        self._arrival_times = None
+        self._arrival_positions = None
 
     def __repr__(self):
         return "Airport(code='%s')" % self.code
@@ -55,8 +66,131 @@ class Airport(object):
 
         if flight.source == self:
             self.departures.append(flight)
+            self._departure_times = None
         elif flight.destination == self:
             self.arrivals.append(flight)
+            self._arrival_times = None
         else:
             raise ValueError("Cannot register flight to airport that is not listed "
                              "in departure nor arrival")
+
+    def _get_flights_of(self, flight):
+        """
+        :param flight: flight departing from or arriving to airport
+        :return: departures or arrivals list the flight belongs to
+        :raises ValueError: if airport is not flight's source nor destination
+        """
+        if flight.source == self:
+            return self.departures
+        elif flight.destination == self:
+            return self.arrivals
+
+        raise ValueError("Flight '%s' does not depart from nor arrive to airport '%s'"
+                         % (flight.flight_number, self.code))
+
+    def _invalidate_indexes(self):
+        """Drop departure and arrival indexes, they are rebuilt on next query"""
+        self._departure_times = None
+        self._arrival_times = None
+
+    def unregister_flight(self, flight, graceful=False):
+        """Unregister flight from airport
+
+        :param flight: flight to be unregistered
+        :param graceful: if true do not raise an exception if flight was not registered
+        :return: True if flight was unregistered
+        :raises ValueError: if flight was not registered to airport
+        """
+        flights = self._get_flights_of(flight)
+
+        for idx, registered_flight in enumerate(flights):
+            if registered_flight is flight:
+                del flights[idx]
+                self._invalidate_indexes()
+                return True
+
+        if not graceful:
+            raise ValueError("Flight '%s' is not registered to airport '%s'"
+                             % (flight.flight_number, self.code))
+
+        return False
+
+    def replace_flight(self, flight, new_flight, graceful=False):
+        """Replace a registered flight, the new flight keeps position of the replaced one
+
+        :param flight: flight to be replaced
+        :param new_flight: flight to replace it with, it has to depart from or arrive to
+                           airport as the replaced flight does
+        :param graceful: if true do not raise an exception if flight was not registered
+        :return: True if flight was replaced
+        :raises ValueError: if flight was not registered or flights do not match the airport
+        """
+        flights = self._get_flights_of(flight)
+        if self._get_flights_of(new_flight) is not flights:
+            raise ValueError("Flight '%s' cannot replace flight '%s' in airport '%s'"
+                             % (new_flight.flight_number, flight.flight_number, self.code))
+
+        for idx, registered_flight in enumerate(flights):
+            if registered_flight is flight:
+                flights[idx] = new_flight
+                self._invalidate_indexes()
+                return True
+
+        if not graceful:
+            raise ValueError("Flight '%s' is not registered to airport '%s'"
+                             % (flight.flight_number, self.code))
+
+        return False
+
+    def _build_departure_index(self):
+        """Build departure index sorted by departure time, keep positions to departures"""
+        departures = self.departures
+        positions = sorted(range(len(departures)), key=lambda idx: departures[idx].departure)
+        self._departure_times = [departures[idx].departure for idx in positions]
+        self._departure_positions = positions
+
+    def get_departures_within(self, earliest, latest):
+        """Retrieve departures that depart inside the given time window (boundaries included)
+
+        :param earliest: earliest departure time, None for no limit
+        :type earliest: datetime.datetime
+        :param latest: latest departure time
+        :type latest: datetime.datetime
+        :return: departures inside the window, in order in which they were registered
+        :rtype: list(Flight)
+        """
+        if self._departure_times is None:
+            self._build_departure_index()
+
+        start = bisect_left(self._departure_times, earliest) if earliest is not None else 0
+        end = bisect_right(self._departure_times, latest, lo=start)
+
+        if end - start == 1:
+            return [self.departures[self._departure_positions[start]]]
+
+        # preserve registration order so results are stable regardless of the index
+        return [self.departures[idx] for idx in sorted(self._departure_positions[start:end])]
+
+    def _build_arrival_index(self):
+        """Build arrival index sorted by arrival time, keep positions to arrivals"""
+        positions = sorted(range(len(self.arrivals)), key=lambda idx: self.arrivals[idx].arrival)
+        self._arrival_times = [self.arrivals[idx].arrival for idx in positions]
+        self._arrival_positions = positions
+
+    def get_arrivals_within(self, earliest, latest):
+        """Retrieve arrivals that arrive inside the given time window (boundaries included)
+
+        :param earliest: earliest arrival time
+        :type earliest: datetime.datetime
+        :param latest: latest arrival time
+        :type latest: datetime.datetime
+        :return: arrivals inside the window, in order in which they were registered
+        :rtype: list(Flight)
+        """
+        if self._arrival_times is None:
+            self._build_arrival_index()
+
+        start = bisect_left(self._arrival_times, earliest)
+        end = bisect_right(self._arrival_times, latest, lo=start)
+
+        return [self.arrivals[idx] for idx in sorted(self._arrival_positions[start:end])]
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Itinerary search running on integer columns of ColumnarFlightDatabase"""
+
+import logging
+from .itinerary import Itinerary
+
+_logger = logging.getLogger(__name__)
+
+
+class ColumnarEngine(object):
+    """Depth-first itinerary search on columns, yields itineraries in the same order as System"""
+    def __init__(self, system):
+        """
+        :param system: system to search itineraries in
+        :type system: System
+        """
+        self.system = system
+        self.database = system.flight_database.to_columnar()
+        self.min_wait_time = int(system.min_wait_time.total_seconds())
+        self.max_wait_time = int(system.max_wait_time.total_seconds())
+        self.max_stops = system.max_stops
+        self.bags = system.bags
+        # flights are materialized only once per search, itineraries share them
+        self._flights = {}
+
+    def get_flight(self, flight_id):
+        """Get materialized flight that is shared among itineraries produced by engine
+
+        :param flight_id: id of flight
+        :return: materialized flight
+        :rtype: Flight
+        """
+        ret = self._flights.get(flight_id)
+        if ret is None:
+            ret = self._flights[flight_id] = self.database.materialize_flight(flight_id)
+        return ret
+
+    def get_seed_flight_ids(self):
+        """
+        :return: ids of flights the search starts with, in order in which System seeds its search
+        :rtype: list(int)
+        """
+        bags_allowed = self.database.bags_allowed
+        ret = []
+        for airport in self.system.airport_database.airports:
+            airport_id = self.database.get_airport_id(airport, graceful=True)
+            if airport_id is not None:
+                ret.extend(flight_id for flight_id in self.database.get_departures(airport_id)
+                           if bags_allowed[flight_id] >= self.bags)
+        return ret
+
+    def iter_itineraries(self):
+        """Compute itineraries lazily
+
+        :return: a generator of available itineraries
+        :rtype: generator(Itinerary)
+        """
+        database = self.database
+        destination = database.destination
+        arrival = database.arrival
+        segment = database.segment
+        segment_keys = database.segment_keys
+        bags_allowed = database.bags_allowed
+        bags = self.bags
+        # an itinerary of length flights makes length - 1 stops
+        max_length = self.max_stops + 1 if self.max_stops is not None else None
+        get_flight = self.get_flight
+
+        stack = [(Itinerary(get_flight(flight_id)), flight_id)
+                 for flight_id in self.get_seed_flight_ids()]
+
+        while stack:
+            item, flight_id = stack.pop()
+            if max_length is not None and item.length >= max_length:
+                continue
+
+            arrival_time = arrival[flight_id]
+            candidates = database.get_departures_within(destination[flight_id],
+                                                        arrival_time + self.min_wait_time,
+                                                        arrival_time + self.max_wait_time)
+            for next_flight_id in candidates:
+                if bags_allowed[next_flight_id] < bags:
+                    continue
+                if item.has_segment(segment_keys[segment[next_flight_id]]):
+                    continue
+
+                next_stack_item = Itinerary(get_flight(next_flight_id), parent=item)
+                yield next_stack_item
+                stack.append((next_stack_item, next_flight_id))
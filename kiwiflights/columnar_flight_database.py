@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Flight database storing flights in columns"""
+
+import logging
+import datetime
+from array import array
+from collections.abc import Sequence
+from bisect import bisect_left, bisect_right
+from .flight import Flight
+from .utils import datetime2timestamp, timestamp2datetime
+
+_logger = logging.getLogger(__name__)
+
+
+class FlightView(Flight):
+    """A read-only view of a flight stored in ColumnarFlightDatabase
+
+    A view keeps only the database and the flight id, attributes are read from columns on
+    each access (departure and arrival datetimes are created on each access).
+    """
+    __slots__ = ('_database', 'flight_id')
+
+    def __init__(self, database, flight_id):
+        """
+        :param database: columnar database the flight is stored in
+        :type database: ColumnarFlightDatabase
+        :param flight_id: id of the flight in database
+        """
+        # pylint: disable=super-init-not-called
+        self._database = database
+        self.flight_id = flight_id
+
+    @property
+    def source(self):
+        return self._database.get_airport(self._database.source[self.flight_id])
+
+    @property
+    def destination(self):
+        return self._database.get_airport(self._database.destination[self.flight_id])
+
+    @property
+    def departure(self):
+        return timestamp2datetime(self._database.departure[self.flight_id])
+
+    @property
+    def arrival(self):
+        return timestamp2datetime(self._database.arrival[self.flight_id])
+
+    @property
+    def flight_number(self):
+        return self._database.get_flight_number(self.flight_id)
+
+    @property
+    def price(self):
+        return self._database.price[self.flight_id]
+
+    @property
+    def bags_allowed(self):
+        return self._database.bags_allowed[self.flight_id]
+
+    @property
+    def bag_price(self):
+        return self._database.bag_price[self.flight_id]
+
+    @property
+    def segment(self):
+        return self._database.segment_keys[self._database.segment[self.flight_id]]
+
+    def get_duration(self):
+        """
+        :return: raw flight duration
+        :rtype: datetime.timedelta
+        """
+        database = self._database
+        return datetime.timedelta(seconds=database.arrival[self.flight_id]
+                                  - database.departure[self.flight_id])
+
+
+class _FlightViews(Sequence):
+    """A sequence of views of all flights in ColumnarFlightDatabase, views are created on access"""
+    def __init__(self, database):
+        """
+        :param database: columnar database
+        :type database: ColumnarFlightDatabase
+        """
+        self._database = database
+
+    def __len__(self):
+        return len(self._database)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[idx] for idx in range(*item.indices(len(self)))]
+
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("Flight index out of range")
+
+        return self._database.get_flight(item)
+
+
+class ColumnarFlightDatabase(object):
+    """In-memory database holding flights in parallel typed arrays
+
+    Flights are not stored as objects, FlightView instances are created on demand. A flight
+    is identified by its id - a position in columns, ids follow the order of registration.
+    Search engines can work directly on columns:
+
+      * source, destination - airport ids, see get_airport() and get_airport_id()
+      * departure, arrival - seconds since epoch
+      * price, bag_price, bags_allowed
+      * segment - id of segment (unordered pair of airports) the flight flies on, see
+        segment_keys for segments as used by Flight.segment
+    """
+    # Columns kept in database, in order in which they are stored in snapshots
+    COLUMNS = ('source', 'destination', 'departure', 'arrival', 'price', 'bag_price',
+               'bags_allowed', 'segment')
+
+    def __init__(self, flights=None):
+        """
+        :param flights: a list of flights stored in database
+        :type flights: list(Flight)
+        """
+        self.source = array('i')
+        self.destination = array('i')
+        self.departure = array('q')
+        self.arrival = array('q')
+        self.price = array('d')
+        self.bag_price = array('d')
+        self.bags_allowed = array('i')
+        self.segment = array('i')
+
+        # flight numbers are unique, so flight id indexes the flight number string table directly
+        self._flight_numbers = []
+        self._mapping = {}
+        self._airports = []
+        self._airport_ids = {}
+        self._segments = {}
+        # segment id to segment as used by Flight.segment
+        self.segment_keys = []
+
+        # departure index - flight ids sorted by source airport and departure, lazily built
+        self._departure_offsets = None
+        self._departure_order = None
+        self._departure_times = None
+
+        # incremented on every change of flights, structures built on columns compare it
+        self.version = 0
+
+        for flight in flights or []:
+            if flight.flight_number in self._mapping:
+                raise ValueError("Multiple flights with same number provided, "
+                                 "number %s" % flight.flight_number)
+            self._append(flight)
+
+    def __len__(self):
+        return len(self._flight_numbers)
+
+    @classmethod
+    def from_columns(cls, columns, flight_numbers, airports, segments, departure_index=None):
+        """Create database from already built columns, columns are used as they are
+
+        :param columns: a dict mapping names from ColumnarFlightDatabase.COLUMNS to arrays
+        :param flight_numbers: flight numbers, indexed by flight id
+        :type flight_numbers: list(str)
+        :param airports: airports, indexed by airport id
+        :type airports: list(Airport)
+        :param segments: pairs of airport ids (the lower one first), indexed by segment id
+        :param departure_index: a tuple (offsets, order, times), see get_departure_index();
+                                built on demand if not provided
+        :return: columnar flight database
+        :rtype: ColumnarFlightDatabase
+        :raises ValueError: if columns are not consistent
+        """
+        ret = cls()
+
+        for name in cls.COLUMNS:
+            if len(columns[name]) != len(flight_numbers):
+                raise ValueError("Column '%s' has %d items, expected %d"
+                                 % (name, len(columns[name]), len(flight_numbers)))
+            setattr(ret, name, columns[name])
+
+        ret._flight_numbers = flight_numbers
+        ret._mapping = dict(zip(flight_numbers, range(len(flight_numbers))))
+        if len(ret._mapping) != len(flight_numbers):
+            raise ValueError("Multiple flights with same number provided")
+
+        ret._airports = airports
+        ret._airport_ids = {airport: airport_id for airport_id, airport in enumerate(airports)}
+        ret._segments = {segment: segment_id for segment_id, segment in enumerate(segments)}
+        ret.segment_keys = [frozenset((airports[a], airports[b])) for a, b in segments]
+
+        if departure_index is not None:
+            ret._departure_offsets, ret._departure_order, ret._departure_times = departure_index
+
+        return ret
+
+    def get_segments(self):
+        """
+        :return: pairs of airport ids (the lower one first), indexed by segment id
+        :rtype: list(tuple(int, int))
+        """
+        # segment ids are assigned in order of insertion
+        return list(self._segments)
+
+    def __str__(self):
+        return str(self._flight_numbers)
+
+    @property
+    def flights(self):
+        """
+        :return: all available flights in database, a sequence creating views on access
+        :rtype: collections.abc.Sequence
+        """
+        return _FlightViews(self)
+
+    @property
+    def airport_count(self):
+        """
+        :return: number of airports referenced by flights in database
+        """
+        return len(self._airports)
+
+    def to_columnar(self):
+        """
+        :return: columnar flight database - the database itself
+        :rtype: ColumnarFlightDatabase
+        """
+        return self
+
+    def to_csv(self):
+        """
+        :return: a CSV representation of flight database
+        """
+        header = "source,destination,departure,arrival,flight_number,price," \
+                 "bags_allowed,bag_price\n"
+        return header + "".join(f.to_csv() for f in self.flights)
+
+    def to_dict(self):
+        """
+        :return: a dict representation of flight database
+        """
+        return {'flights': [f.to_dict() for f in self.flights]}
+
+    def register(self, flight):
+        """Register flight to database, the flight object itself is not kept
+
+        :param flight: flight to be registered
+        :type flight: Flight
+        :raises ValueError: if flight already exists in database
+        """
+        _logger.debug("Registering flight '%s' to flight database", flight.flight_number)
+
+        if flight.flight_number in self._mapping:
+            raise ValueError("Flight with number '%s' is already in database"
+                             % flight.flight_number)
+
+        if flight.source == flight.destination:
+            raise ValueError("Source and destination of provided flight '%s' is same: %s"
+                             % (flight.flight_number, flight.source))
+
+        self._append(flight)
+
+    def _get_or_assign_airport_id(self, airport):
+        """Get id of airport, assign a new one if airport was not seen
+
+        :param airport: airport to get id for
+        :return: airport id
+        :rtype: int
+        """
+        ret = self._airport_ids.get(airport)
+
+        if ret is None:
+            ret = len(self._airports)
+            self._airports.append(airport)
+            self._airport_ids[airport] = ret
+
+        return ret
+
+    def _append(self, flight):
+        """Append flight to columns
+
+        :param flight: flight to be appended
+        """
+        source = self._get_or_assign_airport_id(flight.source)
+        destination = self._get_or_assign_airport_id(flight.destination)
+        segment = (source, destination) if source < destination else (destination, source)
+
+        self.source.append(source)
+        self.destination.append(destination)
+        self.departure.append(datetime2timestamp(flight.departure))
+        self.arrival.append(datetime2timestamp(flight.arrival))
+        self.price.append(flight.price)
+        self.bag_price.append(flight.bag_price)
+        self.bags_allowed.append(flight.bags_allowed)
+        segment_id = self._segments.get(segment)
+        if segment_id is None:
+            segment_id = self._segments[segment] = len(self.segment_keys)
+            self.segment_keys.append(flight.segment)
+        self.segment.append(segment_id)
+
+        self._mapping[flight.flight_number] = len(self._flight_numbers)
+        self._flight_numbers.append(flight.flight_number)
+        self._departure_offsets = None
+        self.version += 1
+
+    def get_flight(self, flight_id):
+        """Get view of flight with the given id
+
+        :param flight_id: id of flight
+        :return: a new view of the flight
+        :rtype: FlightView
+        """
+        return FlightView(self, flight_id)
+
+    def materialize_flight(self, flight_id):
+        """Create a regular flight instance for the flight with the given id
+
+        Unlike views, attribute access on materialized flights is cheap, engines materialize
+        flights that end up in itineraries (once per search).
+
+        :param flight_id: id of flight
+        :return: a new flight instance
+        :rtype: Flight
+        """
+        return Flight(
+            source=self._airports[self.source[flight_id]],
+            destination=self._airports[self.destination[flight_id]],
+            departure=timestamp2datetime(self.departure[flight_id]),
+            arrival=timestamp2datetime(self.arrival[flight_id]),
+            flight_number=self._flight_numbers[flight_id],
+            price=self.price[flight_id],
+            bags_allowed=self.bags_allowed[flight_id],
+            bag_price=self.bag_price[flight_id]
+        )
+
+    def get_flight_number(self, flight_id):
+        """
+        :param flight_id: id of flight
+        :return: flight number of flight with the given id
+        """
+        return self._flight_numbers[flight_id]
+
+    def get_flight_id(self, flight_number, graceful=False):
+        """Retrieve flight id by flight number
+
+        :param flight_number: flight number
+        :param graceful: if true do not raise an exception but return None if no flight found
+        :return: flight id
+        :raises KeyError: if no flight was found
+        """
+        ret = self._mapping.get(flight_number)
+
+        if ret is None and not graceful:
+            raise KeyError("Flight with number '%s' not found in the database" % flight_number)
+
+        return ret
+
+    def get_airport(self, airport_id):
+        """
+        :param airport_id: id of airport
+        :return: airport with the given id
+        :rtype: Airport
+        """
+        return self._airports[airport_id]
+
+    def get_airport_id(self, airport, graceful=False):
+        """Retrieve id of airport used in columns
+
+        :param airport: airport to get id for
+        :param graceful: if true do not raise an exception but return None if airport has no flights
+        :return: airport id
+        :raises KeyError: if no flight from or to airport was registered
+        """
+        ret = self._airport_ids.get(airport)
+
+        if ret is None and not graceful:
+            raise KeyError("No flights for airport '%s' found in the database" % airport.code)
+
+        return ret
+
+    def _build_departure_index(self):
+        """Build departure index - flight ids grouped by source airport sorted by departure"""
+        order = sorted(range(len(self)), key=lambda idx: (self.source[idx], self.departure[idx]))
+        offsets = array('i', [0] * (len(self._airports) + 1))
+
+        for airport_id in self.source:
+            offsets[airport_id + 1] += 1
+        for airport_id in range(len(self._airports)):
+            offsets[airport_id + 1] += offsets[airport_id]
+
+        self._departure_order = array('i', order)
+        self._departure_times = array('q', (self.departure[idx] for idx in order))
+        self._departure_offsets = offsets
+
+    def get_departure_index(self):
+        """Get departure index, departures of airport with id a are order[offsets[a]:offsets[a+1]]
+
+        :return: a tuple (offsets, order, times), times are departure times of flights in order
+        """
+        if self._departure_offsets is None:
+            self._build_departure_index()
+
+        return self._departure_offsets, self._departure_order, self._departure_times
+
+    def get_departures(self, airport_id):
+        """
+        :param airport_id: id of source airport
+        :return: ids of flights departing from airport, in order in which they were registered
+        :rtype: list(int)
+        """
+        offsets, order, _ = self.get_departure_index()
+        return sorted(order[offsets[airport_id]:offsets[airport_id + 1]])
+
+    def get_departures_within(self, airport_id, earliest, latest):
+        """Retrieve departures that depart inside the given time window (boundaries included)
+
+        :param airport_id: id of source airport
+        :param earliest: earliest departure time in seconds since epoch
+        :param latest: latest departure time in seconds since epoch
+        :return: ids of flights inside the window, in order in which they were registered
+        :rtype: list(int)
+        """
+        offsets, order, times = self.get_departure_index()
+
+        start = bisect_left(times, earliest, offsets[airport_id], offsets[airport_id + 1])
+        end = bisect_right(times, latest, start, offsets[airport_id + 1])
+
+        if end - start == 1:
+            return [order[start]]
+
+        return sorted(order[start:end])
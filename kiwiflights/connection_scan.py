@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Earliest arrival and profile queries by Connection Scan Algorithm"""
+
+import logging
+from array import array
+from bisect import bisect_left, bisect_right
+from .itinerary import Itinerary
+from .utils import datetime2timestamp
+
+_logger = logging.getLogger(__name__)
+
+
+class ConnectionScan(object):
+    """Journeys between two airports found by scanning flights sorted by departure
+
+    Flights (connections) of a columnar flight database are sorted by departure once, queries
+    scan them in a single pass - forward for the earliest arrival, backward for profiles. A flight
+    can be taken after another one only if it departs inside wait window after its arrival and
+    it allows required bags, the maximum number of stops is honored as well. Unlike itinerary
+    search, journeys can consist of a single flight and the cycle rule is not enforced - a journey
+    can fly the same segment more than once, though such a journey is never faster than the one
+    skipping the cycle if wait window allows it.
+    """
+    def __init__(self, system):
+        """
+        :param system: system with flights to be scanned, search parameters are read on queries
+        :type system: System
+        """
+        self.system = system
+        self.database = system.flight_database.to_columnar()
+        self.database_version = self.database.version
+
+        departure = self.database.departure
+        # flight ids sorted by departure and their departures for bisecting
+        self.connections = array('i', sorted(range(len(self.database)),
+                                             key=departure.__getitem__))
+        self.departures = array('q', (departure[flight_id] for flight_id in self.connections))
+
+    def matches(self, database):
+        """Check whether connections were sorted for the given flights
+
+        :param database: columnar database of flights
+        :return: True if connections are sorted for the same flights
+        """
+        return self.database is database and self.database_version == database.version
+
+    def _get_airport_id(self, code):
+        """
+        :param code: code of airport
+        :return: id of airport in columnar database, None if no flight flies from or to it
+        :raises KeyError: if airport is not known
+        """
+        airport = self.system.airport_database.get_airport(code)
+        return self.database.get_airport_id(airport, graceful=True)
+
+    def _get_max_length(self):
+        """
+        :return: maximum number of flights in a journey, None for no limit
+        """
+        max_stops = self.system.max_stops
+        return max_stops + 1 if max_stops is not None else None
+
+    def _create_itinerary(self, flight_ids):
+        """Create itinerary taking the given flights
+
+        :param flight_ids: ids of flights taken, in order
+        :return: itinerary of regular flights, flights of system are used if they are objects
+        :rtype: Itinerary
+        """
+        if self.system.is_columnar():
+            get_flight = self.database.materialize_flight
+        else:
+            get_flight = self.system.flight_database.flights.__getitem__
+
+        item = None
+        for flight_id in flight_ids:
+            item = Itinerary(get_flight(flight_id), parent=item)
+        return item
+
+    def earliest_arrival(self, source, destination, depart_after=None):
+        """Find the journey arriving to destination as early as possible
+
+        Flights are scanned by departure from depart_after, a flight is reached if it departs from
+        source or inside wait window after a reached flight arrives to its source. The scan stops
+        once flights depart after the earliest arrival found.
+
+        :param source: code of source airport
+        :param destination: code of destination airport
+        :param depart_after: earliest departure from source, None for no limit
+        :type depart_after: datetime.datetime
+        :return: itinerary arriving the earliest, None if destination cannot be reached
+        :rtype: Itinerary
+        :raises KeyError: if source or destination airport is not known
+        """
+        source_id = self._get_airport_id(source)
+        destination_id = self._get_airport_id(destination)
+        if source_id is None or destination_id is None or source_id == destination_id:
+            return None
+
+        database = self.database
+        flight_source = database.source
+        flight_destination = database.destination
+        arrival = database.arrival
+        bags_allowed = database.bags_allowed
+        departures = self.departures
+        connections = self.connections
+        min_wait_time = int(self.system.min_wait_time.total_seconds())
+        max_wait_time = int(self.system.max_wait_time.total_seconds())
+        bags = self.system.bags
+        max_length = self._get_max_length()
+
+        # airport id to sorted arrival times of reached flights and (length, flight id) of them
+        arrivals = {}
+        # reached flight id to flight it was reached from, None for flights from source
+        parents = {}
+        best_flight_id = None
+        best_arrival = None
+
+        position = 0 if depart_after is None \
+            else bisect_left(departures, datetime2timestamp(depart_after))
+        for position in range(position, len(connections)):
+            departure_time = departures[position]
+            if best_arrival is not None and departure_time >= best_arrival:
+                break
+
+            flight_id = connections[position]
+            if bags_allowed[flight_id] < bags:
+                continue
+
+            airport_id = flight_source[flight_id]
+            if airport_id == source_id:
+                length, parent_id = 1, None
+            else:
+                reached = arrivals.get(airport_id)
+                if reached is None:
+                    continue
+                times, entries = reached
+                low = bisect_left(times, departure_time - max_wait_time)
+                high = bisect_right(times, departure_time - min_wait_time)
+                if low == high:
+                    continue
+                length, parent_id = min(entries[low:high])
+                length += 1
+                if max_length is not None and length > max_length:
+                    continue
+
+            parents[flight_id] = parent_id
+            arrival_time = arrival[flight_id]
+            airport_id = flight_destination[flight_id]
+            if airport_id == destination_id:
+                if best_arrival is None or arrival_time < best_arrival:
+                    best_flight_id, best_arrival = flight_id, arrival_time
+                continue
+
+            reached = arrivals.get(airport_id)
+            if reached is None:
+                reached = arrivals[airport_id] = ([], [])
+            times, entries = reached
+            index = bisect_right(times, arrival_time)
+            times.insert(index, arrival_time)
+            entries.insert(index, (length, flight_id))
+
+        _logger.debug("Scanned %d flights, reached %d", position + 1, len(parents))
+
+        if best_flight_id is None:
+            return None
+
+        flight_ids = []
+        flight_id = best_flight_id
+        while flight_id is not None:
+            flight_ids.append(flight_id)
+            flight_id = parents[flight_id]
+        return self._create_itinerary(reversed(flight_ids))
+
+    def profile(self, source, destination, depart_after=None, arrive_before=None):
+        """Find Pareto-optimal journeys in departure from source and arrival to destination
+
+        Flights are scanned from the latest departure, the earliest arrival to destination is
+        computed for each flight from flights departing inside wait window after it arrives -
+        for each number of flights taken if the number of stops is limited. A journey is kept if
+        no journey departing later arrives at the same time or earlier.
+
+        :param source: code of source airport
+        :param destination: code of destination airport
+        :param depart_after: earliest departure from source, None for no limit
+        :type depart_after: datetime.datetime
+        :param arrive_before: latest arrival to destination, None for no limit
+        :type arrive_before: datetime.datetime
+        :return: itineraries ordered by departure, each of them arriving earlier than any
+                 itinerary departing later
+        :rtype: list(Itinerary)
+        :raises KeyError: if source or destination airport is not known
+        """
+        source_id = self._get_airport_id(source)
+        destination_id = self._get_airport_id(destination)
+        if source_id is None or destination_id is None or source_id == destination_id:
+            return []
+
+        database = self.database
+        flight_source = database.source
+        flight_destination = database.destination
+        arrival = database.arrival
+        bags_allowed = database.bags_allowed
+        departures = self.departures
+        connections = self.connections
+        min_wait_time = int(self.system.min_wait_time.total_seconds())
+        max_wait_time = int(self.system.max_wait_time.total_seconds())
+        bags = self.system.bags
+        max_length = self._get_max_length()
+        # the earliest arrival is kept per number of flights taken only if it is limited
+        levels = max_length if max_length is not None else 1
+        latest_arrival = datetime2timestamp(arrive_before) if arrive_before is not None else None
+
+        # airport id to negated departure times of flights from which destination can be
+        # reached (sorted as flights are scanned backward) and the flights
+        departures_from = {}
+        # flight id to the earliest arrival to destination and the following flight per level
+        earliest = {}
+        candidates = []
+
+        first = 0 if depart_after is None \
+            else bisect_left(departures, datetime2timestamp(depart_after))
+        for position in range(len(connections) - 1, first - 1, -1):
+            flight_id = connections[position]
+            arrival_time = arrival[flight_id]
+            if bags_allowed[flight_id] < bags \
+                    or (latest_arrival is not None and arrival_time > latest_arrival):
+                continue
+
+            if flight_destination[flight_id] == destination_id:
+                entry = ([arrival_time] * levels, [None] * levels)
+            else:
+                reached = departures_from.get(flight_destination[flight_id])
+                if reached is None:
+                    continue
+                times, flight_ids = reached
+                low = bisect_left(times, -(arrival_time + max_wait_time))
+                high = bisect_right(times, -(arrival_time + min_wait_time))
+                if low == high:
+                    continue
+
+                arrivals = [None] * levels
+                following = [None] * levels
+                for next_flight_id in flight_ids[low:high]:
+                    next_arrivals = earliest[next_flight_id][0]
+                    for level in range(levels):
+                        # a journey of level + 1 flights continues with one of level flights
+                        next_level = level - 1 if max_length is not None else level
+                        if next_level < 0:
+                            continue
+                        next_arrival = next_arrivals[next_level]
+                        if next_arrival is not None \
+                                and (arrivals[level] is None or next_arrival < arrivals[level]):
+                            arrivals[level] = next_arrival
+                            following[level] = next_flight_id
+                if arrivals[-1] is None:
+                    continue
+                entry = (arrivals, following)
+
+            earliest[flight_id] = entry
+            reached = departures_from.get(flight_source[flight_id])
+            if reached is None:
+                reached = departures_from[flight_source[flight_id]] = ([], [])
+            times, flight_ids = reached
+            index = bisect_right(times, -departures[position])
+            times.insert(index, -departures[position])
+            flight_ids.insert(index, flight_id)
+
+            if flight_source[flight_id] == source_id:
+                candidates.append((departures[position], entry[0][-1], flight_id))
+
+        _logger.debug("Scanned %d flights, %d reach destination", len(connections) - first,
+                      len(earliest))
+
+        # a journey departing later and arriving at the same time or earlier dominates
+        candidates.sort(key=lambda c: (-c[0], c[1]))
+        result = []
+        best_arrival = None
+        for _, arrival_time, flight_id in candidates:
+            if best_arrival is not None and arrival_time >= best_arrival:
+                continue
+            best_arrival = arrival_time
+
+            flight_ids = []
+            level = levels - 1
+            while flight_id is not None:
+                flight_ids.append(flight_id)
+                flight_id = earliest[flight_id][1][level]
+                if max_length is not None:
+                    level -= 1
+            result.append(self._create_itinerary(flight_ids))
+
+        result.reverse()
+        return result
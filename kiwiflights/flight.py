@@ -24,6 +24,9 @@ from .utils import datetime_format
 
 class Flight(object):
     """Flight representation"""
+    __slots__ = ('source', 'destination', 'departure', 'arrival', 'flight_number', 'price',
+                 'bags_allowed', 'bag_price', 'segment')
+
     def __init__(self, **param):
         """
         :param opts: flight parameters, expected: source, destination, departure, arrival,
@@ -37,6 +40,8 @@ class Flight(object):
         self.price = param.pop('price')
         self.bags_allowed = param.pop('bags_allowed')
         self.bag_price = param.pop('bag_price')
+        # flights between the same airports (in any direction) fly on the same segment
+        self.segment = frozenset((self.source, self.destination,))
 
         if param:
             raise KeyError("Unknown flight attributes: %s" % str(param))
@@ -49,7 +54,14 @@ class Flight(object):
                        "flight_number='{flight_number}', " \
                        "price={price}, " \
                        "bags_allowed={bags_allowed}, " \
-                       "bag_price={bag_price})".format(**self.__dict__)
+                       "bag_price={bag_price})".format(source=self.source,
+                                                       destination=self.destination,
+                                                       departure=self.departure,
+                                                       arrival=self.arrival,
+                                                       flight_number=self.flight_number,
+                                                       price=self.price,
+                                                       bags_allowed=self.bags_allowed,
+                                                       bag_price=self.bag_price)
 
     def get_duration(self):
         """
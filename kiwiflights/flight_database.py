@@ -20,6 +20,7 @@
 """Airport database representation"""
 
 import logging
+from .columnar_flight_database import ColumnarFlightDatabase
 
 _logger = logging.getLogger(__name__)
 
@@ -33,6 +34,10 @@ class FlightDatabase(object):
         """
         self._flights = flights or []
         self._mapping = {}
+        # columnar copy of the database, built on demand
+        self._columnar = None
+        # callables notified about changed flights, see add_listener()
+        self._listeners = []
 
         for flight in self.flights:
             if flight.flight_number in self._mapping:
@@ -47,9 +52,21 @@ class FlightDatabase(object):
         """
         return self._flights
 
+    def __len__(self):
+        return len(self._flights)
+
     def __str__(self):
         return str(list(self._mapping.keys()))
 
+    def to_columnar(self):
+        """
+        :return: columnar copy of flight database, kept until a new flight is registered
+        :rtype: ColumnarFlightDatabase
+        """
+        if self._columnar is None:
+            self._columnar = ColumnarFlightDatabase(self._flights)
+        return self._columnar
+
     def to_csv(self):
         """
         :return: a CSV representation of flight database
@@ -64,6 +81,32 @@ class FlightDatabase(object):
         """
         return {'flights': [f.to_dict() for f in self._flights]}
 
+    def add_listener(self, listener):
+        """Add a listener notified about registered, unregistered and updated flights
+
+        A listener is called with a list of changed flights once a flight is changed, an updated
+        flight is reported together with the replaced one.
+
+        :param listener: a callable accepting a list of flights
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Remove a listener, see add_listener()
+
+        :param listener: listener to be removed
+        :raises ValueError: if listener was not added
+        """
+        self._listeners.remove(listener)
+
+    def _notify(self, flights):
+        """Notify listeners about changed flights
+
+        :param flights: changed flights
+        """
+        for listener in self._listeners:
+            listener(flights)
+
     def register(self, flight):
         """Register flight to database
 
@@ -79,3 +122,76 @@ class FlightDatabase(object):
 
         self.flights.append(flight)
         self._mapping[flight.flight_number] = flight
+        self._columnar = None
+        self._notify([flight])
+
+    def get_flight(self, flight_number, graceful=False):
+        """Retrieve flight by its number from database
+
+        :param flight_number: number of flight to be retrieved
+        :param graceful: if true do not raise an exception but return None if no flight found
+        :return: Flight
+        :raises KeyError: if no flight was found
+        """
+        ret = self._mapping.get(flight_number)
+
+        if ret is None and not graceful:
+            raise KeyError("Flight with number '%s' not found in the database" % flight_number)
+
+        return ret
+
+    def unregister(self, flight_number):
+        """Unregister flight from database and from airports it was registered to
+
+        :param flight_number: number of flight to be unregistered
+        :return: unregistered flight
+        :rtype: Flight
+        :raises KeyError: if no flight was found
+        """
+        _logger.debug("Unregistering flight '%s' from flight database", flight_number)
+
+        flight = self.get_flight(flight_number)
+        self._flights.remove(flight)
+        del self._mapping[flight_number]
+        self._columnar = None
+
+        flight.source.unregister_flight(flight, graceful=True)
+        flight.destination.unregister_flight(flight, graceful=True)
+        self._notify([flight])
+
+        return flight
+
+    def update(self, flight):
+        """Replace flight with the same flight number, the new one keeps its position
+
+        Airports the replaced flight was registered to are updated as well - if the new flight
+        flies from or to other airports, it is registered to them instead.
+
+        :param flight: the new flight
+        :type flight: Flight
+        :return: replaced flight
+        :rtype: Flight
+        :raises KeyError: if no flight with the same number was found
+        :raises ValueError: if source and destination of the new flight are same
+        """
+        _logger.debug("Updating flight '%s' in flight database", flight.flight_number)
+
+        old_flight = self.get_flight(flight.flight_number)
+
+        if flight.source == flight.destination:
+            raise ValueError("Source and destination of provided flight '%s' is same: %s"
+                             % (flight.flight_number, flight.source))
+
+        self._flights[self._flights.index(old_flight)] = flight
+        self._mapping[flight.flight_number] = flight
+        self._columnar = None
+
+        for old_airport, airport in ((old_flight.source, flight.source),
+                                     (old_flight.destination, flight.destination)):
+            if old_airport is airport:
+                airport.replace_flight(old_flight, flight, graceful=True)
+            elif old_airport.unregister_flight(old_flight, graceful=True):
+                airport.register_flight(flight)
+        self._notify([old_flight, flight])
+
+        return old_flight
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Itineraries kept up to date with incremental changes of flights"""
+
+import logging
+from .itinerary import Itinerary
+
+_logger = logging.getLogger(__name__)
+
+
+class IncrementalSearch(object):
+    """Itineraries of a system updated by batches of added, removed and updated flights
+
+    Itineraries are keyed by tuples of flight numbers. When flights change, only itineraries
+    taking changed flights are dropped and only itineraries taking added or updated flights are
+    computed - removing a flight cannot make any other itinerary possible, so the rest is kept.
+    Search parameters of the system are honored, they should not change between batches.
+    """
+    def __init__(self, system):
+        """
+        :param system: system to compute itineraries in, its flights are changed by apply()
+        :type system: System
+        """
+        if system.is_columnar():
+            raise ValueError("Incremental search is not available with columnar flight database")
+
+        self.system = system
+        self._itineraries = {}
+        # flight number to keys of itineraries taking the flight
+        self._keys_by_flight = {}
+
+        for item in system.iter_itineraries():
+            self._add(item)
+
+    def __len__(self):
+        return len(self._itineraries)
+
+    @property
+    def itineraries(self):
+        """
+        :return: all itineraries, itineraries added by changes come last
+        :rtype: list(Itinerary)
+        """
+        return list(self._itineraries.values())
+
+    def get_itinerary(self, flight_numbers, graceful=False):
+        """Retrieve itinerary by flight numbers of flights taken
+
+        :param flight_numbers: flight numbers of flights taken
+        :type flight_numbers: tuple(str)
+        :param graceful: if true do not raise an exception but return None if no itinerary found
+        :return: Itinerary
+        :raises KeyError: if no itinerary was found
+        """
+        ret = self._itineraries.get(tuple(flight_numbers))
+
+        if ret is None and not graceful:
+            raise KeyError("Itinerary taking flights %s not found" % (flight_numbers,))
+
+        return ret
+
+    @staticmethod
+    def _get_key(item):
+        """
+        :param item: itinerary
+        :return: key of itinerary - flight numbers of flights taken
+        :rtype: tuple(str)
+        """
+        return tuple(f.flight_number for f in item.flights_taken)
+
+    def _add(self, item):
+        """Add itinerary if it is not already known
+
+        :param item: itinerary to be added
+        :return: True if itinerary was added
+        """
+        key = self._get_key(item)
+        if key in self._itineraries:
+            return False
+
+        self._itineraries[key] = item
+        for flight_number in key:
+            self._keys_by_flight.setdefault(flight_number, set()).add(key)
+
+        return True
+
+    def _drop_flight(self, flight_number):
+        """Drop all itineraries taking flight
+
+        :param flight_number: number of flight
+        :return: dropped itineraries
+        :rtype: list(Itinerary)
+        """
+        ret = []
+
+        for key in self._keys_by_flight.pop(flight_number, ()):
+            ret.append(self._itineraries.pop(key))
+            for other_flight_number in key:
+                if other_flight_number != flight_number:
+                    keys = self._keys_by_flight[other_flight_number]
+                    keys.discard(key)
+                    if not keys:
+                        del self._keys_by_flight[other_flight_number]
+
+        return ret
+
+    def _iter_prefixes(self, flight):
+        """Compute prefixes of itineraries that end with flight, going back in time
+
+        :param flight: the last flight of prefixes
+        :return: a generator of prefixes, the prefix consisting of flight only comes first
+        :rtype: generator(list(Flight))
+        """
+        system = self.system
+        if not system.allows_bags(flight):
+            return
+
+        stack = [[flight]]
+        while stack:
+            prefix = stack.pop()
+            yield prefix
+
+            # a prefix of length flights makes length - 1 stops
+            if system.max_stops is not None and len(prefix) > system.max_stops:
+                continue
+
+            first_flight = prefix[0]
+            candidates = first_flight.source.get_arrivals_within(
+                first_flight.departure - system.max_wait_time,
+                first_flight.departure - system.min_wait_time
+            )
+            for previous_flight in candidates:
+                if not system.allows_bags(previous_flight) \
+                        or any(f.segment == previous_flight.segment for f in prefix):
+                    continue
+                stack.append([previous_flight] + prefix)
+
+    def _iter_through(self, flight):
+        """Compute itineraries taking flight
+
+        :param flight: flight to be taken
+        :return: a generator of itineraries taking flight
+        :rtype: generator(Itinerary)
+        """
+        for prefix in self._iter_prefixes(flight):
+            item = None
+            for prefix_flight in prefix:
+                item = Itinerary(prefix_flight, parent=item)
+
+            if item.length > 1:
+                yield item
+
+            stack = [item]
+            while stack:
+                item = stack.pop()
+                for next_flight in self.system._get_next_flights(item):
+                    next_item = Itinerary(next_flight, parent=item)
+                    yield next_item
+                    stack.append(next_item)
+
+    def apply(self, added=(), removed=(), updated=()):
+        """Apply a batch of changes to flights and update itineraries
+
+        Added flights are registered to flight database and to their airports, see
+        FlightDatabase.unregister() and FlightDatabase.update() for removed and updated flights.
+        An itinerary taking an updated flight is reported as both removed and added.
+
+        :param added: flights to be added
+        :type added: list(Flight)
+        :param removed: numbers of flights to be removed
+        :type removed: list(str)
+        :param updated: flights replacing flights with the same flight number
+        :type updated: list(Flight)
+        :return: a tuple (added itineraries, removed itineraries)
+        :rtype: tuple(list(Itinerary), list(Itinerary))
+        :raises KeyError: if a removed or updated flight is not known, nothing is changed then
+        :raises ValueError: if an added flight is already known, a flight is removed or updated
+                            more than once or a flight flies from and to the same airport,
+                            nothing is changed then
+        """
+        system = self.system
+        flight_database = system.flight_database
+        system.check_search_parameters()
+
+        # check the whole batch first so a failure does not leave flights changed partially
+        changed_numbers = set()
+        for flight_number in list(removed) + [f.flight_number for f in updated]:
+            flight_database.get_flight(flight_number)
+            if flight_number in changed_numbers:
+                raise ValueError("Flight with number '%s' is removed or updated more than once"
+                                 % flight_number)
+            changed_numbers.add(flight_number)
+
+        for flight in updated:
+            if flight.source == flight.destination:
+                raise ValueError("Source and destination of provided flight '%s' is same: %s"
+                                 % (flight.flight_number, flight.source))
+
+        added_numbers = set()
+        for flight in added:
+            if flight.flight_number in added_numbers \
+                    or flight_database.get_flight(flight.flight_number, graceful=True) is not None:
+                raise ValueError("Flight with number '%s' is already in database"
+                                 % flight.flight_number)
+            if flight.source == flight.destination:
+                raise ValueError("Source and destination of provided flight '%s' is same: %s"
+                                 % (flight.flight_number, flight.source))
+            added_numbers.add(flight.flight_number)
+
+        new_airports = []
+        for flight in list(added) + list(updated):
+            for airport in (flight.source, flight.destination):
+                known_airport = system.airport_database.get_airport(airport.code, graceful=True)
+                if known_airport is None:
+                    if airport not in new_airports:
+                        new_airports.append(airport)
+                elif known_airport is not airport:
+                    raise ValueError("Flight '%s' does not use airport '%s' kept in airport "
+                                     "database" % (flight.flight_number, airport.code))
+
+        for airport in new_airports:
+            system.airport_database.register(airport)
+
+        dropped = []
+        for flight_number in list(removed) + [f.flight_number for f in updated]:
+            dropped.extend(self._drop_flight(flight_number))
+
+        for flight_number in removed:
+            flight_database.unregister(flight_number)
+
+        for flight in updated:
+            flight_database.update(flight)
+
+        for flight in added:
+            flight_database.register(flight)
+            flight.source.register_flight(flight)
+            flight.destination.register_flight(flight)
+
+        computed = []
+        for flight in list(added) + list(updated):
+            for item in self._iter_through(flight):
+                if self._add(item):
+                    computed.append(item)
+
+        _logger.debug("Applied %d added, %d removed and %d updated flights: %d itineraries "
+                      "added, %d removed", len(added), len(removed), len(updated),
+                      len(computed), len(dropped))
+
+        return computed, dropped
@@ -19,20 +19,86 @@
 # ####################################################################
 """Itinerary representation"""
 
+import datetime
+
+
+def _get_seconds(delta):
+    """
+    :param delta: time difference
+    :type delta: datetime.timedelta
+    :return: time difference in whole seconds
+    :rtype: int
+    """
+    return delta.days * 86400 + delta.seconds
+
 
 class Itinerary(object):
-    """Itinerary representation"""
-    def __init__(self, **attributes):
+    """Itinerary representation
+
+    Itineraries are persistent - an itinerary keeps only the last flight taken and a reference
+    to the itinerary it extends, so prefixes are shared among all of their extensions. An
+    itinerary is thus created from its last flight and its parent, aggregates are computed
+    from the parent.
+
+    There can be a huge number of itineraries, so they are slotted and durations are kept as
+    integer seconds (total_flight_seconds, total_wait_seconds), timedelta instances are created
+    only on access to total_flight_duration and total_wait_time.
+    """
+    __slots__ = ('flight', 'parent', 'price', 'bags_allowed', 'bag_price',
+                 'total_flight_seconds', 'total_wait_seconds', 'length')
+
+    def __init__(self, flight, parent=None):
         """
-        :param attributes: itinerary attributes
+        :param flight: the last flight taken in itinerary
+        :type flight: Flight
+        :param parent: itinerary that is extended by flight, None for the very first flight
+        :type parent: Itinerary
         """
-        self.price = attributes.pop('price')
-        self.bags_allowed = attributes.pop('bags_allowed')
-        self.bag_price = attributes.pop('bag_price')
-        self.total_flight_duration = attributes.pop('total_flight_duration')
-        self.total_wait_time = attributes.pop('total_wait_time')
-        self.segments_seen = attributes.pop('segments_seen')
-        self.flights_taken = attributes.pop('flights_taken')
+        self.flight = flight
+        self.parent = parent
+
+        if parent is None:
+            self.price = flight.price
+            self.bags_allowed = flight.bags_allowed
+            self.bag_price = flight.bag_price
+            self.total_flight_seconds = _get_seconds(flight.arrival - flight.departure)
+            self.total_wait_seconds = 0
+            self.length = 1
+        else:
+            self.price = parent.price + flight.price
+            self.bags_allowed = min(parent.bags_allowed, flight.bags_allowed)
+            self.bag_price = parent.bag_price + flight.bag_price
+            self.total_flight_seconds = parent.total_flight_seconds \
+                + _get_seconds(flight.arrival - flight.departure)
+            self.total_wait_seconds = parent.total_wait_seconds \
+                + _get_seconds(flight.departure - parent.flight.arrival)
+            self.length = parent.length + 1
+
+    @classmethod
+    def from_aggregates(cls, flight, parent, price, bags_allowed, bag_price,
+                        total_flight_seconds, total_wait_seconds):
+        """Create itinerary with already computed aggregates, they are not recomputed from parent
+
+        :param flight: the last flight taken in itinerary
+        :param parent: itinerary that is extended by flight, None for the very first flight
+        :param price: total price
+        :param bags_allowed: number of bags allowed on all flights
+        :param bag_price: total price for bags
+        :param total_flight_seconds: time spent in air in seconds
+        :param total_wait_seconds: time spent waiting at airports in seconds
+        :return: itinerary
+        :rtype: Itinerary
+        """
+        itinerary = cls.__new__(cls)
+        itinerary.flight = flight
+        itinerary.parent = parent
+        itinerary.price = price
+        itinerary.bags_allowed = bags_allowed
+        itinerary.bag_price = bag_price
+        itinerary.total_flight_seconds = total_flight_seconds
+        itinerary.total_wait_seconds = total_wait_seconds
+        itinerary.length = parent.length + 1 if parent is not None else 1
+        return itinerary
 
     def __repr__(self):
         return "Itinerary(price={price}, " \
@@ -40,17 +106,75 @@ class Itinerary(object):
                          "bag_price={bag_price}, " \
                          "total_flight_duration={total_flight_duration}, " \
                          "total_wait_time={total_wait_time}, " \
-                         "flights_taken={flights_taken}, " \
-                         "segments_seen={segments_seen})".format(**self.__dict__)
+                         "flights_taken={flights_taken})".format(
+                             price=self.price,
+                             bags_allowed=self.bags_allowed,
+                             bag_price=self.bag_price,
+                             total_flight_duration=self.total_flight_duration,
+                             total_wait_time=self.total_wait_time,
+                             flights_taken=self.flights_taken)
+
+    @property
+    def total_flight_duration(self):
+        """
+        :return: time spent in air
+        :rtype: datetime.timedelta
+        """
+        return datetime.timedelta(seconds=self.total_flight_seconds)
+
+    @property
+    def total_wait_time(self):
+        """
+        :return: time spent waiting at airports
+        :rtype: datetime.timedelta
+        """
+        return datetime.timedelta(seconds=self.total_wait_seconds)
+
+    @property
+    def flights_taken(self):
+        """
+        :return: flights taken in itinerary, materialized on each call
+        :rtype: list(Flight)
+        """
+        flights = []
+        item = self
+        while item is not None:
+            flights.append(item.flight)
+            item = item.parent
+        flights.reverse()
+        return flights
+
+    @property
+    def segments_seen(self):
+        """
+        :return: segments (frozensets of airports) that were already flown, materialized on
+                 each call, use has_segment() for checks
+        :rtype: dict
+        """
+        return {f.segment: True for f in self.flights_taken}
+
+    def has_segment(self, segment):
+        """Check whether the given segment was already flown in itinerary
+
+        :param segment: segment - a frozenset of two airports, see Flight.segment
+        :return: True if a flight on segment was already taken
+        """
+        item = self
+        while item is not None:
+            if item.flight.segment == segment:
+                return True
+            item = item.parent
+        return False
 
     def to_dict(self):
         """
         :return: dict representation of itinerary
         """
+        flights_taken = self.flights_taken
         stops = [{
             "airport": f.destination.code,
-            "wait_time": str(self.flights_taken[idx+1].departure - self.flights_taken[idx].arrival)
-        } for idx, f in enumerate(self.flights_taken[:-1])]
+            "wait_time": str(flights_taken[idx+1].departure - f.arrival)
+        } for idx, f in enumerate(flights_taken[:-1])]
 
         return {
             'price': self.price,
@@ -58,8 +182,8 @@ class Itinerary(object):
             'bag_price': self.bag_price,
             'total_flight_duration': str(self.total_flight_duration),
             'total_wait_time': str(self.total_wait_time),
-            'flights_taken': [f.flight_number for f in self.flights_taken],
-            'source': self.flights_taken[0].source.code,
-            'destination': self.flights_taken[-1].destination.code,
+            'flights_taken': [f.flight_number for f in flights_taken],
+            'source': flights_taken[0].source.code,
+            'destination': flights_taken[-1].destination.code,
             'stops': stops,
         }
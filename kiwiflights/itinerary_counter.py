@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Counts and aggregates of itineraries per airport pair computed without enumerating them"""
+
+import logging
+from .columnar_engine import ColumnarEngine
+
+_logger = logging.getLogger(__name__)
+
+
+class PairSummary(object):
+    """Number of itineraries between two airports with the range of their prices and durations"""
+    __slots__ = ('source', 'destination', 'count', 'min_price', 'max_price',
+                 'min_duration_seconds', 'max_duration_seconds')
+
+    # Header of CSV representation, see to_csv()
+    CSV_HEADER = 'source,destination,count,min_price,max_price,min_duration,max_duration\n'
+
+    def __init__(self, source, destination, count, min_price, max_price, min_duration_seconds,
+                 max_duration_seconds):
+        """
+        :param source: code of source airport
+        :param destination: code of destination airport
+        :param count: number of itineraries
+        :param min_price: price of the cheapest itinerary
+        :param max_price: price of the most expensive itinerary
+        :param min_duration_seconds: total duration of the shortest itinerary in seconds
+        :param max_duration_seconds: total duration of the longest itinerary in seconds
+        """
+        self.source = source
+        self.destination = destination
+        self.count = count
+        self.min_price = min_price
+        self.max_price = max_price
+        self.min_duration_seconds = min_duration_seconds
+        self.max_duration_seconds = max_duration_seconds
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, self.to_dict())
+
+    def to_dict(self):
+        """
+        :return: a dict representation of summary, durations in seconds
+        """
+        return {
+            'source': self.source,
+            'destination': self.destination,
+            'count': self.count,
+            'min_price': self.min_price,
+            'max_price': self.max_price,
+            'min_duration': self.min_duration_seconds,
+            'max_duration': self.max_duration_seconds
+        }
+
+    @staticmethod
+    def _format_duration(seconds):
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        return '%d:%02d:%02d' % (hours, minutes, seconds)
+
+    def to_csv(self):
+        """
+        :return: CSV representation of summary, durations are formatted as hours:minutes:seconds
+        """
+        return '%s,%s,%d,%r,%r,%s,%s\n' % (self.source, self.destination, self.count,
+                                           self.min_price, self.max_price,
+                                           self._format_duration(self.min_duration_seconds),
+                                           self._format_duration(self.max_duration_seconds))
+
+
+class ItineraryCounter(ColumnarEngine):
+    """Count itineraries per airport pair by dynamic programming over connections of flights
+
+    Continuations of flight g (g followed by flights connecting to it, none of them repeating
+    a segment) are summarized per final destination as a tuple (count, min price, max price,
+    min arrival, max arrival). A summary depends on segments taken before g, which continuations
+    of g have to avoid, but only on those of them that can be flown after g within the number of
+    flights left until the maximum number of stops - summaries are memoized keyed by flight,
+    these segments (a bit set over segment ids) and the number of flights left. The cycle rule
+    is therefore honored exactly, summaries are shared whenever earlier segments cannot repeat
+    after g, and no itinerary is ever created. Without the stops limit nearly all segments can
+    be flown after early flights of dense schedules, so summaries are rarely shared and the
+    count takes time proportional to the number of itineraries.
+    """
+    def __init__(self, system):
+        """
+        :param system: system to count itineraries in
+        :type system: System
+        """
+        super().__init__(system)
+        # flight id to ids of flights inside wait window, allowing bags, with other segment
+        self._next_flight_ids = {}
+        # flight id to bit sets of segments that can be flown after the flight, the k-th one in
+        # continuations of at most k + 1 flights; only the last one without the stops limit
+        self._segments_after = {}
+        # flight id to the maximum number of flights in a continuation, cycles not considered
+        self._height = {}
+        self._summaries = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _prepare(self, flight_ids):
+        """Compute connections, segments flown after and heights of flights
+
+        :param flight_ids: ids of flights allowing required bags
+        """
+        database = self.database
+        departure = database.departure
+        arrival = database.arrival
+        destination = database.destination
+        segment = database.segment
+        bags_allowed = database.bags_allowed
+        bags = self.bags
+        next_flight_ids = self._next_flight_ids
+        segments_after = self._segments_after
+        height = self._height
+        max_length = self.max_stops + 1 if self.max_stops is not None else None
+
+        # flights connecting to a flight depart after it arrives, process the latest ones first
+        for flight_id in sorted(flight_ids, key=lambda f: departure[f], reverse=True):
+            arrival_time = arrival[flight_id]
+            own_segment = segment[flight_id]
+            connections = [next_flight_id
+                           for next_flight_id in database.get_departures_within(
+                               destination[flight_id],
+                               arrival_time + self.min_wait_time,
+                               arrival_time + self.max_wait_time)
+                           if bags_allowed[next_flight_id] >= bags
+                           and segment[next_flight_id] != own_segment]
+
+            max_height = 0
+            for next_flight_id in connections:
+                max_height = max(max_height, height[next_flight_id])
+            flight_height = height[flight_id] = max_height + 1
+            next_flight_ids[flight_id] = connections
+
+            if max_length is None:
+                mask = 0
+                for next_flight_id in connections:
+                    mask |= (1 << segment[next_flight_id]) | segments_after[next_flight_id][-1]
+                segments_after[flight_id] = [mask]
+                continue
+
+            masks = [0] * min(flight_height, max_length)
+            for next_flight_id in connections:
+                next_masks = segments_after[next_flight_id]
+                own_mask = 1 << segment[next_flight_id]
+                for length in range(1, len(masks)):
+                    masks[length] |= own_mask | next_masks[min(length, len(next_masks)) - 1]
+            segments_after[flight_id] = masks
+
+    def _get_key(self, flight_id, seen, length):
+        """
+        :param flight_id: id of the first flight of continuations
+        :param seen: bit set of segments taken before the flight
+        :param length: maximum number of flights in continuations, None for no limit
+        :return: key of memoized summary of continuations
+        """
+        height = self._height[flight_id]
+        length = height if length is None else min(length, height)
+        masks = self._segments_after[flight_id]
+        mask = masks[-1] if length >= len(masks) else masks[length - 1]
+        return flight_id, seen & mask, length
+
+    @staticmethod
+    def _merge(summary, continuations, price):
+        """Merge summary of continuations of a following flight to summary of a flight
+
+        :param summary: summary to merge to
+        :param continuations: summary of continuations of following flight
+        :param price: price of flight continuations are extended with
+        """
+        for destination, (count, min_price, max_price, min_arrival, max_arrival) \
+                in continuations.items():
+            entry = summary.get(destination)
+            if entry is None:
+                summary[destination] = (count, min_price + price, max_price + price,
+                                        min_arrival, max_arrival)
+            else:
+                summary[destination] = (entry[0] + count,
+                                        min(entry[1], min_price + price),
+                                        max(entry[2], max_price + price),
+                                        min(entry[3], min_arrival),
+                                        max(entry[4], max_arrival))
+
+    def _get_summary(self, flight_id, seen, length):
+        """Summarize continuations of a flight, computed summaries are memoized
+
+        Continuations are walked with an explicit stack, they can be longer than the recursion
+        limit allows.
+
+        :param flight_id: id of the first flight of continuations
+        :param seen: bit set of segments taken before the flight, not containing its segment
+        :param length: maximum number of flights in continuations
+        :return: a dict mapping destination airport ids to tuples (count, min price, max price,
+                 min arrival, max arrival)
+        """
+        summaries = self._summaries
+        key = self._get_key(flight_id, seen, length)
+        ret = summaries.get(key)
+        if ret is not None:
+            self.cache_hits += 1
+            return ret
+
+        database = self.database
+        destination = database.destination
+        arrival = database.arrival
+        price = database.price
+        segment = database.segment
+        next_flight_ids = self._next_flight_ids
+
+        def new_frame(frame_flight_id, frame_seen, frame_length, frame_key):
+            self.cache_misses += 1
+            flight_price = price[frame_flight_id]
+            arrival_time = arrival[frame_flight_id]
+            summary = {destination[frame_flight_id]: (1, flight_price, flight_price,
+                                                      arrival_time, arrival_time)}
+            connections = next_flight_ids[frame_flight_id] if frame_length > 1 else ()
+            # flight, segments seen by continuations, their length, key, summary,
+            # connections, position in connections and key of summary being computed
+            return [frame_flight_id, frame_seen | (1 << segment[frame_flight_id]),
+                    frame_length - 1, frame_key, summary, connections, 0, None]
+
+        stack = [new_frame(flight_id, seen, key[2], key)]
+        while stack:
+            frame = stack[-1]
+            frame_flight_id, frame_seen, next_length, frame_key, summary, connections, \
+                position, pending_key = frame
+
+            if pending_key is not None:
+                self._merge(summary, summaries[pending_key], price[frame_flight_id])
+                frame[7] = None
+
+            while position < len(connections):
+                next_flight_id = connections[position]
+                position += 1
+                if (frame_seen >> segment[next_flight_id]) & 1:
+                    continue
+
+                next_key = self._get_key(next_flight_id, frame_seen, next_length)
+                continuations = summaries.get(next_key)
+                if continuations is None:
+                    frame[6] = position
+                    frame[7] = next_key
+                    stack.append(new_frame(next_flight_id, frame_seen, next_key[2], next_key))
+                    break
+
+                self.cache_hits += 1
+                self._merge(summary, continuations, price[frame_flight_id])
+            else:
+                summaries[frame_key] = summary
+                stack.pop()
+
+        return summaries[key]
+
+    def iter_summaries(self):
+        """Count itineraries and aggregate their prices and durations per airport pair
+
+        :return: an iterator over summaries of airport pairs connected by an itinerary, ordered by
+                 source and destination code
+        :rtype: iterator(PairSummary)
+        """
+        database = self.database
+        source = database.source
+        departure = database.departure
+        price = database.price
+        segment = database.segment
+        # an itinerary of length flights makes length - 1 stops
+        max_length = self.max_stops + 1 if self.max_stops is not None else None
+
+        flight_ids = self.get_seed_flight_ids()
+        self._prepare(flight_ids)
+
+        # (source id, destination id) to [count, min price, max price, min duration, max duration]
+        pairs = {}
+        if max_length is None or max_length > 1:
+            for flight_id in flight_ids:
+                seen = 1 << segment[flight_id]
+                flight_price = price[flight_id]
+                departure_time = departure[flight_id]
+                source_id = source[flight_id]
+                length = max_length - 1 if max_length is not None else None
+
+                for next_flight_id in self._next_flight_ids[flight_id]:
+                    continuations = self._get_summary(next_flight_id, seen, length)
+                    for destination_id, (count, min_price, max_price, min_arrival, max_arrival) \
+                            in continuations.items():
+                        entry = pairs.get((source_id, destination_id))
+                        if entry is None:
+                            pairs[(source_id, destination_id)] = [
+                                count, min_price + flight_price, max_price + flight_price,
+                                min_arrival - departure_time, max_arrival - departure_time]
+                        else:
+                            entry[0] += count
+                            entry[1] = min(entry[1], min_price + flight_price)
+                            entry[2] = max(entry[2], max_price + flight_price)
+                            entry[3] = min(entry[3], min_arrival - departure_time)
+                            entry[4] = max(entry[4], max_arrival - departure_time)
+
+        _logger.debug("Summaries of continuations: %d hits, %d misses, %d kept",
+                      self.cache_hits, self.cache_misses, len(self._summaries))
+
+        result = []
+        for (source_id, destination_id), entry in pairs.items():
+            result.append(PairSummary(database.get_airport(source_id).code,
+                                      database.get_airport(destination_id).code, *entry))
+        result.sort(key=lambda s: (s.source, s.destination))
+        return iter(result)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Fast JSON serialization of itineraries
+
+Itineraries are serialized from templates filled with cached fragments, Itinerary.to_dict() is
+not called and no intermediate dicts are built. The output is the same as dict2json() produces
+for Itinerary.to_dict().
+"""
+
+import json
+import math
+import datetime
+from json.encoder import encode_basestring_ascii
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def get_json_backend():
+    """
+    :return: name of backend used to escape strings - 'orjson' if installed, 'json' otherwise
+    :rtype: str
+    """
+    return 'orjson' if orjson is not None else 'json'
+
+
+def encode_string(string):
+    """Encode string to JSON as json.dumps() does (with ensure_ascii)
+
+    :param string: string to encode
+    :return: JSON representation of string
+    :rtype: str
+    """
+    if orjson is not None:
+        ret = orjson.dumps(string)
+        # orjson does not escape non-ASCII characters nor DEL, json does
+        if ret.isascii() and b'\x7f' not in ret:
+            return ret.decode('ascii')
+
+    return encode_basestring_ascii(string)
+
+
+def encode_number(number):
+    """Encode number to JSON as json.dumps() does
+
+    :param number: number to encode
+    :return: JSON representation of number
+    :rtype: str
+    """
+    number_type = type(number)
+
+    if number_type is float:
+        if math.isfinite(number):
+            return float.__repr__(number)
+        return json.dumps(number)
+    elif number_type is int:
+        return int.__repr__(number)
+
+    return json.dumps(number)
+
+
+class ItineraryEncoder(object):
+    """JSON encoder of itineraries with cached fragments
+
+    Encoded flight numbers and airport codes are cached per flight number, encoded durations
+    per number of seconds - they repeat a lot among itineraries. Stop wait times are computed
+    from aggregates of itineraries rather than from flight datetimes, so durations are encoded
+    in whole seconds.
+    """
+    def __init__(self, pretty=True, indent=''):
+        """
+        :param pretty: use pretty formatting as dict2json() does
+        :param indent: indentation of the whole encoded itinerary (pretty formatting only)
+        """
+        self.pretty = pretty
+        self.indent = indent
+        # flight number to a tuple (encoded flight number, encoded source, encoded destination)
+        self._flights = {}
+        # seconds to encoded duration
+        self._durations = {}
+
+    def _get_flight(self, flight):
+        """
+        :param flight: flight to get encoded fragments for
+        :return: a tuple (encoded flight number, encoded source code, encoded destination code)
+        """
+        ret = self._flights.get(flight.flight_number)
+
+        if ret is None:
+            ret = self._flights[flight.flight_number] = (encode_string(flight.flight_number),
+                                                         encode_string(flight.source.code),
+                                                         encode_string(flight.destination.code))
+
+        return ret
+
+    def _get_duration(self, seconds):
+        """
+        :param seconds: duration in seconds
+        :return: encoded duration, as str(datetime.timedelta) is encoded
+        """
+        ret = self._durations.get(seconds)
+
+        if ret is None:
+            ret = self._durations[seconds] = \
+                encode_string(str(datetime.timedelta(seconds=seconds)))
+
+        return ret
+
+    def encode(self, itinerary):
+        """
+        :param itinerary: itinerary to encode
+        :type itinerary: Itinerary
+        :return: JSON representation of itinerary, the same as dict2json() gives for
+                 Itinerary.to_dict() (indented if indent was set)
+        :rtype: str
+        """
+        items = []
+        item = itinerary
+        while item is not None:
+            items.append(item)
+            item = item.parent
+        items.reverse()
+
+        get_flight = self._get_flight
+        get_duration = self._get_duration
+
+        flights = [get_flight(item.flight) for item in items]
+        # wait time at a stop is the difference of total wait times of consecutive itineraries
+        stops = [(flights[idx][2],
+                  get_duration(items[idx + 1].total_wait_seconds - items[idx].total_wait_seconds))
+                 for idx in range(len(items) - 1)]
+
+        if self.pretty:
+            return self._encode_pretty(itinerary, flights, stops)
+        return self._encode_compact(itinerary, flights, stops)
+
+    def _encode_compact(self, itinerary, flights, stops):
+        """Encode itinerary as json.dumps() does with default (insertion ordered) keys"""
+        return '{"price": %s, "bags_allowed": %s, "bag_price": %s, ' \
+               '"total_flight_duration": %s, "total_wait_time": %s, ' \
+               '"flights_taken": [%s], "source": %s, "destination": %s, "stops": [%s]}' % (
+                   encode_number(itinerary.price),
+                   encode_number(itinerary.bags_allowed),
+                   encode_number(itinerary.bag_price),
+                   self._get_duration(itinerary.total_flight_seconds),
+                   self._get_duration(itinerary.total_wait_seconds),
+                   ', '.join([f[0] for f in flights]),
+                   flights[0][1],
+                   flights[-1][2],
+                   ', '.join(['{"airport": %s, "wait_time": %s}' % stop for stop in stops]))
+
+    def _encode_pretty(self, itinerary, flights, stops):
+        """Encode itinerary as json.dumps() does with sorted keys and indentation of 2"""
+        nl0 = '\n' + self.indent
+        nl1 = nl0 + '  '
+        nl2 = nl1 + '  '
+        nl3 = nl2 + '  '
+
+        if stops:
+            stop_template = '{' + nl3 + '"airport": %s,' + nl3 + '"wait_time": %s' + nl2 + '}'
+            encoded_stops = '[' + nl2 + (',' + nl2).join([stop_template % stop for stop in stops]) \
+                + nl1 + ']'
+        else:
+            encoded_stops = '[]'
+
+        flights_taken = (',' + nl2).join([f[0] for f in flights])
+
+        return ''.join((
+            '{', nl1, '"bag_price": ', encode_number(itinerary.bag_price),
+            ',', nl1, '"bags_allowed": ', encode_number(itinerary.bags_allowed),
+            ',', nl1, '"destination": ', flights[-1][2],
+            ',', nl1, '"flights_taken": [', nl2, flights_taken, nl1, ']',
+            ',', nl1, '"price": ', encode_number(itinerary.price),
+            ',', nl1, '"source": ', flights[0][1],
+            ',', nl1, '"stops": ', encoded_stops,
+            ',', nl1, '"total_flight_duration": ',
+            self._get_duration(itinerary.total_flight_seconds),
+            ',', nl1, '"total_wait_time": ',
+            self._get_duration(itinerary.total_wait_seconds),
+            nl0, '}'
+        ))
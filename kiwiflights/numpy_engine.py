@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Itinerary search expanding whole frontiers of partial itineraries at once using NumPy"""
+
+import logging
+from .columnar_engine import ColumnarEngine
+from .itinerary import Itinerary
+
+_logger = logging.getLogger(__name__)
+
+
+class Frontier(object):
+    """A batch of partial itineraries of the same length, stored in arrays
+
+    Itinerary i in frontier took flight flight_ids[i] last, it extends itinerary parents[i]
+    of the parent frontier (None for frontier of very first flights). Aggregates are kept
+    in arrays - flight_duration and wait_time are in seconds.
+    """
+    def __init__(self, **attributes):
+        """
+        :param attributes: frontier attributes
+        """
+        self.parent = attributes.pop('parent')
+        self.parents = attributes.pop('parents')
+        self.flight_ids = attributes.pop('flight_ids')
+        self.segments = attributes.pop('segments')
+        self.price = attributes.pop('price')
+        self.bag_price = attributes.pop('bag_price')
+        self.bags_allowed = attributes.pop('bags_allowed')
+        self.flight_duration = attributes.pop('flight_duration')
+        self.wait_time = attributes.pop('wait_time')
+        # materialized itineraries, assigned by consumers of frontiers if needed
+        self.itineraries = None
+
+    def __len__(self):
+        return len(self.flight_ids)
+
+    def split(self, size):
+        """Split frontier into frontiers of at most the given size
+
+        :param size: maximum size of frontier
+        :return: a list of frontiers
+        :rtype: list(Frontier)
+        """
+        if len(self) <= size:
+            return [self]
+
+        return [Frontier(parent=self.parent,
+                         parents=self.parents[start:start + size] if self.parents is not None
+                         else None,
+                         flight_ids=self.flight_ids[start:start + size],
+                         segments=self.segments[start:start + size],
+                         price=self.price[start:start + size],
+                         bag_price=self.bag_price[start:start + size],
+                         bags_allowed=self.bags_allowed[start:start + size],
+                         flight_duration=self.flight_duration[start:start + size],
+                         wait_time=self.wait_time[start:start + size])
+                for start in range(0, len(self), size)]
+
+
+class NumpyEngine(ColumnarEngine):
+    """Itinerary search expanding frontiers using array operations
+
+    Itineraries are produced frontier by frontier, so the order differs from System's depth-first
+    search, the set of itineraries is the same.
+    """
+    # Maximum number of partial itineraries expanded at once, bounds memory used
+    _FRONTIER_SIZE = 1 << 16
+
+    def __init__(self, system):
+        """
+        :param system: system to search itineraries in
+        :type system: System
+        """
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("NumPy engine requires numpy to be installed")
+
+        super().__init__(system)
+        self._np = numpy
+
+        database = self.database
+        offsets, order, times = database.get_departure_index()
+
+        self._departure = numpy.array(database.departure, dtype=numpy.int64)
+        self._arrival = numpy.array(database.arrival, dtype=numpy.int64)
+        self._destination = numpy.array(database.destination, dtype=numpy.int64)
+        self._price = numpy.array(database.price, dtype=numpy.float64)
+        self._bag_price = numpy.array(database.bag_price, dtype=numpy.float64)
+        self._bags_allowed = numpy.array(database.bags_allowed, dtype=numpy.int64)
+        self._segment = numpy.array(database.segment, dtype=numpy.int64)
+        self._order = numpy.array(order, dtype=numpy.int64)
+
+        # Sorted departure table is keyed by (source airport, departure) packed into one integer,
+        # airports are spread far enough so that wait window queries never cross airport boundary
+        self._time_base = int(self._departure.min()) if len(database) else 0
+        self._time_span = (int(self._arrival.max()) - self._time_base + self.max_wait_time + 1) \
+            if len(database) else 1
+        source = numpy.repeat(numpy.arange(database.airport_count, dtype=numpy.int64),
+                              numpy.diff(numpy.array(offsets, dtype=numpy.int64)))
+        self._keys = source * self._time_span \
+            + (numpy.array(times, dtype=numpy.int64) - self._time_base)
+
+    def _get_seed_frontier(self):
+        """
+        :return: frontier of itineraries consisting of a single flight
+        :rtype: Frontier
+        """
+        np = self._np
+        flight_ids = np.array(self.get_seed_flight_ids(), dtype=np.int64)
+
+        return Frontier(parent=None,
+                        parents=None,
+                        flight_ids=flight_ids,
+                        segments=self._segment[flight_ids][:, None],
+                        price=self._price[flight_ids],
+                        bag_price=self._bag_price[flight_ids],
+                        bags_allowed=self._bags_allowed[flight_ids],
+                        flight_duration=self._arrival[flight_ids] - self._departure[flight_ids],
+                        wait_time=np.zeros(len(flight_ids), dtype=np.int64))
+
+    def _expand(self, frontier):
+        """Expand all itineraries in frontier by one flight
+
+        :param frontier: frontier to be expanded
+        :return: frontier of extended itineraries, None if no itinerary can be extended
+        :rtype: Frontier
+        """
+        np = self._np
+
+        # each column of segments stands for a flight taken, itineraries make columns - 1 stops
+        if self.max_stops is not None and frontier.segments.shape[1] > self.max_stops:
+            return None
+
+        arrival = self._arrival[frontier.flight_ids]
+        base = self._destination[frontier.flight_ids] * self._time_span - self._time_base
+        start = np.searchsorted(self._keys, base + arrival + self.min_wait_time, side='left')
+        end = np.searchsorted(self._keys, base + arrival + self.max_wait_time, side='right')
+
+        counts = end - start
+        total = int(counts.sum())
+        if total == 0:
+            return None
+
+        # candidate i comes from itinerary parents[i], it is the k-th departure in its window
+        parents = np.repeat(np.arange(len(frontier), dtype=np.int64), counts)
+        positions = np.arange(total, dtype=np.int64) + np.repeat(start - np.cumsum(counts) + counts,
+                                                                 counts)
+        candidates = self._order[positions]
+        segments = self._segment[candidates]
+
+        # cycle check - segment of the next flight cannot be already on the path
+        keep = ~(frontier.segments[parents] == segments[:, None]).any(axis=1)
+        if self.bags:
+            keep &= self._bags_allowed[candidates] >= self.bags
+        if not keep.any():
+            return None
+
+        parents = parents[keep]
+        candidates = candidates[keep]
+
+        return Frontier(parent=frontier,
+                        parents=parents,
+                        flight_ids=candidates,
+                        segments=np.concatenate((frontier.segments[parents],
+                                                 segments[keep][:, None]), axis=1),
+                        price=frontier.price[parents] + self._price[candidates],
+                        bag_price=frontier.bag_price[parents] + self._bag_price[candidates],
+                        bags_allowed=np.minimum(frontier.bags_allowed[parents],
+                                                self._bags_allowed[candidates]),
+                        flight_duration=frontier.flight_duration[parents]
+                        + self._arrival[candidates] - self._departure[candidates],
+                        wait_time=frontier.wait_time[parents]
+                        + self._departure[candidates] - arrival[parents])
+
+    def iter_frontiers(self):
+        """Compute frontiers, the very first one holds itineraries of a single flight
+
+        A frontier is expanded only after it was yielded, so consumers can attach
+        materialized itineraries to it before its children are produced.
+
+        :return: a generator of frontiers
+        :rtype: generator(Frontier)
+        """
+        stack = self._get_seed_frontier().split(self._FRONTIER_SIZE)
+        stack.reverse()
+
+        while stack:
+            frontier = stack.pop()
+            yield frontier
+
+            expanded = self._expand(frontier)
+            if expanded is not None:
+                _logger.debug("Frontier of %d itineraries expanded to %d itineraries",
+                              len(frontier), len(expanded))
+                children = expanded.split(self._FRONTIER_SIZE)
+                children.reverse()
+                stack.extend(children)
+
+    def iter_itineraries(self):
+        """Compute itineraries lazily
+
+        Itineraries are created from aggregates computed in frontier arrays.
+
+        :return: a generator of available itineraries
+        :rtype: generator(Itinerary)
+        """
+        get_flight = self.get_flight
+
+        for frontier in self.iter_frontiers():
+            if frontier.parent is None:
+                frontier.itineraries = [Itinerary(get_flight(flight_id))
+                                        for flight_id in frontier.flight_ids.tolist()]
+                continue
+
+            parent_itineraries = frontier.parent.itineraries
+            frontier.itineraries = [
+                Itinerary.from_aggregates(get_flight(flight_id),
+                                          parent_itineraries[parent],
+                                          price,
+                                          bags_allowed,
+                                          bag_price,
+                                          duration,
+                                          wait_time)
+                for flight_id, parent, price, bags_allowed, bag_price, duration, wait_time
+                in zip(frontier.flight_ids.tolist(),
+                       frontier.parents.tolist(),
+                       frontier.price.tolist(),
+                       frontier.bags_allowed.tolist(),
+                       frontier.bag_price.tolist(),
+                       frontier.flight_duration.tolist(),
+                       frontier.wait_time.tolist())
+            ]
+            yield from frontier.itineraries
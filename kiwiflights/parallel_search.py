@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Itinerary search distributed over worker processes"""
+
+import heapq
+import logging
+import traceback
+import multiprocessing
+from .itinerary import Itinerary
+
+_logger = logging.getLogger(__name__)
+
+# Search run in parent process, forked workers inherit it so system is not pickled
+_search = None
+
+
+def _worker(task_queue, result_queue):
+    """Worker process main loop - continue depth-first search from prefixes received
+
+    Itineraries are reported in pre-order as (length, flight index) pairs, so the parent
+    can rebuild them keeping only the current path.
+
+    :param task_queue: queue of tasks - (task id, tuple of flight indexes of prefix)
+    :param result_queue: queue to report results to
+    """
+    search = _search
+
+    try:
+        task = task_queue.get()
+        while task is not None:
+            task_id, prefix = task
+
+            stack = [search.get_itinerary(prefix)]
+            batch = []
+            while stack:
+                item = stack.pop()
+                if item.length > len(prefix):
+                    batch.append((item.length, search.flight_index[item.flight]))
+                    if len(batch) >= search.batch_size:
+                        result_queue.put((task_id, batch))
+                        batch = []
+
+                for next_flight in search.system._get_next_flights(item):
+                    stack.append(Itinerary(next_flight, parent=item))
+
+            result_queue.put((task_id, batch))
+            result_queue.put((task_id, None))
+            task = task_queue.get()
+    except Exception:  # pylint: disable=broad-except
+        result_queue.put((None, traceback.format_exc()))
+
+
+class ParallelSearch(object):
+    """Depth-first itinerary search distributed over worker processes
+
+    Search is partitioned by prefixes - starting with seed flights, prefixes with the largest
+    number of possible connections are expanded in parent process until there are enough tasks
+    so that large hub subtrees do not end up as stragglers. Workers pull tasks one by one,
+    the largest first, and stream itineraries back in batches.
+
+    Workers are forked, the system is not pickled. Itineraries are yielded in different order
+    than by System's sequential search.
+    """
+    # Number of tasks per worker to create by expanding prefixes
+    _TASKS_PER_JOB = 16
+    # Number of itineraries sent by worker at once
+    _BATCH_SIZE = 4096
+
+    def __init__(self, system, jobs):
+        """
+        :param system: system to search itineraries in
+        :type system: System
+        :param jobs: number of worker processes
+        """
+        if system.engine != system.ENGINE_DFS:
+            raise ValueError("Parallel search is available only with search engine '%s'"
+                             % system.ENGINE_DFS)
+
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise ValueError("Parallel search requires 'fork' start method")
+
+        self.system = system
+        self.jobs = jobs
+        self.batch_size = self._BATCH_SIZE
+        self.flights = [f for airport in system.airport_database.airports
+                        for f in airport.departures]
+        self.flight_index = {flight: idx for idx, flight in enumerate(self.flights)}
+
+    def get_itinerary(self, prefix):
+        """
+        :param prefix: flight indexes of itinerary
+        :return: itinerary consisting of given flights
+        :rtype: Itinerary
+        """
+        item = None
+        for idx in prefix:
+            item = Itinerary(self.flights[idx], parent=item)
+        return item
+
+    def _split_tasks(self, tasks):
+        """Expand prefixes with the largest number of connections until there are enough tasks
+
+        :param tasks: a list of (connection count, prefix itinerary), extended in place
+        :return: a generator of itineraries found while expanding prefixes
+        """
+        heap = [(-count, idx, item) for idx, (count, item) in enumerate(tasks)]
+        heapq.heapify(heap)
+        counter = len(heap)
+        del tasks[:]
+
+        while heap and len(heap) < self.jobs * self._TASKS_PER_JOB:
+            count, idx, item = heapq.heappop(heap)
+            if count > -2:
+                # splitting a prefix with a single connection would not help balancing
+                heapq.heappush(heap, (count, idx, item))
+                break
+
+            for next_flight in self.system._get_next_flights(item):
+                next_item = Itinerary(next_flight, parent=item)
+                yield next_item
+                counter += 1
+                heapq.heappush(heap, (-len(self.system._get_next_flights(next_item)),
+                                      counter, next_item))
+
+        # the largest tasks go first
+        tasks.extend((-count, item) for count, _, item in sorted(heap))
+
+    def iter_itineraries(self):
+        """Compute itineraries lazily using worker processes
+
+        :return: a generator of available itineraries
+        :rtype: generator(Itinerary)
+        """
+        global _search  # pylint: disable=global-statement
+
+        tasks = [(len(self.system._get_next_flights(item)), item)
+                 for item in self.system._get_initialized_stack()]
+        yield from self._split_tasks(tasks)
+
+        roots = {}
+        context = multiprocessing.get_context('fork')
+        task_queue = context.Queue()
+        result_queue = context.Queue()
+
+        for task_id, (count, item) in enumerate(tasks):
+            if count == 0:
+                continue
+            roots[task_id] = item
+            task_queue.put((task_id, tuple(self.flight_index[f] for f in item.flights_taken)))
+
+        for _ in range(self.jobs):
+            task_queue.put(None)
+
+        _logger.debug("Starting %d workers for %d tasks", self.jobs, len(roots))
+        _search = self
+        workers = [context.Process(target=_worker, args=(task_queue, result_queue))
+                   for _ in range(self.jobs)]
+        try:
+            for worker in workers:
+                worker.start()
+        finally:
+            _search = None
+
+        try:
+            # current path of each task, path[length - 1] is the itinerary of given length
+            paths = {task_id: [None] * (root.length - 1) + [root]
+                     for task_id, root in roots.items()}
+            while paths:
+                task_id, batch = result_queue.get()
+
+                if task_id is None:
+                    raise RuntimeError("Worker failed:\n%s" % batch)
+
+                if batch is None:
+                    del paths[task_id]
+                    continue
+
+                path = paths[task_id]
+                for length, flight_idx in batch:
+                    item = Itinerary(self.flights[flight_idx], parent=path[length - 2])
+                    del path[length - 1:]
+                    path.append(item)
+                    yield item
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+                worker.join()
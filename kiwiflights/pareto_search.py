@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Search of itineraries not dominated in price, allowed bags and duration"""
+
+import logging
+from itertools import groupby
+from .itinerary import Itinerary
+from .reachability import Reachability
+
+_logger = logging.getLogger(__name__)
+
+
+class ParetoSearch(object):
+    """Search keeping only Pareto-optimal itineraries in (price, bags allowed, total duration)
+
+    An itinerary dominates another one if it is not worse in price, number of bags allowed and
+    total duration (flight and wait time) and it is better in at least one of them. Itineraries
+    are compared only with itineraries from the same source airport arriving to the same
+    airport at the same time.
+
+    Partial itineraries are kept in buckets by arrival event (arrival time and airport) and
+    events are processed in order of arrival - all itineraries of an event are created before
+    the event is processed, as flights take time. A dominated
+    itinerary is not yielded. It is not even extended if segments of an itinerary dominating it
+    are a subset of its segments - any extension of it can extend the dominating itinerary
+    as well (the cycle rule and the stops limit allow it) and the result is dominated again.
+    Yielded itineraries are thus the same as if all itineraries were computed and dominated
+    ones filtered out, only the order differs - they are yielded by arrival.
+    """
+    def __init__(self, system, source=None, destination=None):
+        """
+        :param system: system to search itineraries in
+        :type system: System
+        :param source: code of source airport, None for any airport
+        :param destination: code of destination airport, None for any airport
+        :raises KeyError: if source or destination airport is not known
+        :raises ValueError: if flights are kept in columnar flight database or search parameters
+                            are not valid
+        """
+        if system.is_columnar():
+            raise ValueError("Pareto search is not available with columnar flight database")
+
+        system.check_search_parameters()
+
+        self.system = system
+        self.source = system.airport_database.get_airport(source) if source is not None else None
+        self.destination = system.airport_database.get_airport(destination) \
+            if destination is not None else None
+        self.reachability = Reachability(system, self.destination) \
+            if self.destination is not None else None
+        # number of itineraries not extended as they were dominated
+        self.pruned = 0
+
+    @staticmethod
+    def get_key(itinerary):
+        """
+        :param itinerary: itinerary to compute key for
+        :return: a tuple (price, bags allowed, total duration in seconds)
+        """
+        return (itinerary.price, itinerary.bags_allowed,
+                itinerary.total_flight_seconds + itinerary.total_wait_seconds)
+
+    @staticmethod
+    def dominates(key, other_key):
+        """
+        :param key: key of an itinerary, see get_key()
+        :param other_key: key of another itinerary
+        :return: True if itinerary with key dominates the other itinerary
+        """
+        return key != other_key and key[0] <= other_key[0] and key[1] >= other_key[1] \
+            and key[2] <= other_key[2]
+
+    @staticmethod
+    def _has_segments_of(item, other):
+        """
+        :param item: itinerary
+        :param other: another itinerary
+        :return: True if segments of other itinerary are a subset of segments of itinerary
+        """
+        while other is not None:
+            if not item.has_segment(other.flight.segment):
+                return False
+            other = other.parent
+        return True
+
+    def _compare(self, items):
+        """Compare itineraries from the same source arriving to the same airport at the same time
+
+        Itineraries are inspected ordered by key, so an itinerary dominating another one is
+        inspected before it. Each itinerary is compared only with non-dominated itineraries
+        inspected so far - if it is dominated, one of them dominates it as well. Only these are
+        checked for segments, so some dominated itineraries can still be extended.
+
+        :param items: list of tuples (key, itinerary)
+        :return: a list of tuples (itinerary, optimal, extend) - optimal is False if itinerary is
+                 dominated by an itinerary of at least two flights, extend is False if it is
+                 dominated by an itinerary with a subset of its segments
+        """
+        if len(items) == 1:
+            return [(items[0][1], True, True)]
+
+        ret = []
+        # non-dominated itineraries, non-dominated itineraries of at least two flights
+        front = []
+        output_front = []
+
+        items.sort(key=lambda entry: (entry[0][0], -entry[0][1], entry[0][2]))
+        for key, item in items:
+            dominators = [other for other_key, other in front if self.dominates(other_key, key)]
+            # segments of itinerary are distinct, a longer one cannot have a subset of them
+            extend = not any(other.length <= item.length and self._has_segments_of(item, other)
+                             for other in dominators)
+            if not dominators:
+                front.append((key, item))
+
+            optimal = True
+            if item.length > 1:
+                optimal = not any(self.dominates(other_key, key) for other_key, _ in output_front)
+                if optimal:
+                    output_front.append((key, item))
+
+            ret.append((item, optimal, extend))
+
+        return ret
+
+    def _is_feasible(self, flight):
+        """
+        :param flight: flight to be taken
+        :return: True if flight allows required bags and can lead to the destination
+        """
+        return self.system.allows_bags(flight) \
+            and (self.reachability is None or self.reachability.is_useful(flight))
+
+    def iter_itineraries(self):
+        """Compute Pareto-optimal itineraries lazily, ordered by arrival
+
+        :return: a generator of itineraries
+        :rtype: generator(Itinerary)
+        """
+        if self.source is not None:
+            airports = [self.source]
+        else:
+            airports = self.system.airport_database.airports
+
+        # itineraries are kept in buckets by arrival event - (arrival, destination airport),
+        # events are processed in order of arrival
+        flights = [flight for airport in self.system.airport_database.airports
+                   for flight in airport.departures if self._is_feasible(flight)]
+        events = sorted({(flight.arrival, flight.destination.code) for flight in flights})
+        buckets = {}
+
+        for airport in airports:
+            for flight in airport.departures:
+                if self._is_feasible(flight):
+                    buckets.setdefault((flight.arrival, flight.destination.code), []).append(
+                        (Itinerary(flight), airport))
+
+        stats = self.system.stats
+        for event in events:
+            arrived = buckets.pop(event, None)
+            if not arrived:
+                continue
+
+            if stats is not None:
+                stats.record_stack_depth(len(arrived))
+
+            # itineraries from the same source are compared
+            arrived.sort(key=lambda entry: entry[1].code)
+            for _, group in groupby(arrived, key=lambda entry: entry[1].code):
+                group = list(group)
+                source = group[0][1]
+                items = [(self.get_key(item), item) for item, _ in group]
+
+                for item, optimal, extend in self._compare(items):
+                    if optimal and item.length > 1 and (self.destination is None
+                                                        or item.flight.destination
+                                                        is self.destination):
+                        yield item
+
+                    if not extend:
+                        self.pruned += 1
+                        continue
+
+                    for next_flight in self.system._get_next_flights(item):
+                        if self._is_feasible(next_flight):
+                            buckets.setdefault((next_flight.arrival, next_flight.destination.code),
+                                               []).append((Itinerary(next_flight, parent=item),
+                                                           source))
+
+        _logger.debug("Pareto search did not extend %d dominated itineraries", self.pruned)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Best-first search of the cheapest or the fastest itineraries"""
+
+import heapq
+import logging
+from .itinerary import Itinerary
+from .reachability import Reachability
+
+_logger = logging.getLogger(__name__)
+
+
+class RankedSearch(object):
+    """Best-first search over partial itineraries using a priority queue
+
+    Sort keys never decrease when an itinerary is extended (prices are expected to be
+    non-negative), so once an itinerary is popped from the queue no itinerary found later can
+    be better - itineraries are yielded best first and the search stops once enough of them
+    were found.
+    """
+    KEY_PRICE = 'price'
+    KEY_PRICE_WITH_BAGS = 'price_with_bags'
+    KEY_TOTAL_FLIGHT_DURATION = 'total_flight_duration'
+    KEY_TOTAL_WAIT_TIME = 'total_wait_time'
+    KEYS = (KEY_PRICE, KEY_PRICE_WITH_BAGS, KEY_TOTAL_FLIGHT_DURATION, KEY_TOTAL_WAIT_TIME)
+    # durations are compared in seconds kept by itineraries, timedeltas are not created
+    _KEY_ATTRIBUTES = {
+        KEY_PRICE: 'price',
+        KEY_TOTAL_FLIGHT_DURATION: 'total_flight_seconds',
+        KEY_TOTAL_WAIT_TIME: 'total_wait_seconds',
+    }
+
+    def __init__(self, system, key=KEY_PRICE, bags=None, source=None, destination=None):
+        """
+        :param system: system to search itineraries in
+        :type system: System
+        :param key: sort key, one of RankedSearch.KEYS
+        :param bags: number of bags - itineraries have to allow them, price_with_bags
+                     includes price for them; defaults to bags required by system
+        :param source: code of source airport, None for any airport
+        :param destination: code of destination airport, None for any airport
+        :raises KeyError: if source or destination airport is not known
+        """
+        if key not in self.KEYS:
+            raise ValueError("Unknown sort key '%s', available: %s" % (key, ", ".join(self.KEYS)))
+
+        if system.is_columnar():
+            raise ValueError("Ranked search is not available with columnar flight database")
+
+        system.check_search_parameters()
+
+        self.system = system
+        self.key = key
+        self.bags = bags if bags is not None else system.bags
+        self.source = system.airport_database.get_airport(source) if source is not None else None
+        self.destination = system.airport_database.get_airport(destination) \
+            if destination is not None else None
+        self.reachability = Reachability(system, self.destination) \
+            if self.destination is not None else None
+
+    def get_key(self, itinerary):
+        """
+        :param itinerary: itinerary to compute sort key for
+        :return: sort key value of itinerary, durations are in seconds
+        """
+        if self.key == self.KEY_PRICE_WITH_BAGS:
+            return itinerary.price + self.bags * itinerary.bag_price
+        return getattr(itinerary, self._KEY_ATTRIBUTES[self.key])
+
+    def _is_feasible(self, flight):
+        """
+        :param flight: flight to be taken
+        :return: True if flight allows required bags and can lead to the destination
+        """
+        return flight.bags_allowed >= self.bags \
+            and (self.reachability is None or self.reachability.is_useful(flight))
+
+    def iter_itineraries(self):
+        """Compute itineraries lazily, the best one first
+
+        :return: a generator of itineraries
+        :rtype: generator(Itinerary)
+        """
+        if self.source is not None:
+            airports = [self.source]
+        else:
+            airports = self.system.airport_database.airports
+
+        heap = []
+        counter = 0
+        for airport in airports:
+            for flight in airport.departures:
+                if self._is_feasible(flight):
+                    item = Itinerary(flight)
+                    heap.append((self.get_key(item), counter, item))
+                    counter += 1
+        heapq.heapify(heap)
+        stats = self.system.stats
+
+        while heap:
+            if stats is not None:
+                stats.record_stack_depth(len(heap))
+            _, _, item = heapq.heappop(heap)
+
+            if item.length > 1 and (self.destination is None
+                                    or item.flight.destination is self.destination):
+                yield item
+
+            for next_flight in self.system._get_next_flights(item):
+                if self._is_feasible(next_flight):
+                    next_item = Itinerary(next_flight, parent=item)
+                    heapq.heappush(heap, (self.get_key(next_item), counter, next_item))
+                    counter += 1
+
+    def get_best(self, count):
+        """
+        :param count: number of itineraries to retrieve
+        :return: at most count best itineraries, the best one first
+        :rtype: list(Itinerary)
+        """
+        ret = []
+
+        if count <= 0:
+            return ret
+
+        for itinerary in self.iter_itineraries():
+            ret.append(itinerary)
+            if len(ret) == count:
+                break
+
+        return ret
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Backward reachability of a destination airport used to prune targeted searches"""
+
+import logging
+from bisect import bisect_left
+
+_logger = logging.getLogger(__name__)
+
+
+class Reachability(object):
+    """Flights from which a destination airport can be reached in time
+
+    Flights are inspected from the latest departure to the earliest one, a flight is useful if
+    it arrives to the destination in time or a useful flight departs from its destination
+    inside wait window. Flights that do not allow bags required by system are never useful.
+    The cycle rule and the stops limit are not taken into account, so useful flights are
+    a superset of flights taken in itineraries to the destination.
+    """
+    def __init__(self, system, destination, arrive_before=None):
+        """
+        :param system: system to compute reachability in
+        :type system: System
+        :param destination: destination airport
+        :type destination: Airport
+        :param arrive_before: latest arrival to destination, None for no limit
+        :type arrive_before: datetime.datetime
+        """
+        self.destination = destination
+        self.arrive_before = arrive_before
+        # latest departure of a useful flight from airport
+        self.latest_departure = {}
+        self._useful = set()
+
+        min_wait_time = system.min_wait_time
+        max_wait_time = system.max_wait_time
+
+        flights = [f for airport in system.airport_database.airports for f in airport.departures
+                   if system.allows_bags(f)]
+        flights.sort(key=lambda f: f.departure, reverse=True)
+
+        # departure times of useful flights per airport, kept as time remaining to the latest
+        # departure so the lists are sorted as we go back in time
+        departures = {}
+        latest = flights[0].departure if flights else None
+
+        for flight in flights:
+            if flight.destination is destination:
+                useful = arrive_before is None or flight.arrival <= arrive_before
+            else:
+                times = departures.get(flight.destination)
+                if not times:
+                    continue
+                # is there a useful departure inside [arrival + min wait, arrival + max wait]?
+                idx = bisect_left(times, latest - (flight.arrival + max_wait_time))
+                useful = idx < len(times) \
+                    and times[idx] <= latest - (flight.arrival + min_wait_time)
+
+            if useful:
+                self._useful.add(flight)
+                departures.setdefault(flight.source, []).append(latest - flight.departure)
+                if flight.source not in self.latest_departure:
+                    self.latest_departure[flight.source] = flight.departure
+
+        _logger.debug("Found %d flights out of %d useful to reach '%s'",
+                      len(self._useful), len(flights), destination.code)
+
+    def __len__(self):
+        return len(self._useful)
+
+    def is_useful(self, flight):
+        """
+        :param flight: flight to check
+        :return: True if destination can be reached in time after taking flight
+        """
+        return flight in self._useful
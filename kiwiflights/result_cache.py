@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Least recently used cache of search results invalidated by changed flights"""
+
+import logging
+from collections import OrderedDict
+
+_logger = logging.getLogger(__name__)
+
+
+class ResultCache(object):
+    """Results of searches kept until evicted or until a flight that can change them changes
+
+    Each entry is stored with codes of airports its result depends on - airports from which its
+    destination can be reached and the destination itself. A new itinerary to the destination
+    has to take a new flight to one of them and a removed itinerary has taken a removed flight
+    to one of them, so an entry is invalidated only if a changed flight arrives to one of its
+    airports. Entries are evicted in least recently used order once the maximum number of
+    entries or the maximum size of entries is exceeded.
+    """
+    def __init__(self, max_entries=1024, max_bytes=None):
+        """
+        :param max_entries: maximum number of entries kept, None for no limit
+        :param max_bytes: maximum total size of entries kept, None for no limit
+        """
+        if max_entries is not None and max_entries < 1:
+            raise ValueError("Maximum number of entries has to be positive, got %d" % max_entries)
+
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError("Maximum size of entries has to be positive, got %d" % max_bytes)
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.size = 0
+        # key to a tuple (value, size, airport codes), the least recently used first
+        self._entries = OrderedDict()
+        # airport code to keys of entries depending on the airport
+        self._keys_by_airport = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def to_dict(self):
+        """
+        :return: a dict with counters and current size of cache
+        """
+        return {
+            'entries': len(self._entries),
+            'size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+
+    def get(self, key):
+        """Retrieve a value, mark it as the most recently used one
+
+        :param key: key of entry
+        :return: cached value, None if no entry was found
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, airports, size=1):
+        """Store a value, the least recently used entries are evicted if cache gets full
+
+        A value larger than the maximum size of entries is not stored at all.
+
+        :param key: key of entry
+        :param value: value to be stored
+        :param airports: codes of airports value depends on, see ResultCache
+        :param size: size of value, accounted against the maximum size of entries
+        :return: True if value was stored
+        """
+        self._remove(key)
+
+        if self.max_bytes is not None and size > self.max_bytes:
+            _logger.debug("Not caching result of size %d exceeding maximum size %d",
+                          size, self.max_bytes)
+            return False
+
+        airports = frozenset(airports)
+        self._entries[key] = (value, size, airports)
+        self.size += size
+        for code in airports:
+            self._keys_by_airport.setdefault(code, set()).add(key)
+
+        while (self.max_entries is not None and len(self._entries) > self.max_entries) \
+                or (self.max_bytes is not None and self.size > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+        return True
+
+    def _remove(self, key):
+        """Remove an entry if present
+
+        :param key: key of entry
+        :return: True if entry was removed
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+
+        _, size, airports = entry
+        self.size -= size
+        for code in airports:
+            keys = self._keys_by_airport[code]
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_airport[code]
+
+        return True
+
+    def invalidate_airports(self, codes):
+        """Invalidate entries depending on any of the given airports
+
+        :param codes: codes of airports flights to which changed
+        :return: number of invalidated entries
+        """
+        keys = set()
+        for code in codes:
+            keys.update(self._keys_by_airport.get(code, ()))
+
+        for key in keys:
+            self._remove(key)
+
+        self.invalidations += len(keys)
+        return len(keys)
+
+    def flights_changed(self, flights):
+        """Invalidate entries affected by added, removed or updated flights
+
+        Suitable as a listener of FlightDatabase, see FlightDatabase.add_listener().
+
+        :param flights: changed flights, for updated flights both the old and the new one
+        :type flights: list(Flight)
+        :return: number of invalidated entries
+        """
+        return self.invalidate_airports({flight.destination.code for flight in flights})
+
+    def clear(self):
+        """Remove all entries, counters are kept"""
+        self._entries.clear()
+        self._keys_by_airport.clear()
+        self.size = 0
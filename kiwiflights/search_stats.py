@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Counters and timers collected during itinerary search"""
+
+import time
+import logging
+from collections import Counter
+from contextlib import contextmanager
+
+_logger = logging.getLogger(__name__)
+
+
+class SearchStats(object):
+    """Statistics of a search, collected if assigned to System.stats
+
+    Counters are updated by System's depth-first search, targeted and ranked search once per
+    expanded itinerary, not per candidate flight. Other engines and worker processes of parallel
+    search do not report counters, phase timers are available regardless of engine.
+    """
+    def __init__(self, fan_out=False):
+        """
+        :param fan_out: collect per-airport histograms of number of flights an itinerary
+                        was extended with
+        """
+        # itineraries that were extended
+        self.nodes_expanded = 0
+        # departures inside wait window
+        self.candidates = 0
+        # departures outside wait window, skipped by the departure index
+        self.rejected_by_window = 0
+        self.rejected_by_cycle = 0
+        self.rejected_by_bags = 0
+        # itineraries not extended because they make the maximum number of stops
+        self.rejected_by_stops = 0
+        self.max_stack_depth = 0
+        # phase name to seconds spent in it
+        self.timers = {}
+        # airport code to a histogram (fan-out to number of expansions), None if not collected
+        self.fan_out = {} if fan_out else None
+
+    def record_expansion(self, airport, departure_count, candidate_count, bags_rejected,
+                         extended_count):
+        """Record an itinerary expanded at airport
+
+        :param airport: airport itinerary was extended at
+        :param departure_count: number of departures from airport
+        :param candidate_count: number of departures inside wait window
+        :param bags_rejected: number of candidates not allowing required bags
+        :param extended_count: number of flights itinerary was extended with
+        """
+        self.nodes_expanded += 1
+        self.candidates += candidate_count
+        self.rejected_by_window += departure_count - candidate_count
+        self.rejected_by_bags += bags_rejected
+        self.rejected_by_cycle += candidate_count - bags_rejected - extended_count
+
+        if self.fan_out is not None:
+            histogram = self.fan_out.get(airport.code)
+            if histogram is None:
+                histogram = self.fan_out[airport.code] = Counter()
+            histogram[extended_count] += 1
+
+    def record_stack_depth(self, depth):
+        """
+        :param depth: current size of search stack or queue
+        """
+        if depth > self.max_stack_depth:
+            self.max_stack_depth = depth
+
+    def add_time(self, phase, seconds):
+        """
+        :param phase: name of phase
+        :param seconds: seconds spent in phase
+        """
+        self.timers[phase] = self.timers.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, phase):
+        """Measure time spent in a block of code
+
+        :param phase: name of phase the time is accounted to
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start)
+
+    def iter_timed(self, phase, iterable):
+        """Measure time spent in producing items of a lazy iterable, not in consuming them
+
+        :param phase: name of phase the time is accounted to
+        :param iterable: iterable to be measured
+        :return: a generator of items of iterable
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(phase, time.perf_counter() - start)
+                return
+            self.add_time(phase, time.perf_counter() - start)
+            yield item
+
+    def to_dict(self):
+        """
+        :return: a dict representation of statistics
+        """
+        ret = {
+            'nodes_expanded': self.nodes_expanded,
+            'candidates': self.candidates,
+            'rejected_by_window': self.rejected_by_window,
+            'rejected_by_cycle': self.rejected_by_cycle,
+            'rejected_by_bags': self.rejected_by_bags,
+            'rejected_by_stops': self.rejected_by_stops,
+            'max_stack_depth': self.max_stack_depth,
+            'timers': dict(self.timers),
+        }
+
+        if self.fan_out is not None:
+            ret['fan_out'] = {code: dict(sorted(histogram.items()))
+                              for code, histogram in sorted(self.fan_out.items())}
+
+        return ret
+
+    def format_summary(self):
+        """
+        :return: a human readable summary of statistics
+        :rtype: str
+        """
+        lines = [
+            "nodes expanded:      %d" % self.nodes_expanded,
+            "candidates:          %d" % self.candidates,
+            "rejected by window:  %d" % self.rejected_by_window,
+            "rejected by cycle:   %d" % self.rejected_by_cycle,
+            "rejected by bags:    %d" % self.rejected_by_bags,
+            "rejected by stops:   %d" % self.rejected_by_stops,
+            "max stack depth:     %d" % self.max_stack_depth,
+        ]
+
+        for phase, seconds in self.timers.items():
+            lines.append("time in %-12s %.3fs" % (phase + ':', seconds))
+
+        if self.fan_out is not None:
+            lines.append("fan-out per airport (fan-out: expansions):")
+            for code, histogram in sorted(self.fan_out.items()):
+                lines.append("  %s: %s" % (code, ", ".join("%d: %d" % item
+                                                          for item in sorted(histogram.items()))))
+
+        return "\n".join(lines)
@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Long-running query server keeping loaded flights warm
+
+The server speaks a minimal subset of HTTP/1.1 over TCP or a Unix socket:
+
+  * GET /itineraries?source=CODE&destination=CODE - itineraries from source to destination as
+    a compact JSON document, optional parameters are depart_after and arrive_before
+    (datetimes), max_stops, bags, min_wait and max_wait (minutes)
+  * GET /health - number of flights loaded, generation of loaded schedule and cache counters
+  * POST /reload - load the schedule again, see QueryServer.reload()
+
+Searches run in a pool of worker processes, each of them keeps its own loaded System, so the
+event loop only parses requests and passes queries and serialized results around.
+"""
+
+import io
+import os
+import json
+import signal
+import asyncio
+import logging
+import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qsl
+from .system import System
+from .result_cache import ResultCache
+from .utils import parse_datetime, write_itineraries_json
+
+_logger = logging.getLogger(__name__)
+
+# System loaded in a worker process and error raised while loading it
+_system = None
+_load_error = None
+
+
+def _load_worker(paths, snapshot):
+    """Initialize worker process - load the schedule
+
+    :param paths: paths to CSV files, see System.expand_csv_paths(); used if no snapshot
+    :param snapshot: path to snapshot, see System.load_snapshot()
+    """
+    global _system, _load_error  # pylint: disable=global-statement
+    try:
+        if snapshot is not None:
+            _system = System.load_snapshot(snapshot)
+        else:
+            _system = System.from_csv_files(paths, jobs=1)
+    except (OSError, ValueError) as exc:
+        # reported on first task, an exception raised here would only break the pool
+        _load_error = exc
+
+
+def _get_flight_count():
+    """
+    :return: number of flights loaded in worker process
+    :raises ValueError: if the schedule could not be loaded
+    """
+    if _load_error is not None:
+        raise ValueError(str(_load_error))
+    return len(_system.flight_database.flights)
+
+
+def _get_schedule_digest():
+    """
+    :return: a dict mapping flight numbers to tuples (destination code, source code,
+             departure, arrival, price, bags allowed, bag price)
+    :raises ValueError: if the schedule could not be loaded
+    """
+    if _load_error is not None:
+        raise ValueError(str(_load_error))
+    return {f.flight_number: (f.destination.code, f.source.code, f.departure, f.arrival, f.price,
+                              f.bags_allowed, f.bag_price)
+            for f in _system.flight_database.flights}
+
+
+def _search(query, route_airports=False):
+    """Run a search in worker process
+
+    :param query: a dict of query parameters, see QueryServer.parse_query()
+    :param route_airports: compute airports the result depends on, see ResultCache
+    :return: a tuple (number of itineraries, JSON document, airport codes or None)
+    """
+    if _load_error is not None:
+        raise ValueError(str(_load_error))
+
+    system = _system
+    system.min_wait_time = query['min_wait_time']
+    system.max_wait_time = query['max_wait_time']
+    system.max_stops = query['max_stops']
+    system.bags = query['bags']
+
+    output = io.StringIO()
+    itineraries = system.iter_search(query['source'], query['destination'],
+                                     depart_after=query['depart_after'],
+                                     arrive_before=query['arrive_before'])
+    count = write_itineraries_json(itineraries, output, pretty=False)
+
+    airports = None
+    if route_airports:
+        airports = system.get_route_airports(query['destination'],
+                                             arrive_before=query['arrive_before'])
+    return count, output.getvalue(), airports
+
+
+class QueryServer(object):
+    """Answer itinerary queries on flights loaded once in worker processes"""
+
+    _CONTENT_TYPE = 'application/json'
+    _REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                500: 'Internal Server Error'}
+
+    def __init__(self, inputs=None, snapshot=None, jobs=None, min_wait_time=None,
+                 max_wait_time=None, max_stops=None, bags=0, result_cache=None):
+        """
+        :param inputs: paths to CSV files, directories or glob patterns, see
+                       System.expand_csv_paths(), expanded again on each reload
+        :param snapshot: path to snapshot to be used instead of inputs
+        :param jobs: number of worker processes, default: number of CPUs
+        :param min_wait_time: default minimal wait time between flights
+        :type min_wait_time: datetime.timedelta
+        :param max_wait_time: default maximal wait time between flights
+        :type max_wait_time: datetime.timedelta
+        :param max_stops: default maximum number of stops, None for no limit
+        :param bags: default number of bags itineraries have to allow
+        :param result_cache: cache of responses to queries, entries are invalidated selectively
+                             on reload; sizes of entries are sizes of responses
+        :type result_cache: ResultCache
+        """
+        if bool(inputs) == bool(snapshot):
+            raise ValueError("Exactly one of inputs and snapshot has to be provided")
+
+        if jobs is not None and jobs < 1:
+            raise ValueError("Number of worker processes has to be positive, got %d" % jobs)
+
+        self.inputs = list(inputs) if inputs else None
+        self.snapshot = snapshot
+        self.jobs = jobs or os.cpu_count() or 1
+        self.defaults = {
+            'min_wait_time': min_wait_time or System._DEFAULT_MIN_WAIT_TIME,
+            'max_wait_time': max_wait_time or System._DEFAULT_MAX_WAIT_TIME,
+            'max_stops': max_stops,
+            'bags': bags
+        }
+        self.flight_count = None
+        self.generation = 0
+        self.requests = 0
+        self._executor = None
+        self._signature = None
+        self._reload_lock = None
+        self._servers = []
+        self._writers = set()
+        self.result_cache = result_cache
+        # flight numbers to destinations and other attributes of loaded flights, kept to find
+        # out changed flights on reload if results are cached
+        self._digest = None
+
+    def get_paths(self):
+        """
+        :return: paths to files the schedule is loaded from
+        :raises ValueError: if inputs do not match any CSV file
+        """
+        if self.snapshot is not None:
+            return [self.snapshot]
+        return System.expand_csv_paths(self.inputs)
+
+    def get_signature(self):
+        """
+        :return: modification times and sizes of files the schedule is loaded from, changes when
+                 the schedule should be reloaded
+        :raises ValueError: if inputs do not match any CSV file
+        :raises OSError: if a file cannot be accessed
+        """
+        result = []
+        for path in self.get_paths():
+            stat = os.stat(path)
+            result.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(result)
+
+    async def reload(self):
+        """Load the schedule in new worker processes and swap them with old ones
+
+        Queries are answered by old worker processes until new ones are ready, queries being
+        answered by old worker processes are finished. If the schedule cannot be loaded, old
+        worker processes are kept.
+
+        :return: number of flights loaded
+        :raises ValueError: if the schedule cannot be loaded
+        """
+        if self._reload_lock is None:
+            self._reload_lock = asyncio.Lock()
+
+        async with self._reload_lock:
+            signature = self.get_signature()
+            paths = [p for p, _, _ in signature] if self.snapshot is None else None
+            context = multiprocessing.get_context('fork') \
+                if 'fork' in multiprocessing.get_all_start_methods() else None
+            executor = ProcessPoolExecutor(self.jobs, mp_context=context,
+                                           initializer=_load_worker,
+                                           initargs=(paths, self.snapshot))
+            # workers are spawned on submit when none is idle, start all of them at once
+            loop = asyncio.get_running_loop()
+            futures = [loop.run_in_executor(executor, _get_flight_count)
+                       for _ in range(self.jobs)]
+            try:
+                counts = await asyncio.gather(*futures)
+            except Exception:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+            if self.result_cache is not None:
+                self._invalidate(await loop.run_in_executor(executor, _get_schedule_digest))
+
+            old_executor, self._executor = self._executor, executor
+            self._signature = signature
+            self.flight_count = counts[0]
+            self.generation += 1
+            if old_executor is not None:
+                # queries submitted to old worker processes are still answered
+                old_executor.shutdown(wait=False)
+
+            _logger.info("Loaded %d flights, generation %d" % (self.flight_count, self.generation))
+            return self.flight_count
+
+    def _invalidate(self, digest):
+        """Invalidate cached responses affected by flights changed on reload
+
+        :param digest: digest of reloaded schedule, see _get_schedule_digest()
+        """
+        if self._digest is None:
+            self.result_cache.clear()
+        else:
+            airports = set()
+            for flight_number, entry in digest.items():
+                old_entry = self._digest.get(flight_number)
+                if old_entry != entry:
+                    airports.add(entry[0])
+                    if old_entry is not None:
+                        airports.add(old_entry[0])
+            for flight_number, old_entry in self._digest.items():
+                if flight_number not in digest:
+                    airports.add(old_entry[0])
+            count = self.result_cache.invalidate_airports(airports)
+            _logger.debug("Invalidated %d cached responses, flights to %d airports changed",
+                          count, len(airports))
+        self._digest = digest
+
+    async def reload_if_changed(self):
+        """Reload the schedule if files it is loaded from were changed
+
+        :return: True if the schedule was reloaded
+        """
+        if self.get_signature() == self._signature:
+            return False
+        await self.reload()
+        return True
+
+    def parse_query(self, params):
+        """Parse query parameters of an itinerary search
+
+        :param params: a dict of query parameters as strings
+        :return: a dict of parsed query parameters
+        :raises ValueError: if a parameter is not valid or missing
+        """
+        unknown = set(params) - {'source', 'destination', 'depart_after', 'arrive_before',
+                                 'max_stops', 'bags', 'min_wait', 'max_wait'}
+        if unknown:
+            raise ValueError("Unknown query parameters: %s" % ', '.join(sorted(unknown)))
+
+        if not params.get('source') or not params.get('destination'):
+            raise ValueError("Both source and destination have to be provided")
+
+        query = dict(self.defaults)
+        query['source'] = params['source']
+        query['destination'] = params['destination']
+        for key in ('depart_after', 'arrive_before'):
+            query[key] = parse_datetime(params[key]) if params.get(key) else None
+
+        try:
+            if 'max_stops' in params:
+                query['max_stops'] = int(params['max_stops'])
+            if 'bags' in params:
+                query['bags'] = int(params['bags'])
+            if 'min_wait' in params:
+                query['min_wait_time'] = datetime.timedelta(minutes=int(params['min_wait']))
+            if 'max_wait' in params:
+                query['max_wait_time'] = datetime.timedelta(minutes=int(params['max_wait']))
+        except ValueError as exc:
+            raise ValueError("Invalid query parameter: %s" % str(exc)) from exc
+
+        return query
+
+    async def search(self, query):
+        """Search itineraries in a worker process unless the result is cached
+
+        :param query: parsed query, see parse_query()
+        :return: a tuple (number of itineraries, JSON document with itineraries)
+        :raises KeyError: if source or destination airport is not known
+        :raises ValueError: if search parameters are not valid
+        """
+        result_cache = self.result_cache
+        if result_cache is None:
+            loop = asyncio.get_running_loop()
+            count, body, _ = await loop.run_in_executor(self._executor, _search, query)
+            return count, body
+
+        key = tuple(sorted(query.items()))
+        result = result_cache.get(key)
+        if result is not None:
+            return result
+
+        generation = self.generation
+        loop = asyncio.get_running_loop()
+        count, body, airports = await loop.run_in_executor(self._executor, _search, query, True)
+        if generation == self.generation:
+            # results computed on the schedule before reload are not cached
+            result_cache.put(key, (count, body), airports, size=len(body))
+        return count, body
+
+    def to_dict(self):
+        """
+        :return: a dict describing state of server
+        """
+        result = {'flights': self.flight_count, 'generation': self.generation}
+        if self.result_cache is not None:
+            result['cache'] = self.result_cache.to_dict()
+        return result
+
+    async def handle(self, method, target):
+        """Handle a single request
+
+        :param method: HTTP method
+        :param target: request target - path with query string
+        :return: a tuple (status, headers, body)
+        """
+        url = urlsplit(target)
+        headers = {}
+        try:
+            if url.path == '/itineraries' and method == 'GET':
+                query = self.parse_query(dict(parse_qsl(url.query, keep_blank_values=True)))
+                count, body = await self.search(query)
+                headers['X-Itinerary-Count'] = str(count)
+            elif url.path == '/health' and method == 'GET':
+                body = json.dumps(self.to_dict())
+            elif url.path == '/reload' and method == 'POST':
+                try:
+                    await self.reload()
+                except (OSError, ValueError) as exc:
+                    return 500, headers, json.dumps({'error': str(exc)})
+                body = json.dumps(self.to_dict())
+            elif url.path in ('/itineraries', '/health', '/reload'):
+                return 405, headers, json.dumps({'error': "Method %s not allowed" % method})
+            else:
+                return 404, headers, json.dumps({'error': "Unknown path '%s'" % url.path})
+        except KeyError as exc:
+            return 404, headers, json.dumps({'error': str(exc.args[0] if exc.args else exc)})
+        except ValueError as exc:
+            return 400, headers, json.dumps({'error': str(exc)})
+
+        return 200, headers, body
+
+    async def _handle_connection(self, reader, writer):
+        """Serve requests of a single connection, connections are kept alive unless asked not to
+
+        :param reader: stream reader of connection
+        :param writer: stream writer of connection
+        """
+        self._writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._respond(writer, 400, {}, json.dumps({'error': 'Bad request'}),
+                                        keep_alive=False)
+                    break
+
+                request_headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    request_headers[name.strip().lower()] = value.strip()
+
+                content_length = int(request_headers.get('content-length') or 0)
+                if content_length:
+                    await reader.readexactly(content_length)
+
+                connection = request_headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' \
+                    else connection != 'close'
+
+                self.requests += 1
+                status, headers, body = await self.handle(method, target)
+                await self._respond(writer, status, headers, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as exc:  # pylint: disable=broad-except
+            _logger.exception("Failed to serve request: %s" % str(exc))
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _respond(self, writer, status, headers, body, keep_alive=True):
+        """Write response to a connection
+
+        :param writer: stream writer of connection
+        :param status: HTTP status code
+        :param headers: additional headers
+        :param body: response body
+        :param keep_alive: True if connection is kept alive after response
+        """
+        body = body.encode('utf-8')
+        head = ['HTTP/1.1 %d %s' % (status, self._REASONS[status]),
+                'Content-Type: %s' % self._CONTENT_TYPE,
+                'Content-Length: %d' % len(body),
+                'Connection: %s' % ('keep-alive' if keep_alive else 'close')]
+        head.extend('%s: %s' % item for item in headers.items())
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def start(self, host='127.0.0.1', port=0, unix_socket=None):
+        """Load the schedule and start listening
+
+        :param host: host to listen on, ignored if unix_socket is provided
+        :param port: port to listen on, 0 for any free port
+        :param unix_socket: path to Unix socket to listen on instead of TCP
+        :return: address server listens on
+        """
+        if self._executor is None:
+            await self.reload()
+
+        if unix_socket is not None:
+            server = await asyncio.start_unix_server(self._handle_connection, path=unix_socket)
+        else:
+            server = await asyncio.start_server(self._handle_connection, host=host, port=port)
+
+        self._servers.append(server)
+        address = server.sockets[0].getsockname()
+        _logger.info("Listening on %s" % (address,))
+        return address
+
+    async def close(self):
+        """Stop listening and shut down worker processes"""
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+
+        # idle kept alive connections would wait for next request forever
+        for writer in list(self._writers):
+            writer.close()
+        await asyncio.sleep(0)
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def _watch(self, interval):
+        """Reload the schedule when files it is loaded from change
+
+        :param interval: seconds between checks
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reload_if_changed()
+            except (OSError, ValueError) as exc:
+                _logger.error("Failed to reload schedule, keeping the loaded one: %s" % str(exc))
+
+    async def serve(self, host='127.0.0.1', port=0, unix_socket=None, watch=None):
+        """Serve until SIGINT or SIGTERM, the schedule is reloaded on SIGHUP
+
+        :param host: host to listen on, ignored if unix_socket is provided
+        :param port: port to listen on
+        :param unix_socket: path to Unix socket to listen on instead of TCP
+        :param watch: seconds between checks whether files with schedule changed, None to disable
+        """
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+
+        def reload_done(task):
+            if not task.cancelled() and task.exception() is not None:
+                _logger.error("Failed to reload schedule, keeping the loaded one: %s"
+                              % str(task.exception()))
+
+        def reload():
+            loop.create_task(self.reload()).add_done_callback(reload_done)
+
+        loop.add_signal_handler(signal.SIGHUP, reload)
+        loop.add_signal_handler(signal.SIGINT, stop.set)
+        loop.add_signal_handler(signal.SIGTERM, stop.set)
+
+        await self.start(host=host, port=port, unix_socket=unix_socket)
+        watcher = loop.create_task(self._watch(watch)) if watch else None
+        try:
+            await stop.wait()
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            await self.close()
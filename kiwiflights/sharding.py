@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Itinerary search split into shards computed independently, e.g. on different nodes
+
+A manifest describes the computation - a snapshot of flights, search parameters and seed flights
+of each shard. Shards are computed by workers that need only the manifest directory, each
+worker writes itineraries of its shard in JSON Lines format. Outputs of all shards are merged
+into the final JSON document afterwards.
+
+Depth-first search explores seed flights from the last one and it finishes the whole subtree
+of a seed flight before it continues with the previous one. Shards are formed of consecutive
+seed flights and merged in reverse order, so the final document is the same as the one computed
+by System on a single node.
+"""
+
+import os
+import json
+import datetime
+import logging
+import multiprocessing
+from .system import System
+from .itinerary import Itinerary
+from .utils import dict2json, write_itineraries_json_lines
+
+_logger = logging.getLogger(__name__)
+
+
+def _run_shard(args):
+    """Compute a shard in a worker process, see ShardManifest.run_local()
+
+    :param args: a tuple (path to manifest, shard id)
+    :return: a tuple (shard id, number of itineraries)
+    """
+    path, shard_id = args
+    return shard_id, ShardManifest.load(path).run_shard(shard_id)
+
+
+class ShardManifest(object):
+    """Description of a computation split into shards, stored in a directory with the snapshot"""
+    VERSION = 1
+    MANIFEST_FILE = 'manifest.json'
+    SNAPSHOT_FILE = 'flights.snapshot'
+
+    def __init__(self, directory, shards, min_wait_time, max_wait_time, max_stops=None, bags=0):
+        """
+        :param directory: directory with manifest, snapshot and outputs of shards
+        :param shards: flight numbers of seed flights of each shard
+        :type shards: list(list(str))
+        :param min_wait_time: minimal wait time between flights
+        :type min_wait_time: datetime.timedelta
+        :param max_wait_time: maximal wait time between flights
+        :type max_wait_time: datetime.timedelta
+        :param max_stops: maximum number of stops in itinerary, None for no limit
+        :param bags: number of bags all flights in itinerary have to allow
+        """
+        self.directory = directory
+        self.shards = shards
+        self.min_wait_time = min_wait_time
+        self.max_wait_time = max_wait_time
+        self.max_stops = max_stops
+        self.bags = bags
+
+    @property
+    def path(self):
+        """
+        :return: path to manifest file
+        """
+        return os.path.join(self.directory, self.MANIFEST_FILE)
+
+    @property
+    def snapshot_path(self):
+        """
+        :return: path to snapshot of flights
+        """
+        return os.path.join(self.directory, self.SNAPSHOT_FILE)
+
+    def get_output_path(self, shard_id):
+        """
+        :param shard_id: id of shard - its index in shards
+        :return: path to output of shard in JSON Lines format
+        """
+        return os.path.join(self.directory, 'shard_%04d.jsonl' % shard_id)
+
+    @staticmethod
+    def _estimate_cost(system, item):
+        """
+        :param system: system the search runs in
+        :param item: itinerary of a seed flight
+        :return: estimated cost of search from seed flight - number of flights reachable in two
+                 steps, plus one for the seed itself
+        """
+        ret = 1
+        for next_flight in system._get_next_flights(item):
+            ret += 1 + len(system._get_next_flights(Itinerary(next_flight, parent=item)))
+        return ret
+
+    @classmethod
+    def create(cls, system, directory, shard_count):
+        """Split seed flights of system into shards, store snapshot and manifest to directory
+
+        Shards are formed of consecutive seed flights with similar estimated costs.
+
+        :param system: system to be computed
+        :type system: System
+        :param directory: directory to store manifest and snapshot to, created if needed
+        :param shard_count: number of shards
+        :return: created manifest
+        :rtype: ShardManifest
+        :raises ValueError: if number of shards or search parameters are not valid
+        """
+        if shard_count < 1:
+            raise ValueError("Number of shards has to be positive, got %d" % shard_count)
+
+        if system.is_columnar():
+            raise ValueError("Shards cannot be created for columnar flight database")
+
+        system.check_search_parameters()
+        stack = system._get_initialized_stack()
+        costs = [cls._estimate_cost(system, item) for item in stack]
+        total = sum(costs)
+
+        shards = [[] for _ in range(shard_count)]
+        accumulated = 0
+        for item, cost in zip(stack, costs):
+            # shard by the middle of the cost range of the seed flight
+            shard_id = min(int((accumulated + cost / 2) * shard_count / total), shard_count - 1)
+            shards[shard_id].append(item.flight.flight_number)
+            accumulated += cost
+
+        os.makedirs(directory, exist_ok=True)
+        manifest = cls(directory, shards, min_wait_time=system.min_wait_time,
+                       max_wait_time=system.max_wait_time, max_stops=system.max_stops,
+                       bags=system.bags)
+        system.save_snapshot(manifest.snapshot_path)
+        manifest.save()
+
+        _logger.debug("Created %d shards of %d seed flights in '%s', estimated costs: %s",
+                      shard_count, len(stack), directory, costs)
+        return manifest
+
+    def to_dict(self):
+        """
+        :return: a dict representation of manifest, durations are in seconds
+        """
+        return {
+            'version': self.VERSION,
+            'snapshot': self.SNAPSHOT_FILE,
+            'min_wait_time': int(self.min_wait_time.total_seconds()),
+            'max_wait_time': int(self.max_wait_time.total_seconds()),
+            'max_stops': self.max_stops,
+            'bags': self.bags,
+            'shards': [{'id': shard_id, 'output': os.path.basename(self.get_output_path(shard_id)),
+                        'flights': flights}
+                       for shard_id, flights in enumerate(self.shards)]
+        }
+
+    def save(self):
+        """Store manifest to its directory"""
+        with open(self.path, 'w') as f:
+            f.write(dict2json(self.to_dict()) + '\n')
+
+    @classmethod
+    def load(cls, path):
+        """Load manifest, directory of the manifest is used for snapshot and outputs
+
+        :param path: path to manifest file or to its directory
+        :return: loaded manifest
+        :rtype: ShardManifest
+        :raises ValueError: if file is not a valid manifest
+        """
+        if os.path.isdir(path):
+            path = os.path.join(path, cls.MANIFEST_FILE)
+
+        with open(path, 'r') as f:
+            try:
+                content = json.load(f)
+            except ValueError as exc:
+                raise ValueError("Manifest '%s' is not a valid JSON: %s" % (path, str(exc)))
+
+        if not isinstance(content, dict) or content.get('version') != cls.VERSION:
+            raise ValueError("Manifest '%s' has unsupported version, expected %d"
+                             % (path, cls.VERSION))
+
+        try:
+            return cls(os.path.dirname(path),
+                       [shard['flights'] for shard in content['shards']],
+                       min_wait_time=datetime.timedelta(seconds=content['min_wait_time']),
+                       max_wait_time=datetime.timedelta(seconds=content['max_wait_time']),
+                       max_stops=content['max_stops'],
+                       bags=content['bags'])
+        except (KeyError, TypeError) as exc:
+            raise ValueError("Manifest '%s' is not valid: %s" % (path, str(exc)))
+
+    def load_system(self):
+        """
+        :return: system loaded from snapshot with search parameters of manifest
+        :rtype: System
+        """
+        system = System.load_snapshot(self.snapshot_path)
+        system.min_wait_time = self.min_wait_time
+        system.max_wait_time = self.max_wait_time
+        system.max_stops = self.max_stops
+        system.bags = self.bags
+        system.check_search_parameters()
+        return system
+
+    def run_shard(self, shard_id, system=None):
+        """Compute itineraries of a shard and write them to its output
+
+        Output is written to a temporary file renamed when the shard is done, so an existing
+        output is always complete.
+
+        :param shard_id: id of shard
+        :param system: system loaded by load_system(), loaded if not provided
+        :return: number of itineraries computed
+        :rtype: int
+        :raises IndexError: if shard does not exist
+        :raises KeyError: if a seed flight of shard is not in snapshot
+        """
+        flight_numbers = self.shards[shard_id]
+        system = system or self.load_system()
+        stack = [Itinerary(system.flight_database.get_flight(flight_number))
+                 for flight_number in flight_numbers]
+
+        path = self.get_output_path(shard_id)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            count = write_itineraries_json_lines(system._iter_itineraries(stack), f)
+        os.replace(tmp_path, path)
+
+        _logger.debug("Computed %d itineraries of shard %d from %d seed flights", count,
+                      shard_id, len(flight_numbers))
+        return count
+
+    def get_missing_shards(self):
+        """
+        :return: ids of shards without output
+        :rtype: list(int)
+        """
+        return [shard_id for shard_id in range(len(self.shards))
+                if not os.path.exists(self.get_output_path(shard_id))]
+
+    def run_local(self, jobs=None):
+        """Compute shards without output in local worker processes standing in for nodes
+
+        Workers do not use any state of this process - they load the manifest and snapshot
+        from the directory as workers on other nodes would.
+
+        :param jobs: number of worker processes, defaults to number of CPUs
+        :return: ids of computed shards
+        :rtype: list(int)
+        """
+        missing = self.get_missing_shards()
+        if not missing:
+            return missing
+
+        jobs = min(jobs or os.cpu_count() or 1, len(missing))
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+        else:
+            context = multiprocessing.get_context()
+
+        with context.Pool(jobs) as pool:
+            for shard_id, count in pool.imap_unordered(_run_shard,
+                                                       [(self.path, s) for s in missing]):
+                _logger.debug("Shard %d done, %d itineraries", shard_id, count)
+
+        return missing
+
+    def merge(self, output_file, pretty=True):
+        """Merge outputs of all shards into a JSON document {"itineraries": [...]}
+
+        The document is the same as write_itineraries_json() writes for System's itineraries.
+
+        :param output_file: file-like object to write to
+        :param pretty: use pretty formatting
+        :return: number of itineraries written
+        :rtype: int
+        :raises ValueError: if output of a shard is missing
+        """
+        missing = self.get_missing_shards()
+        if missing:
+            raise ValueError("Outputs of shards %s are missing"
+                             % ", ".join(str(shard_id) for shard_id in missing))
+
+        if pretty:
+            first_prefix, separator = '{\n  "itineraries": [\n    ', ',\n    '
+        else:
+            first_prefix, separator = '{"itineraries": [', ', '
+
+        count = 0
+        # seed flights are explored from the last one, so are shards
+        for shard_id in reversed(range(len(self.shards))):
+            with open(self.get_output_path(shard_id), 'r') as f:
+                for line in f:
+                    if pretty:
+                        item = dict2json(json.loads(line)).replace('\n', '\n    ')
+                    else:
+                        item = line[:-1]
+                    output_file.write((first_prefix if count == 0 else separator) + item)
+                    count += 1
+
+        if pretty:
+            output_file.write('\n  ]\n}\n' if count > 0 else '{\n  "itineraries": []\n}\n')
+        else:
+            output_file.write(']}\n' if count > 0 else '{"itineraries": []}\n')
+
+        return count
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Binary snapshot of flights for fast startup
+
+A snapshot is a header followed by sections, each section starts at an offset aligned to 8 bytes:
+
+  * header - magic, format version, byte order and item counts, see _HEADER
+  * columns - columns of ColumnarFlightDatabase in order of ColumnarFlightDatabase.COLUMNS
+  * segments - pairs of airport ids of each segment
+  * departure index - offsets, order and times, see ColumnarFlightDatabase.get_departure_index()
+  * airport order - airport ids in order of airport database
+  * string table - airport codes (by airport id) followed by flight numbers (by flight id),
+    UTF-8 encoded and separated by a new line
+
+Arrays are stored in native byte order and loaded through mmap, so loading is a matter of copying
+memory rather than parsing. Datetimes are kept as seconds since epoch, see ColumnarFlightDatabase.
+"""
+
+import sys
+import mmap
+import struct
+import logging
+from array import array
+from .airport import Airport
+from .airport_database import AirportDatabase
+from .columnar_flight_database import ColumnarFlightDatabase
+
+_logger = logging.getLogger(__name__)
+
+_MAGIC = b'KIWIFLTS'
+_VERSION = 1
+# magic, version, byte order (0 little, 1 big), flights, airports, segments, airport database
+# airports and string table size in bytes
+_HEADER = struct.Struct('=8sIIqqqqq')
+_ALIGNMENT = 8
+
+_TYPECODES = {
+    'source': 'i',
+    'destination': 'i',
+    'departure': 'q',
+    'arrival': 'q',
+    'price': 'd',
+    'bag_price': 'd',
+    'bags_allowed': 'i',
+    'segment': 'i',
+}
+
+
+def _padding(size):
+    """
+    :param size: size of data written so far
+    :return: number of bytes needed to align data
+    """
+    return -size % _ALIGNMENT
+
+
+def _get_sections(database, airport_count, airport_ids):
+    """
+    :param database: columnar database to be stored
+    :param airport_count: number of airports stored
+    :param airport_ids: airport ids in order of airport database
+    :return: arrays to be stored in snapshot after header, in order
+    :rtype: list(array)
+    """
+    ret = [getattr(database, name) for name in database.COLUMNS]
+    ret.append(array('i', (airport_id for segment in database.get_segments()
+                           for airport_id in segment)))
+
+    offsets, order, times = database.get_departure_index()
+    # airports with no flights stored after the ones referenced by columns have no departures
+    offsets = offsets + array('i', [offsets[-1]] * (airport_count - database.airport_count))
+    ret.extend((offsets, order, times))
+
+    ret.append(array('i', airport_ids))
+    return ret
+
+
+def save_snapshot(system, path):
+    """Store flights and airports of system to a snapshot
+
+    :param system: system to be stored
+    :type system: System
+    :param path: path to the snapshot file
+    :raises ValueError: if an airport code or a flight number cannot be stored
+    """
+    database = system.flight_database.to_columnar()
+
+    airport_ids = []
+    airports = [database.get_airport(airport_id) for airport_id in range(database.airport_count)]
+    # airports that have no flights are stored after the ones referenced by columns
+    for airport in system.airport_database.airports:
+        airport_id = database.get_airport_id(airport, graceful=True)
+        if airport_id is None:
+            airport_id = len(airports)
+            airports.append(airport)
+        airport_ids.append(airport_id)
+
+    strings = [airport.code for airport in airports]
+    strings.extend(database.get_flight_number(flight_id) for flight_id in range(len(database)))
+    for string in strings:
+        if '\n' in string:
+            raise ValueError("String '%s' cannot be stored in snapshot" % string)
+    string_table = '\n'.join(strings).encode('utf-8')
+
+    header = _HEADER.pack(_MAGIC, _VERSION, sys.byteorder == 'big', len(database), len(airports),
+                          len(database.get_segments()), len(airport_ids), len(string_table))
+
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(b'\0' * _padding(len(header)))
+
+        for section in _get_sections(database, len(airports), airport_ids):
+            data = section.tobytes()
+            f.write(data)
+            f.write(b'\0' * _padding(len(data)))
+
+        f.write(string_table)
+
+    _logger.debug("Snapshot of %d flights written to '%s'", len(database), path)
+
+
+def load_snapshot(path):
+    """Load flights and airports from a snapshot
+
+    :param path: path to the snapshot file
+    :return: a tuple (flight database, airport database); airports do not keep flights
+    :rtype: tuple(ColumnarFlightDatabase, AirportDatabase)
+    :raises ValueError: if file is not a snapshot or it was created on an incompatible platform
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if len(data) < _HEADER.size:
+            raise ValueError("File '%s' is not a snapshot" % path)
+
+        magic, version, big_endian, flight_count, airport_count, segment_count, \
+            airport_database_count, string_table_size = _HEADER.unpack_from(data)
+
+        if magic != _MAGIC:
+            raise ValueError("File '%s' is not a snapshot" % path)
+        if version != _VERSION:
+            raise ValueError("Snapshot version %d is not supported, expected %d"
+                             % (version, _VERSION))
+        if big_endian != (sys.byteorder == 'big'):
+            raise ValueError("Snapshot was created on a platform with different byte order")
+
+        offset = _HEADER.size + _padding(_HEADER.size)
+
+        def read_array(typecode, count):
+            nonlocal offset
+            ret = array(typecode)
+            size = count * ret.itemsize
+            if offset + size > len(data):
+                raise ValueError("Snapshot '%s' is truncated" % path)
+            with memoryview(data)[offset:offset + size] as view:
+                ret.frombytes(view)
+            offset += size + _padding(size)
+            return ret
+
+        columns = {name: read_array(_TYPECODES[name], flight_count)
+                   for name in ColumnarFlightDatabase.COLUMNS}
+        segments = read_array('i', 2 * segment_count)
+        departure_index = (read_array('i', airport_count + 1),
+                           read_array('i', flight_count),
+                           read_array('q', flight_count))
+        airport_ids = read_array('i', airport_database_count)
+
+        if offset + string_table_size != len(data):
+            raise ValueError("Snapshot '%s' is corrupted" % path)
+        strings = data[offset:].decode('utf-8').split('\n') if string_table_size else []
+
+    if len(strings) != airport_count + flight_count:
+        raise ValueError("Snapshot '%s' is corrupted" % path)
+
+    airport_database = AirportDatabase()
+    airports = [None] * airport_count
+    for airport_id in airport_ids:
+        airports[airport_id] = airport_database.get_airport_or_create(
+            sys.intern(strings[airport_id]))
+    # flights could reference airports not registered in airport database
+    for airport_id, airport in enumerate(airports):
+        if airport is None:
+            airports[airport_id] = Airport(sys.intern(strings[airport_id]))
+
+    flight_database = ColumnarFlightDatabase.from_columns(
+        columns,
+        strings[airport_count:],
+        airports,
+        list(zip(segments[::2], segments[1::2])),
+        departure_index
+    )
+
+    _logger.debug("Snapshot of %d flights loaded from '%s'", flight_count, path)
+    return flight_database, airport_database
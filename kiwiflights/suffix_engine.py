@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Itinerary search sharing continuations of flights among all itineraries passing through them"""
+
+import logging
+from array import array
+from collections import OrderedDict
+from .columnar_engine import ColumnarEngine
+from .itinerary import Itinerary
+
+_logger = logging.getLogger(__name__)
+
+
+class SuffixEngine(ColumnarEngine):
+    """Itinerary search memoizing continuations (suffixes) of flights
+
+    Continuations of flight f are all sequences of flights that can follow f, none of them
+    repeating a segment of f or of each other. They are stored in pre-order as pairs of
+    (depth, flight id) columns, continuations of f are built from continuations of flights
+    departing inside wait window after f - only the segment of f has to be checked again,
+    a continuation colliding with it is dropped with its whole subtree.
+
+    Every itinerary is a flight followed by one of its continuations, so the set of itineraries
+    is the same as System computes, the order differs - flights are processed from the latest
+    departure so continuations of following flights are already computed. Continuations are kept
+    in a cache bounded by the number of entries, the least recently used ones are evicted and
+    recomputed when needed again.
+    """
+    # Maximum number of (depth, flight id) entries kept in cache of continuations
+    _CACHE_SIZE = 1 << 22
+
+    def __init__(self, system):
+        """
+        :param system: system to search itineraries in
+        :type system: System
+        """
+        super().__init__(system)
+        self._cache = OrderedDict()
+        self._cache_entries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+
+    def _get_next_flight_ids(self, flight_id):
+        """
+        :param flight_id: id of flight taken
+        :return: ids of flights departing inside wait window that allow required bags
+        :rtype: list(int)
+        """
+        database = self.database
+        arrival_time = database.arrival[flight_id]
+        bags_allowed = database.bags_allowed
+        return [next_flight_id
+                for next_flight_id in database.get_departures_within(
+                    database.destination[flight_id],
+                    arrival_time + self.min_wait_time,
+                    arrival_time + self.max_wait_time)
+                if bags_allowed[next_flight_id] >= self.bags]
+
+    def _compute_suffixes(self, flight_id):
+        """Compute continuations of a flight from continuations of flights following it
+
+        :param flight_id: id of flight to compute continuations for
+        :return: depths and flight ids of continuations in pre-order
+        :rtype: tuple(array, array)
+        """
+        segment = self.database.segment
+        own_segment = segment[flight_id]
+        max_depth = self.max_stops
+
+        depths = array('i')
+        flight_ids = array('i')
+
+        if max_depth == 0:
+            return depths, flight_ids
+
+        for next_flight_id in self._get_next_flight_ids(flight_id):
+            if segment[next_flight_id] == own_segment:
+                continue
+
+            depths.append(1)
+            flight_ids.append(next_flight_id)
+
+            next_depths, next_flight_ids = self._get_suffixes(next_flight_id)
+            # depth of a continuation dropped together with its subtree
+            skip_depth = 0
+            for depth, suffix_flight_id in zip(next_depths, next_flight_ids):
+                if skip_depth:
+                    if depth > skip_depth:
+                        continue
+                    skip_depth = 0
+
+                if segment[suffix_flight_id] == own_segment \
+                        or (max_depth is not None and depth >= max_depth):
+                    skip_depth = depth
+                    continue
+
+                depths.append(depth + 1)
+                flight_ids.append(suffix_flight_id)
+
+        return depths, flight_ids
+
+    def _get_suffixes(self, flight_id):
+        """Get continuations of a flight, computed ones are cached
+
+        :param flight_id: id of flight
+        :return: depths and flight ids of continuations in pre-order
+        :rtype: tuple(array, array)
+        """
+        cache = self._cache
+        ret = cache.get(flight_id)
+
+        if ret is not None:
+            self.cache_hits += 1
+            cache.move_to_end(flight_id)
+            return ret
+
+        self.cache_misses += 1
+        ret = self._compute_suffixes(flight_id)
+
+        size = len(ret[0])
+        if size <= self._CACHE_SIZE:
+            cache[flight_id] = ret
+            self._cache_entries += size
+            while self._cache_entries > self._CACHE_SIZE:
+                _, (evicted, _) = cache.popitem(last=False)
+                self._cache_entries -= len(evicted)
+                self.cache_evictions += 1
+
+        return ret
+
+    def iter_itineraries(self):
+        """Compute itineraries lazily
+
+        :return: a generator of available itineraries
+        :rtype: generator(Itinerary)
+        """
+        get_flight = self.get_flight
+        departure = self.database.departure
+
+        for flight_id in sorted(self.get_seed_flight_ids(), key=lambda f: departure[f],
+                                reverse=True):
+            # path[depth] is the itinerary of depth + 1 flights, rebuilt from pre-order
+            path = [Itinerary(get_flight(flight_id))]
+            depths, flight_ids = self._get_suffixes(flight_id)
+            for depth, suffix_flight_id in zip(depths, flight_ids):
+                item = Itinerary(get_flight(suffix_flight_id), parent=path[depth - 1])
+                del path[depth:]
+                path.append(item)
+                yield item
+
+        _logger.debug("Continuations cache: %d hits, %d misses, %d evictions, %d entries",
+                      self.cache_hits, self.cache_misses, self.cache_evictions,
+                      self._cache_entries)
@@ -19,14 +19,30 @@
 # ####################################################################
 """A module where the whole power sits"""
 
+import os
+import sys
+import glob
 import logging
 import datetime
-from copy import copy
-from dateutil import parser as datetime_parser
+import functools
+import multiprocessing
 from .flight import Flight
 from .airport_database import AirportDatabase
 from .flight_database import FlightDatabase
+from .columnar_flight_database import ColumnarFlightDatabase
+from .columnar_engine import ColumnarEngine
+from .numpy_engine import NumpyEngine
+from .suffix_engine import SuffixEngine
+from .time_expanded_engine import TimeExpandedEngine, TimeExpandedGraph
+from .parallel_search import ParallelSearch
+from .reachability import Reachability
+from .ranked_search import RankedSearch
+from .pareto_search import ParetoSearch
+from .itinerary_counter import ItineraryCounter
+from .connection_scan import ConnectionScan
 from .itinerary import Itinerary
+from .snapshot import save_snapshot, load_snapshot
+from .utils import parse_datetime
 
 _logger = logging.getLogger(__name__)
 
@@ -35,10 +51,12 @@ class System(object):
     """Main system entry-point"""
 
     # Defaults for wait window to limit customer wait time at airports
-    # XXX: this could be propagated from CLI to parametrize user needs, keep this simple now
     _DEFAULT_MAX_WAIT_TIME = datetime.timedelta(hours=4)
     _DEFAULT_MIN_WAIT_TIME = datetime.timedelta(hours=1)
 
+    # approximate size of Itinerary instance in bytes, see result_cache
+    _ITINERARY_SIZE = 96
+
     # CSV indexes
     _CSV_IDX_SOURCE = 0
     _CSV_IDX_DESTINATION = 1
@@ -49,19 +67,199 @@ class System(object):
     _CSV_IDX_BAGS_ALLOWED = 6
     _CSV_IDX_BAG_PRICE = 7
     _CSV_ITEM_COUNT = 8
-
-    def __init__(self, flight_database=None, airport_database=None):
+    # Size hint (in characters) of a chunk of lines read at once from CSV file
+    _CSV_CHUNK_SIZE = 1 << 20
+    # Maximum number of parsed timestamps kept when parsing CSV file
+    _CSV_DATETIME_CACHE_SIZE = 1 << 16
+
+    # Available search engines, None stands for the built-in depth-first search over airports
+    ENGINE_DFS = 'dfs'
+    ENGINE_COLUMNAR = 'columnar'
+    ENGINE_NUMPY = 'numpy'
+    ENGINE_SUFFIX = 'suffix'
+    ENGINE_TIME_EXPANDED = 'time-expanded'
+    _ENGINES = {
+        ENGINE_DFS: None,
+        ENGINE_COLUMNAR: ColumnarEngine,
+        ENGINE_NUMPY: NumpyEngine,
+        ENGINE_SUFFIX: SuffixEngine,
+        ENGINE_TIME_EXPANDED: TimeExpandedEngine,
+    }
+
+    def __init__(self, flight_database=None, airport_database=None, engine=None,
+                 min_wait_time=None, max_wait_time=None, max_stops=None, bags=0):
         """
         :param flight_database: flight database to be used, defaults to FlightDatabase
         :param airport_database: airport database to be used, defaults to AirportDatabase
+        :param engine: search engine to be used, see System._ENGINES; defaults to depth-first
+                       search over airports or to columnar engine for ColumnarFlightDatabase
+        :param min_wait_time: minimal wait time between flights, defaults to 1 hour
+        :type min_wait_time: datetime.timedelta
+        :param max_wait_time: maximal wait time between flights, defaults to 4 hours
+        :type max_wait_time: datetime.timedelta
+        :param max_stops: maximum number of stops in itinerary, None for no limit
+        :param bags: number of bags all flights in itinerary have to allow
         """
-        self.flight_database = flight_database or FlightDatabase()
+        self.flight_database = flight_database if flight_database is not None else FlightDatabase()
         self.airport_database = airport_database or AirportDatabase()
 
+        # search parameters, applied while itineraries are expanded
+        self.min_wait_time = min_wait_time if min_wait_time is not None \
+            else self._DEFAULT_MIN_WAIT_TIME
+        self.max_wait_time = max_wait_time if max_wait_time is not None \
+            else self._DEFAULT_MAX_WAIT_TIME
+        self.max_stops = max_stops
+        self.bags = bags
+        self.check_search_parameters()
+
+        # statistics collected during search if set, see SearchStats
+        self.stats = None
+
+        # graph of connections kept for searches with the same parameters
+        self._time_expanded_graph = None
+        # flights sorted by departure kept for earliest arrival and profile queries
+        self._connection_scan = None
+
+        # results of iter_search() kept if set, see ResultCache
+        self._result_cache = None
+
+        self._engine = None
+        self.engine = engine or (self.ENGINE_COLUMNAR if self.is_columnar() else self.ENGINE_DFS)
+
+    def is_columnar(self):
+        """
+        :return: True if flights are kept in ColumnarFlightDatabase
+        """
+        return isinstance(self.flight_database, ColumnarFlightDatabase)
+
+    @property
+    def engine(self):
+        """
+        :return: name of search engine used to compute itineraries
+        :rtype: str
+        """
+        return self._engine
+
+    @engine.setter
+    def engine(self, engine):
+        """Set search engine used to compute itineraries
+
+        :param engine: name of search engine, see System._ENGINES
+        :raises ValueError: if engine is unknown or cannot be used with flight database
+        """
+        if engine not in self._ENGINES:
+            raise ValueError("Unknown search engine '%s', available: %s"
+                             % (engine, ", ".join(self.get_engines())))
+
+        if engine == self.ENGINE_DFS and self.is_columnar():
+            # airports do not keep flights in columnar mode
+            raise ValueError("Search engine '%s' cannot be used with columnar flight database"
+                             % engine)
+
+        self._engine = engine
+
+    def check_search_parameters(self):
+        """Check search parameters, they can be adjusted any time before a search
+
+        :raises ValueError: if search parameters are not valid
+        """
+        if self.min_wait_time < datetime.timedelta(0):
+            raise ValueError("Minimal wait time cannot be negative, got %s" % self.min_wait_time)
+
+        if self.min_wait_time > self.max_wait_time:
+            raise ValueError("Minimal wait time %s is greater than maximal wait time %s"
+                             % (self.min_wait_time, self.max_wait_time))
+
+        if self.max_stops is not None and self.max_stops < 0:
+            raise ValueError("Maximum number of stops cannot be negative, got %d" % self.max_stops)
+
+        if self.bags < 0:
+            raise ValueError("Number of bags cannot be negative, got %d" % self.bags)
+
+    @property
+    def result_cache(self):
+        """
+        :return: cache of iter_search() results, None if results are not cached
+        :rtype: ResultCache
+        """
+        return self._result_cache
+
+    @result_cache.setter
+    def result_cache(self, result_cache):
+        """Cache results of iter_search(), entries are invalidated when flights in flight
+        database change
+
+        :param result_cache: cache to be used, None to stop caching
+        :type result_cache: ResultCache
+        """
+        if self._result_cache is not None:
+            self.flight_database.remove_listener(self._result_cache.flights_changed)
+        if result_cache is not None:
+            self.flight_database.add_listener(result_cache.flights_changed)
+        self._result_cache = result_cache
+
+    def get_time_expanded_graph(self):
+        """Get time-expanded graph of connections for current search parameters
+
+        The graph is built on first use and kept until flights or search parameters change.
+
+        :return: graph of connections between flights
+        :rtype: TimeExpandedGraph
+        """
+        database = self.flight_database.to_columnar()
+        min_wait_time = int(self.min_wait_time.total_seconds())
+        max_wait_time = int(self.max_wait_time.total_seconds())
+
+        graph = self._time_expanded_graph
+        if graph is None or not graph.matches(database, min_wait_time, max_wait_time, self.bags):
+            graph = self._time_expanded_graph = TimeExpandedGraph(database, min_wait_time,
+                                                                  max_wait_time, self.bags)
+
+        return graph
+
+    def get_connection_scan(self):
+        """Get flights sorted by departure for earliest arrival and profile queries
+
+        Flights are sorted on first use and kept until they change, search parameters are read
+        on each query.
+
+        :return: connection scan over flights
+        :rtype: ConnectionScan
+        """
+        database = self.flight_database.to_columnar()
+        connection_scan = self._connection_scan
+        if connection_scan is None or not connection_scan.matches(database):
+            connection_scan = self._connection_scan = ConnectionScan(self)
+        return connection_scan
+
+    def can_extend(self, item):
+        """
+        :param item: itinerary to be extended
+        :type item: Itinerary
+        :return: True if itinerary can be extended by another flight without exceeding stops limit
+        """
+        # an itinerary of length flights makes length - 1 stops
+        return self.max_stops is None or item.length <= self.max_stops
+
+    def allows_bags(self, flight):
+        """
+        :param flight: flight to be checked
+        :return: True if flight allows number of bags required by the search
+        """
+        return flight.bags_allowed >= self.bags
+
     def __repr__(self):
         return "System(flight_database=%s, airport_database=%s)"\
                % (self.flight_database, self.airport_database)
 
+    @classmethod
+    def get_engines(cls):
+        """
+        :return: names of available search engines
+        :rtype: list(str)
+        """
+        return sorted(cls._ENGINES.keys())
+
     def _get_initialized_stack(self):
         """Get freshly initialized stack item
 
@@ -71,152 +269,564 @@ class System(object):
         stack = []
         for airport in self.airport_database.airports:
             for departure in airport.departures:
-                # We use frozenset to optimize checks for flights that were taken to (ideally) O(1)
-                seen = frozenset((departure.source, departure.destination,))
-                stack.append(Itinerary(price=departure.price,
-                                       bags_allowed=departure.bags_allowed,
-                                       bag_price=departure.bag_price,
-                                       total_flight_duration=departure.get_duration(),
-                                       total_wait_time=datetime.timedelta(0),
-                                       segments_seen={seen: True},
-                                       flights_taken=[departure]))
+                if self.allows_bags(departure):
+                    stack.append(Itinerary(departure))
         return stack
 
-    @staticmethod
-    def _get_next_stack_item(prev_stack_item, next_flight):
-        """Get next stack item
+    def _inside_wait_window(self, prev_flight, next_flight):
+        """Check whether waiting time is inside defined window
 
-        :param prev_stack_item: previous stack item
-        :type prev_stack_item: Itinerary
-        :param next_flight: next flight based on which the next stack item should be computed
-        :return: new stack item
-        :rtype: Itinerary
+        :param prev_flight: previous flight that was taken
+        :param next_flight: next flight that could be taken
+        :return: True if waiting time resists in defined time window
         """
-        prev_flight = prev_stack_item.flights_taken[-1]
+        wait_time = next_flight.departure - prev_flight.arrival
+        return self.min_wait_time <= wait_time <= self.max_wait_time
 
-        # Prevent from updating next items on stack
-        new_total_duration = prev_stack_item.total_flight_duration + next_flight.get_duration()
-        new_total_wait = prev_stack_item.total_wait_time \
-            + (next_flight.departure - prev_flight.arrival)
+    def iter_itineraries(self, jobs=None):
+        """Compute itineraries lazily, an itinerary is yielded as soon as it is found
 
-        new_seen = copy(prev_stack_item.segments_seen)
-        new_seen[frozenset((prev_flight.destination, next_flight.destination,))] = True
+        :param jobs: number of worker processes to search in, see ParallelSearch
+        :return: a generator of available itineraries
+        :rtype: generator(Itinerary)
+        """
+        # flight database could be replaced after the engine was chosen, check again
+        self.engine = self._engine
+        self.check_search_parameters()
 
-        return Itinerary(price=prev_stack_item.price + next_flight.price,
-                         bags_allowed=min(prev_stack_item.bags_allowed, next_flight.bags_allowed),
-                         bag_price=prev_stack_item.bag_price + next_flight.bag_price,
-                         total_flight_duration=new_total_duration,
-                         total_wait_time=new_total_wait,
-                         flights_taken=prev_stack_item.flights_taken + [next_flight],
-                         segments_seen=new_seen)
+        if jobs is not None and jobs > 1:
+            return ParallelSearch(self, jobs).iter_itineraries()
 
-    @classmethod
-    def _inside_wait_window(cls, prev_flight, next_flight):
-        """Check whether waiting time is inside defined window
+        engine_class = self._ENGINES[self.engine]
+        if engine_class is not None:
+            return engine_class(self).iter_itineraries()
 
-        :param prev_flight: previous flight that was taken
-        :param next_flight: next flight that could be taken
-        :return: True if waiting time resists in defined time window
+        return self._iter_itineraries()
+
+    def _get_next_flights(self, item):
+        """Get flights that can extend itinerary
+
+        :param item: itinerary to be extended
+        :type item: Itinerary
+        :return: flights departing inside wait window that allow required bags and do not cause
+                 a cycle, no flights if itinerary already makes the maximum number of stops
+        :rtype: list(Flight)
         """
-        wait_time = next_flight.departure - prev_flight.arrival
-        return cls._DEFAULT_MIN_WAIT_TIME <= wait_time <= cls._DEFAULT_MAX_WAIT_TIME
+        if not self.can_extend(item):
+            if self.stats is not None:
+                self.stats.rejected_by_stops += 1
+            return []
+
+        last_flight = item.flight
+        # only departures inside wait window are retrieved from the departure index
+        candidates = last_flight.destination.get_departures_within(
+            last_flight.arrival + self.min_wait_time,
+            last_flight.arrival + self.max_wait_time
+        )
+
+        ret = []
+        for next_flight in candidates:
+            if next_flight.bags_allowed < self.bags:
+                continue
+            if item.has_segment(next_flight.segment):
+                continue
+            ret.append(next_flight)
+
+        if self.stats is not None:
+            # rejections are recounted only when statistics are collected, not in the loop above
+            self.stats.record_expansion(last_flight.destination,
+                                        len(last_flight.destination.departures),
+                                        len(candidates),
+                                        sum(1 for f in candidates if f.bags_allowed < self.bags),
+                                        len(ret))
+
+        return ret
+
+    def _iter_itineraries(self, stack=None):
+        """Depth-first search over airports, see iter_itineraries()
+
+        :param stack: itineraries to start with, defaults to all seed flights
+        """
+        if stack is None:
+            stack = self._get_initialized_stack()
+        stats = self.stats
+
+        while stack:
+            if stats is not None:
+                stats.record_stack_depth(len(stack))
+            item = stack.pop()
 
-    def compute_itineraries(self):
+            for next_flight in self._get_next_flights(item):
+                next_stack_item = Itinerary(next_flight, parent=item)
+                yield next_stack_item
+                stack.append(next_stack_item)
+
+    def compute_itineraries(self, jobs=None):
         """Compute itineraries
 
+        :param jobs: number of worker processes to search in, see ParallelSearch
         :return: a list of available itineraries
         :rtype: list(Itineraries)
         """
-        stack = self._get_initialized_stack()
-        itineraries = []
+        return list(self.iter_itineraries(jobs=jobs))
+
+    def iter_search(self, source, destination, depart_after=None, arrive_before=None):
+        """Search itineraries from source to destination lazily
+
+        Flights from which destination cannot be reached in time are pruned before the search.
+
+        :param source: code of source airport
+        :param destination: code of destination airport
+        :param depart_after: earliest departure from source, None for no limit
+        :type depart_after: datetime.datetime
+        :param arrive_before: latest arrival to destination, None for no limit
+        :type arrive_before: datetime.datetime
+        :return: a generator of itineraries from source to destination
+        :rtype: generator(Itinerary)
+        :raises KeyError: if source or destination airport is not known
+        :raises ValueError: if flights are kept in columnar flight database or search parameters
+                            are not valid
+        """
+        if self.is_columnar():
+            raise ValueError("Search is not available with columnar flight database")
+
+        self.check_search_parameters()
+        source_airport = self.airport_database.get_airport(source)
+        destination_airport = self.airport_database.get_airport(destination)
+
+        result_cache = self._result_cache
+        if result_cache is not None:
+            key = (source, destination, depart_after, arrive_before, self.min_wait_time,
+                   self.max_wait_time, self.max_stops, self.bags)
+            itineraries = result_cache.get(key)
+            if itineraries is not None:
+                return iter(itineraries)
+
+        reachability = Reachability(self, destination_airport, arrive_before=arrive_before)
+
+        # departures after the latest useful one are not even inspected
+        latest_departure = reachability.latest_departure.get(source_airport)
+        if latest_departure is None:
+            stack = []
+        else:
+            candidates = source_airport.get_departures_within(depart_after, latest_departure)
+            stack = [Itinerary(f) for f in candidates
+                     if self.allows_bags(f) and reachability.is_useful(f)]
+
+        if result_cache is not None:
+            itineraries = list(self._iter_search(stack, destination_airport, reachability))
+            # itineraries share their prefixes, count each as if it did not
+            size = sys.getsizeof(itineraries) \
+                + sum(item.length for item in itineraries) * self._ITINERARY_SIZE
+            result_cache.put(key, itineraries, self._get_route_airports(reachability), size=size)
+            return iter(itineraries)
+
+        return self._iter_search(stack, destination_airport, reachability)
+
+    @staticmethod
+    def _get_route_airports(reachability):
+        """
+        :param reachability: reachability of a destination
+        :type reachability: Reachability
+        :return: codes of airports itineraries to the destination can change with, see ResultCache
+        """
+        airports = {airport.code for airport in reachability.latest_departure}
+        airports.add(reachability.destination.code)
+        return airports
+
+    def get_route_airports(self, destination, arrive_before=None):
+        """Get airports search results to destination depend on, see ResultCache
+
+        :param destination: code of destination airport
+        :param arrive_before: latest arrival to destination, None for no limit
+        :return: codes of airports flights to which can change itineraries to the destination
+        :raises KeyError: if destination airport is not known
+        """
+        destination_airport = self.airport_database.get_airport(destination)
+        return self._get_route_airports(Reachability(self, destination_airport,
+                                                     arrive_before=arrive_before))
+
+    def _iter_search(self, stack, destination, reachability):
+        """Depth-first search restricted to useful flights, see iter_search()"""
+        stats = self.stats
 
         while stack:
+            if stats is not None:
+                stats.record_stack_depth(len(stack))
             item = stack.pop()
 
-            last_flight = item.flights_taken[-1]
-            _logger.debug("Inspecting possibilities after flight %s, %d",
-                          last_flight.flight_number, len(last_flight.destination.departures))
-            for next_flight in last_flight.destination.departures:
-                if not self._inside_wait_window(last_flight, next_flight):
-                    _logger.debug("Next flight %s after flight %s does not fit inside window",
-                                  next_flight, last_flight)
+            for next_flight in self._get_next_flights(item):
+                if not reachability.is_useful(next_flight):
                     continue
 
-                segment = frozenset((last_flight.destination, next_flight.destination,))
-                if segment in item.segments_seen:
-                    _logger.debug("Next flight %s after flight %s would cause cycle",
-                                  next_flight, last_flight)
-                    continue
-
-                next_stack_item = self._get_next_stack_item(item, next_flight)
-                _logger.debug("New itinerary computed: %s", next_stack_item)
-                itineraries.append(next_stack_item)
+                next_stack_item = Itinerary(next_flight, parent=item)
+                if next_flight.destination is destination:
+                    yield next_stack_item
                 stack.append(next_stack_item)
 
-        return itineraries
+    def search(self, source, destination, depart_after=None, arrive_before=None):
+        """Search itineraries from source to destination
+
+        :param source: code of source airport
+        :param destination: code of destination airport
+        :param depart_after: earliest departure from source, None for no limit
+        :param arrive_before: latest arrival to destination, None for no limit
+        :return: a list of itineraries from source to destination
+        :rtype: list(Itinerary)
+        """
+        return list(self.iter_search(source, destination,
+                                     depart_after=depart_after, arrive_before=arrive_before))
+
+    def best_itineraries(self, count, key=RankedSearch.KEY_PRICE, bags=None, source=None,
+                         destination=None):
+        """Find the best itineraries using best-first search, see RankedSearch
+
+        :param count: number of itineraries to find
+        :param key: sort key, one of RankedSearch.KEYS
+        :param bags: number of bags itineraries have to allow, priced by price_with_bags key;
+                     defaults to bags required by system
+        :param source: code of source airport, None for any airport
+        :param destination: code of destination airport, None for any airport
+        :return: at most count best itineraries, the best one first
+        :rtype: list(Itinerary)
+        """
+        return RankedSearch(self, key=key, bags=bags, source=source,
+                            destination=destination).get_best(count)
+
+    def iter_pareto_itineraries(self, source=None, destination=None):
+        """Compute itineraries not dominated in price, allowed bags and duration, see ParetoSearch
+
+        :param source: code of source airport, None for any airport
+        :param destination: code of destination airport, None for any airport
+        :return: a generator of Pareto-optimal itineraries, ordered by arrival
+        :rtype: generator(Itinerary)
+        :raises KeyError: if source or destination airport is not known
+        """
+        return ParetoSearch(self, source=source, destination=destination).iter_itineraries()
+
+    def earliest_arrival(self, source, destination, depart_after=None):
+        """Find the journey from source arriving to destination as early as possible, see
+        ConnectionScan.earliest_arrival()
+
+        :param source: code of source airport
+        :param destination: code of destination airport
+        :param depart_after: earliest departure from source, None for no limit
+        :type depart_after: datetime.datetime
+        :return: itinerary arriving the earliest, None if destination cannot be reached
+        :rtype: Itinerary
+        :raises KeyError: if source or destination airport is not known
+        """
+        self.check_search_parameters()
+        return self.get_connection_scan().earliest_arrival(source, destination,
+                                                           depart_after=depart_after)
+
+    def profile(self, source, destination, depart_after=None, arrive_before=None):
+        """Find journeys from source to destination Pareto-optimal in departure and arrival,
+        see ConnectionScan.profile()
+
+        :param source: code of source airport
+        :param destination: code of destination airport
+        :param depart_after: earliest departure from source, None for no limit
+        :type depart_after: datetime.datetime
+        :param arrive_before: latest arrival to destination, None for no limit
+        :type arrive_before: datetime.datetime
+        :return: itineraries ordered by departure, each of them arriving earlier than any
+                 itinerary departing later
+        :rtype: list(Itinerary)
+        :raises KeyError: if source or destination airport is not known
+        """
+        self.check_search_parameters()
+        return self.get_connection_scan().profile(source, destination, depart_after=depart_after,
+                                                  arrive_before=arrive_before)
+
+    def count_itineraries(self):
+        """Count itineraries and aggregate their prices and durations per airport pair without
+        creating them, see ItineraryCounter
+
+        :return: summaries of airport pairs connected by an itinerary, ordered by source and
+                 destination code
+        :rtype: list(PairSummary)
+        """
+        self.check_search_parameters()
+        return list(ItineraryCounter(self).iter_summaries())
+
+    def save_snapshot(self, path):
+        """Store flights and airports to a binary snapshot, see kiwiflights.snapshot
+
+        :param path: path to the snapshot file
+        """
+        save_snapshot(self, path)
 
     @classmethod
-    def from_csv_file(cls, file, has_header=True):
-        """ Create database from a CSV file
+    def load_snapshot(cls, path, columnar=False):
+        """Create system from a binary snapshot created by save_snapshot()
+
+        :param path: path to the snapshot file
+        :param columnar: keep flights in ColumnarFlightDatabase as loaded, airports will not keep
+                         flights; otherwise flights are materialized and registered to airports
+        :return: system with loaded flights
+        :rtype: System
+        """
+        flight_database, airport_database = load_snapshot(path)
+
+        if columnar:
+            return System(flight_database=flight_database, airport_database=airport_database)
+
+        flights = [flight_database.materialize_flight(flight_id)
+                   for flight_id in range(len(flight_database))]
+        for flight in flights:
+            flight.source.register_flight(flight)
+            flight.destination.register_flight(flight)
+
+        return System(flight_database=FlightDatabase(flights), airport_database=airport_database)
+
+    @classmethod
+    def _parse_csv_datetime(cls, cache, string):
+        """Parse datetime from CSV file, parsed timestamps are cached as they repeat a lot
+
+        :param cache: dict used as a cache of parsed timestamps
+        :param string: string representation of datetime
+        :return: parsed datetime
+        :rtype: datetime.datetime
+        """
+        ret = cache.get(string)
+
+        if ret is None:
+            ret = parse_datetime(string)
+            if len(cache) >= cls._CSV_DATETIME_CACHE_SIZE:
+                cache.clear()
+            cache[string] = ret
+
+        return ret
+
+    @classmethod
+    def _iter_csv_rows(cls, file, has_header=True):
+        """Parse rows of a CSV file
 
         :param file: opened file-like object
         :param has_header: True if file has a header on the first line
-        :return:system with parsed flights
-        :rtype: System
+        :return: a generator of parsed rows - tuples (source code, destination code, departure,
+                 arrival, flight number, price, bags allowed, bag price)
+        :rtype: generator(tuple)
+        :raises ValueError: if a row is not valid
         """
         # we could use csv module here, but keep it this way for now...
-        system = System()
-        line = file.readline()
+        debug = _logger.isEnabledFor(logging.DEBUG)
+        datetime_cache = {}
 
         # skip a very first line - a CSV header
         if has_header:
-            _logger.debug("Skipping CSV header: '%s'", line[:-1])  # remove \n
             line = file.readline()
+            if debug:
+                _logger.debug("Skipping CSV header: '%s'", line[:-1])  # remove \n
+
+        lines = file.readlines(cls._CSV_CHUNK_SIZE)
+        while lines:
+            for line in lines:
+                if debug:
+                    _logger.debug("Parsing line: '%s'", line[:-1])  # remove \n
+                items = line.split(',')
+
+                if len(items) != cls._CSV_ITEM_COUNT:
+                    raise ValueError("Expected %d items in CVS file in file, got %d instead: %s"
+                                     % (cls._CSV_ITEM_COUNT, len(items), str(items)))
+
+                try:
+                    departure_datetime = cls._parse_csv_datetime(datetime_cache,
+                                                                 items[cls._CSV_IDX_DEPARTURE])
+                except ValueError:
+                    raise ValueError("Departure time '%s' is not correct"
+                                     % items[cls._CSV_IDX_DEPARTURE])
+
+                try:
+                    arrival_datetime = cls._parse_csv_datetime(datetime_cache,
+                                                               items[cls._CSV_IDX_ARRIVAL])
+                except ValueError:
+                    raise ValueError("Arrival time '%s' is not correct"
+                                     % items[cls._CSV_IDX_ARRIVAL])
+
+                if departure_datetime >= arrival_datetime:
+                    raise ValueError("Departure after arrival detected, flight '%s'"
+                                     % items[cls._CSV_IDX_FLIGHT_NUMBER])
+
+                yield (items[cls._CSV_IDX_SOURCE],
+                       items[cls._CSV_IDX_DESTINATION],
+                       departure_datetime,
+                       arrival_datetime,
+                       items[cls._CSV_IDX_FLIGHT_NUMBER],
+                       float(items[cls._CSV_IDX_PRICE]),
+                       int(items[cls._CSV_IDX_BAGS_ALLOWED]),
+                       float(items[cls._CSV_IDX_BAG_PRICE]))
+
+            lines = file.readlines(cls._CSV_CHUNK_SIZE)
+
+    def load_rows(self, rows):
+        """Register flights from parsed CSV rows, airports are looked up or created
+
+        :param rows: iterable of parsed rows, see _iter_csv_rows()
+        :return: number of flights registered
+        :rtype: int
+        :raises ValueError: if a flight with the same number is already known, flights from
+                            preceding rows stay registered
+        """
+        debug = _logger.isEnabledFor(logging.DEBUG)
+        register_to_airports = not self.is_columnar()
+        airports = {}
+        count = 0
+
+        for source, destination, departure, arrival, flight_number, price, bags_allowed, \
+                bag_price in rows:
+            source_airport = airports.get(source)
+            if source_airport is None:
+                code = sys.intern(source)
+                source_airport = self.airport_database.get_airport_or_create(code)
+                airports[code] = source_airport
+
+            destination_airport = airports.get(destination)
+            if destination_airport is None:
+                code = sys.intern(destination)
+                destination_airport = self.airport_database.get_airport_or_create(code)
+                airports[code] = destination_airport
 
-        while line:
-            _logger.debug("Parsing line: '%s'", line[:-1])  # remove \n
-            items = line.split(',')
+            new_flight = Flight(
+                source=source_airport,
+                destination=destination_airport,
+                departure=departure,
+                arrival=arrival,
+                flight_number=flight_number,
+                price=price,
+                bags_allowed=bags_allowed,
+                bag_price=bag_price
+            )
 
-            if len(items) != cls._CSV_ITEM_COUNT:
-                raise ValueError("Expected %d items in CVS file in file, got %d instead: %s"
-                                 % (cls._CSV_ITEM_COUNT, len(items), str(items)))
+            if debug:
+                _logger.debug("New flight parsed: %s", new_flight)
 
-            try:
-                departure_datetime = datetime_parser.parse(items[cls._CSV_IDX_DEPARTURE])
-            except ValueError:
-                raise ValueError("Departure time '%s' is not correct"
-                                 % items[cls._CSV_IDX_DEPARTURE])
+            self.flight_database.register(new_flight)
+            if register_to_airports:
+                destination_airport.register_flight(new_flight)
+                source_airport.register_flight(new_flight)
+            count += 1
 
-            try:
-                arrival_datetime = datetime_parser.parse(items[cls._CSV_IDX_ARRIVAL])
-            except ValueError:
-                raise ValueError("Arrival time '%s' is not correct" % items[cls._CSV_IDX_ARRIVAL])
+        return count
 
-            if departure_datetime >= arrival_datetime:
-                raise ValueError("Departure after arrival detected, flight '%s'"
-                                 % items[cls._CSV_IDX_FLIGHT_NUMBER])
+    def load_csv_file(self, file, has_header=True):
+        """Load flights from a CSV file to system, rows are registered as they are parsed
 
-            source_airport = system.airport_database. \
-                get_airport_or_create(items[cls._CSV_IDX_SOURCE])
-            destination_airport = system.airport_database. \
-                get_airport_or_create(items[cls._CSV_IDX_DESTINATION])
+        :param file: opened file-like object
+        :param has_header: True if file has a header on the first line
+        :return: number of flights loaded
+        :rtype: int
+        :raises ValueError: if a row is not valid or a flight is already known
+        """
+        return self.load_rows(self._iter_csv_rows(file, has_header=has_header))
 
-            new_flight = Flight(
-                source=source_airport,
-                destination=destination_airport,
-                departure=departure_datetime,
-                arrival=arrival_datetime,
-                flight_number=items[cls._CSV_IDX_FLIGHT_NUMBER],
-                price=float(items[cls._CSV_IDX_PRICE]),
-                bags_allowed=int(items[cls._CSV_IDX_BAGS_ALLOWED]),
-                bag_price=float(items[cls._CSV_IDX_BAG_PRICE])
-            )
+    @staticmethod
+    def expand_csv_paths(paths):
+        """Expand directories and glob patterns to paths of CSV files
+
+        :param paths: a path or a list of paths - files, directories (their *.csv files are used)
+                      or glob patterns
+        :return: paths to files, files in a directory or matching a pattern are sorted
+        :rtype: list(str)
+        :raises ValueError: if a directory or a pattern does not match any file
+        """
+        if isinstance(paths, str):
+            paths = [paths]
+
+        ret = []
+        for path in paths:
+            if os.path.isdir(path):
+                matched = sorted(glob.glob(os.path.join(path, '*.csv')))
+            elif any(char in path for char in '*?['):
+                matched = sorted(glob.glob(path))
+            else:
+                ret.append(path)
+                continue
+
+            if not matched:
+                raise ValueError("No CSV files found in '%s'" % path)
+            ret.extend(matched)
+
+        return ret
+
+    def load_csv_files(self, paths, has_header=True, jobs=None):
+        """Load flights from multiple CSV files to system
+
+        Files are parsed in worker processes, parsed rows are registered in the parent process
+        in order of files as soon as they are available, so the result is the same as loading
+        the files one by one.
+
+        :param paths: paths to files, directories or glob patterns, see expand_csv_paths()
+        :param has_header: True if files have a header on the first line
+        :param jobs: number of worker processes, defaults to number of CPUs; files are parsed
+                     in this process if 1
+        :return: number of flights loaded
+        :rtype: int
+        :raises ValueError: if a row is not valid or a flight is already known, flights from
+                            preceding rows stay registered
+        """
+        paths = self.expand_csv_paths(paths)
+        jobs = min(jobs or os.cpu_count() or 1, len(paths))
+        count = 0
+
+        if jobs <= 1:
+            for path in paths:
+                _logger.debug("Loading CSV file '%s'", path)
+                with open(path, 'r') as f:
+                    count += self.load_csv_file(f, has_header=has_header)
+            return count
+
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+        else:
+            context = multiprocessing.get_context()
+
+        with context.Pool(jobs) as pool:
+            parse = functools.partial(_parse_csv_path, has_header=has_header)
+            for path, rows in zip(paths, pool.imap(parse, paths)):
+                _logger.debug("Loading %d rows parsed from CSV file '%s'", len(rows), path)
+                count += self.load_rows(rows)
+
+        return count
 
-            _logger.debug("New flight parsed: %s", new_flight)
+    @classmethod
+    def from_csv_file(cls, file, has_header=True, columnar=False):
+        """ Create database from a CSV file
 
-            system.flight_database.register(new_flight)
-            destination_airport.register_flight(new_flight)
-            source_airport.register_flight(new_flight)
-            line = file.readline()
+        :param file: opened file-like object
+        :param has_header: True if file has a header on the first line
+        :param columnar: store flights in ColumnarFlightDatabase, airports will not keep flights
+        :return:system with parsed flights
+        :rtype: System
+        """
+        system = System(flight_database=ColumnarFlightDatabase() if columnar else None)
+        system.load_csv_file(file, has_header=has_header)
+        return system
 
+    @classmethod
+    def from_csv_files(cls, paths, has_header=True, columnar=False, jobs=None):
+        """Create system from multiple CSV files parsed in parallel, see load_csv_files()
+
+        :param paths: paths to files, directories or glob patterns, see expand_csv_paths()
+        :param has_header: True if files have a header on the first line
+        :param columnar: store flights in ColumnarFlightDatabase, airports will not keep flights
+        :param jobs: number of worker processes, defaults to number of CPUs
+        :return: system with parsed flights
+        :rtype: System
+        """
+        system = System(flight_database=ColumnarFlightDatabase() if columnar else None)
+        system.load_csv_files(paths, has_header=has_header, jobs=jobs)
         return system
+
+
+def _parse_csv_path(path, has_header=True):
+    """Parse a CSV file in a worker process, see System.load_csv_files()
+
+    :param path: path to CSV file
+    :param has_header: True if file has a header on the first line
+    :return: parsed rows
+    :rtype: list(tuple)
+    """
+    with open(path, 'r') as f:
+        return list(System._iter_csv_rows(f, has_header=has_header))
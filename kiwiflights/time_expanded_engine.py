@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ####################################################################
+# Copyright (C) 2016  Fridolin Pokorny, fridex.devel@gmail.com
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+# ####################################################################
+"""Itinerary search on a time-expanded connection graph of flights"""
+
+import sys
+import time
+import logging
+from array import array
+from .columnar_engine import ColumnarEngine
+from .itinerary import Itinerary
+
+_logger = logging.getLogger(__name__)
+
+
+class TimeExpandedGraph(object):
+    """Connection graph of flights built for fixed search parameters
+
+    Each flight is a node (its arrival and the following departure are one event), edges lead
+    from a flight to flights departing from its destination inside the wait window that allow
+    required bags. Edges are stored in compressed sparse row form - flights following flight f
+    are targets[offsets[f]:offsets[f + 1]], in order in which they were registered. Timing
+    constraints are resolved once when the graph is built, the graph can be used for any number
+    of searches with the same parameters.
+    """
+    def __init__(self, database, min_wait_time, max_wait_time, bags=0):
+        """
+        :param database: columnar database of flights
+        :type database: ColumnarFlightDatabase
+        :param min_wait_time: minimum wait time between flights in seconds
+        :param max_wait_time: maximum wait time between flights in seconds
+        :param bags: number of bags flights have to allow
+        """
+        self.database = database
+        self.min_wait_time = min_wait_time
+        self.max_wait_time = max_wait_time
+        self.bags = bags
+        self.database_version = database.version
+        self.flight_count = len(database)
+        self.offsets = array('q', [0])
+        self.targets = array('i')
+
+        start = time.perf_counter()
+        self._build()
+        self.build_time = time.perf_counter() - start
+
+        _logger.debug("Time-expanded graph of %d flights and %d edges built in %.3fs, %d bytes",
+                      self.flight_count, self.edge_count, self.build_time, self.memory_usage())
+
+    def _build(self):
+        """Compute edges of all flights"""
+        database = self.database
+        destination = database.destination
+        arrival = database.arrival
+        bags_allowed = database.bags_allowed
+        offsets = self.offsets
+        targets = self.targets
+
+        for flight_id in range(self.flight_count):
+            arrival_time = arrival[flight_id]
+            targets.extend(next_flight_id
+                           for next_flight_id in database.get_departures_within(
+                               destination[flight_id],
+                               arrival_time + self.min_wait_time,
+                               arrival_time + self.max_wait_time)
+                           if bags_allowed[next_flight_id] >= self.bags)
+            offsets.append(len(targets))
+
+    @property
+    def edge_count(self):
+        """
+        :return: number of edges in graph
+        """
+        return len(self.targets)
+
+    def memory_usage(self):
+        """
+        :return: number of bytes allocated by the graph (its arrays)
+        :rtype: int
+        """
+        return sys.getsizeof(self.offsets) + sys.getsizeof(self.targets)
+
+    def matches(self, database, min_wait_time, max_wait_time, bags):
+        """Check whether graph can be used for a search with the given parameters
+
+        :param database: columnar database of flights
+        :param min_wait_time: minimum wait time between flights in seconds
+        :param max_wait_time: maximum wait time between flights in seconds
+        :param bags: number of bags flights have to allow
+        :return: True if graph was built for the same flights and parameters
+        """
+        return self.database is database and self.database_version == database.version \
+            and self.min_wait_time == min_wait_time and self.max_wait_time == max_wait_time \
+            and self.bags == bags
+
+    def get_next_flight_ids(self, flight_id):
+        """
+        :param flight_id: id of flight taken
+        :return: ids of flights that can follow the flight
+        :rtype: array
+        """
+        return self.targets[self.offsets[flight_id]:self.offsets[flight_id + 1]]
+
+
+class TimeExpandedEngine(ColumnarEngine):
+    """Depth-first itinerary search walking adjacency arrays of TimeExpandedGraph
+
+    The graph is obtained from System.get_time_expanded_graph() so it is shared by searches
+    with the same parameters. Cycles are checked on segment ids, itineraries are yielded in the
+    same order as System yields them.
+    """
+    def __init__(self, system):
+        """
+        :param system: system to search itineraries in
+        :type system: System
+        """
+        super().__init__(system)
+        self.graph = system.get_time_expanded_graph()
+
+    def iter_itineraries(self):
+        """Compute itineraries lazily
+
+        :return: a generator of available itineraries
+        :rtype: generator(Itinerary)
+        """
+        offsets = self.graph.offsets
+        targets = self.graph.targets
+        segment = self.database.segment
+        # an itinerary of length flights makes length - 1 stops
+        max_length = self.max_stops + 1 if self.max_stops is not None else None
+        get_flight = self.get_flight
+
+        # stack items are (itinerary, flight id, segment ids of itinerary)
+        stack = [(Itinerary(get_flight(flight_id)), flight_id, (segment[flight_id],))
+                 for flight_id in self.get_seed_flight_ids()]
+
+        while stack:
+            item, flight_id, segments = stack.pop()
+            if max_length is not None and len(segments) >= max_length:
+                continue
+
+            for idx in range(offsets[flight_id], offsets[flight_id + 1]):
+                next_flight_id = targets[idx]
+                next_segment = segment[next_flight_id]
+                if next_segment in segments:
+                    continue
+
+                next_stack_item = Itinerary(get_flight(next_flight_id), parent=item)
+                yield next_stack_item
+                stack.append((next_stack_item, next_flight_id, segments + (next_segment,)))
@@ -19,8 +19,21 @@
 # ####################################################################
 """Utils and helpers for kiwiflights"""
 
-# We could use ujson
 import json
+import datetime
+
+from .itinerary_encoder import ItineraryEncoder
+from .itinerary_counter import PairSummary
+
+# Timestamps used in columnar storage are seconds since this (naive, UTC) datetime
+_EPOCH = datetime.datetime(1970, 1, 1)
+_SECONDS_PER_DAY = 24 * 60 * 60
+
+# Expected length of the ISO-8601 timestamp used in CSV files, e.g. 2017-02-11T06:25:00
+_ISO_DATETIME_LENGTH = 19
+
+# Number of strings joined before a write when streaming itineraries
+_CHUNK_SIZE = 2048
 
 
 def datetime_format(datetime_instance):
@@ -33,6 +46,57 @@ def datetime_format(datetime_instance):
     return datetime_instance.strftime('%Y-%m-%dT%H:%M:%S')
 
 
+def datetime2timestamp(datetime_instance):
+    """Convert datetime to an integer timestamp (seconds since epoch)
+
+    :param datetime_instance: datetime instance, naive datetimes are treated as UTC
+    :type datetime_instance: datetime.datetime
+    :return: seconds since epoch
+    :rtype: int
+    """
+    if datetime_instance.tzinfo is not None:
+        datetime_instance = datetime_instance.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+    delta = datetime_instance - _EPOCH
+    return delta.days * _SECONDS_PER_DAY + delta.seconds
+
+
+def timestamp2datetime(timestamp):
+    """Convert an integer timestamp (seconds since epoch) to a naive datetime
+
+    :param timestamp: seconds since epoch
+    :type timestamp: int
+    :return: datetime instance
+    :rtype: datetime.datetime
+    """
+    return _EPOCH + datetime.timedelta(seconds=timestamp)
+
+
+def parse_datetime(string):
+    """Parse datetime from its string representation
+
+    Timestamps in the fixed ISO-8601 format (2017-02-11T06:25:00) are parsed directly, anything
+    else is handed to dateutil's parser.
+
+    :param string: string representation of datetime
+    :type string: str
+    :return: parsed datetime
+    :rtype: datetime.datetime
+    :raises ValueError: if string is not a valid datetime representation
+    """
+    if len(string) == _ISO_DATETIME_LENGTH and string[4] == '-' and string[7] == '-' \
+            and string[10] == 'T' and string[13] == ':' and string[16] == ':':
+        try:
+            return datetime.datetime(int(string[0:4]), int(string[5:7]), int(string[8:10]),
+                                     int(string[11:13]), int(string[14:16]), int(string[17:19]))
+        except ValueError:
+            pass
+
+    # dateutil is slow to import and we need it only for unusual formats
+    from dateutil import parser as datetime_parser
+    return datetime_parser.parse(string)
+
+
 def dict2json(dict_, pretty=True):
     """"Convert dict to a human readable JSON
 
@@ -47,3 +111,89 @@ def dict2json(dict_, pretty=True):
         return json.dumps(dict_, sort_keys=True, separators=(',', ': '), indent=2)
     else:
         return json.dumps(dict_)
+
+
+def _write_chunked(items, output_file, first_prefix, separator):
+    """Write serialized items in chunks, the first item is written and flushed right away
+
+    :param items: iterable of serialized items
+    :param output_file: file-like object to write to
+    :param first_prefix: string written before the first item
+    :param separator: string written before every other item
+    :return: number of items written
+    :rtype: int
+    """
+    count = 0
+    chunk = []
+
+    for item in items:
+        if count == 0:
+            output_file.write(first_prefix + item)
+            output_file.flush()
+        else:
+            chunk.append(separator)
+            chunk.append(item)
+            if len(chunk) >= _CHUNK_SIZE:
+                output_file.write(''.join(chunk))
+                chunk = []
+        count += 1
+
+    if chunk:
+        output_file.write(''.join(chunk))
+
+    return count
+
+
+def write_itineraries_json(itineraries, output_file, pretty=True):
+    """Write itineraries as a JSON document {"itineraries": [...]}, one itinerary at a time
+
+    The output is the same as dict2json() would produce for the whole document, followed by a
+    new line, but itineraries are serialized as they come so the whole document is never held
+    in memory.
+
+    :param itineraries: iterable of itineraries to be written
+    :param output_file: file-like object to write to
+    :param pretty: use pretty formatting
+    :type pretty: bool
+    :return: number of itineraries written
+    :rtype: int
+    """
+    if pretty is True:
+        encoder = ItineraryEncoder(pretty=True, indent='    ')
+        items = (encoder.encode(itinerary) for itinerary in itineraries)
+        count = _write_chunked(items, output_file, '{\n  "itineraries": [\n    ', ',\n    ')
+        output_file.write('\n  ]\n}\n' if count > 0 else '{\n  "itineraries": []\n}\n')
+    else:
+        encoder = ItineraryEncoder(pretty=False)
+        items = (encoder.encode(itinerary) for itinerary in itineraries)
+        count = _write_chunked(items, output_file, '{"itineraries": [', ', ')
+        output_file.write(']}\n' if count > 0 else '{"itineraries": []}\n')
+
+    return count
+
+
+def write_itineraries_json_lines(itineraries, output_file):
+    """Write itineraries in JSON Lines format - one JSON serialized itinerary per line
+
+    :param itineraries: iterable of itineraries to be written
+    :param output_file: file-like object to write to
+    :return: number of itineraries written
+    :rtype: int
+    """
+    encoder = ItineraryEncoder(pretty=False)
+    items = (encoder.encode(itinerary) + '\n' for itinerary in itineraries)
+    return _write_chunked(items, output_file, '', '')
+
+
+def write_pair_summaries(summaries, output_file):
+    """Write summaries of airport pairs as a CSV table with a header, see PairSummary.to_csv()
+
+    :param summaries: iterable of summaries to be written
+    :type summaries: iterable(PairSummary)
+    :param output_file: file-like object to write to
+    :return: number of summaries written
+    :rtype: int
+    """
+    output_file.write(PairSummary.CSV_HEADER)
+    items = (summary.to_csv() for summary in summaries)
+    return _write_chunked(items, output_file, '', '')
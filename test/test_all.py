@@ -19,9 +19,15 @@
 # ####################################################################
 
 import os
+import asyncio
+import io
+import datetime
 import pytest
 import json
-from kiwiflights import System
+from kiwiflights import System, Flight
+from kiwiflights.airport import Airport
+from kiwiflights.ranked_search import RankedSearch
+from kiwiflights.utils import dict2json, write_itineraries_json, write_itineraries_json_lines
 
 _TESTCASE_COUNT = 10
 _ERRORCASE_COUNT = 4
@@ -29,6 +35,16 @@ _TEST_INPUT_DIR = os.path.join('test', 'input')
 _TEST_OUTPUT_DIR = os.path.join('test', 'output')
 
 
+def _load_reference(input_file):
+    with open(os.path.join(_TEST_OUTPUT_DIR, input_file + ".json"), 'r') as f:
+        return json.load(f)['itineraries']
+
+
+def _sorted_itineraries(itineraries):
+    # some engines yield itineraries in different order, compare them regardless of order
+    return sorted(itineraries, key=lambda i: json.dumps(i, sort_keys=True))
+
+
 class TestSimple(object):
     @pytest.mark.parametrize("input_file",
                              ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
@@ -45,9 +61,1137 @@ class TestSimple(object):
         # we encapsulate list of itineraries to dict in CLI so dereference reference
         assert itineraries == reference['itineraries']
 
+    @pytest.mark.parametrize("input_file",
+                             ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
+    @pytest.mark.parametrize("pretty", [True, False])
+    def test_streaming_output(self, input_file, pretty):
+        with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
+            system = System.from_csv_file(f)
+
+        expected = dict2json({'itineraries': [i.to_dict() for i in system.compute_itineraries()]},
+                             pretty=pretty)
+
+        output = io.StringIO()
+        write_itineraries_json(system.iter_itineraries(), output, pretty=pretty)
+        assert output.getvalue() == expected + '\n'
+
+        output = io.StringIO()
+        write_itineraries_json_lines(system.iter_itineraries(), output)
+        assert [json.loads(line) for line in output.getvalue().splitlines()] == \
+            json.loads(expected)['itineraries']
+        assert output.getvalue() == ''.join(dict2json(i.to_dict(), pretty=False) + '\n'
+                                            for i in system.compute_itineraries())
+
+    @pytest.mark.parametrize("input_file",
+                             ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
+    @pytest.mark.parametrize("fast_backend", [True, False])
+    def test_itinerary_encoder(self, input_file, fast_backend, monkeypatch):
+        from kiwiflights import itinerary_encoder
+        from kiwiflights.itinerary_encoder import ItineraryEncoder
+
+        if not fast_backend:
+            monkeypatch.setattr(itinerary_encoder, 'orjson', None)
+            assert itinerary_encoder.get_json_backend() == 'json'
+
+        with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
+            system = System.from_csv_file(f)
+
+        for pretty in (True, False):
+            encoder = ItineraryEncoder(pretty=pretty)
+            for itinerary in system.iter_itineraries():
+                assert encoder.encode(itinerary) == dict2json(itinerary.to_dict(), pretty=pretty)
+
+    @pytest.mark.parametrize("fast_backend", [True, False])
+    def test_itinerary_encoder_escaping(self, fast_backend, monkeypatch):
+        from kiwiflights import itinerary_encoder
+
+        if not fast_backend:
+            monkeypatch.setattr(itinerary_encoder, 'orjson', None)
+
+        for string in ('PV755', 'Zürich', 'a"b\\c', 'tab\tnew\nline\x01\x7f', '/\u2028'):
+            assert itinerary_encoder.encode_string(string) == json.dumps(string)
+
+        for number in (0, 48, 48.0, 0.1, 1e16, 1e-7, -3.5, float('nan'), float('inf'), True):
+            assert itinerary_encoder.encode_number(number) == json.dumps(number)
+
+    def test_streaming_output_chunks(self, monkeypatch):
+        from kiwiflights import utils
+
+        monkeypatch.setattr(utils, '_CHUNK_SIZE', 3)
+
+        with open(os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv'), 'r') as f:
+            system = System.from_csv_file(f)
+
+        itineraries = system.compute_itineraries()
+        assert len(itineraries) > 3
+
+        for pretty in (True, False):
+            output = io.StringIO()
+            assert write_itineraries_json(itineraries, output, pretty=pretty) == len(itineraries)
+            expected = dict2json({'itineraries': [i.to_dict() for i in itineraries]}, pretty=pretty)
+            assert output.getvalue() == expected + '\n'
+
+    @pytest.mark.parametrize("input_file",
+                             ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
+    @pytest.mark.parametrize("columnar", [True, False])
+    def test_columnar_engine(self, input_file, columnar):
+        with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
+            system = System.from_csv_file(f, columnar=columnar)
+
+        if not columnar:
+            system.engine = System.ENGINE_COLUMNAR
+
+        itineraries = [i.to_dict() for i in system.compute_itineraries()]
+
+        with open(os.path.join(_TEST_OUTPUT_DIR, input_file + ".json"), 'r') as f:
+            reference = json.load(f)
+
+        assert itineraries == reference['itineraries']
+
+    @pytest.mark.parametrize("input_file",
+                             ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
+    @pytest.mark.parametrize("frontier_size", [None, 2])
+    def test_numpy_engine(self, input_file, frontier_size, monkeypatch):
+        pytest.importorskip('numpy')
+
+        if frontier_size is not None:
+            from kiwiflights.numpy_engine import NumpyEngine
+            monkeypatch.setattr(NumpyEngine, '_FRONTIER_SIZE', frontier_size)
+
+        with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
+            system = System.from_csv_file(f, columnar=True)
+
+        system.engine = System.ENGINE_NUMPY
+        itineraries = [i.to_dict() for i in system.compute_itineraries()]
+        assert _sorted_itineraries(itineraries) == _sorted_itineraries(_load_reference(input_file))
+
+    @pytest.mark.parametrize("input_file",
+                             ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
+    @pytest.mark.parametrize("cache_size", [None, 0, 3])
+    def test_suffix_engine(self, input_file, cache_size, monkeypatch):
+        from kiwiflights.suffix_engine import SuffixEngine
+        if cache_size is not None:
+            monkeypatch.setattr(SuffixEngine, '_CACHE_SIZE', cache_size)
+
+        with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
+            system = System.from_csv_file(f)
+
+        system.engine = System.ENGINE_SUFFIX
+        itineraries = [i.to_dict() for i in system.compute_itineraries()]
+        assert _sorted_itineraries(itineraries) == _sorted_itineraries(_load_reference(input_file))
+
+    @pytest.mark.parametrize("input_file",
+                             ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
+    @pytest.mark.parametrize("columnar", [True, False])
+    def test_time_expanded_engine(self, input_file, columnar):
+        with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
+            system = System.from_csv_file(f, columnar=columnar)
+
+        system.engine = System.ENGINE_TIME_EXPANDED
+        itineraries = [i.to_dict() for i in system.compute_itineraries()]
+        assert itineraries == _load_reference(input_file)
+
+    def test_time_expanded_graph(self):
+        with open(os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv'), 'r') as f:
+            system = System.from_csv_file(f)
+
+        system.engine = System.ENGINE_TIME_EXPANDED
+        graph = system.get_time_expanded_graph()
+        system.compute_itineraries()
+        assert system.get_time_expanded_graph() is graph
+
+        database = system.flight_database.to_columnar()
+        assert graph.flight_count == len(database)
+        assert len(graph.offsets) == len(database) + 1
+        assert graph.edge_count == graph.offsets[-1] == len(graph.targets)
+        assert graph.memory_usage() >= (len(graph.offsets) * graph.offsets.itemsize
+                                        + len(graph.targets) * graph.targets.itemsize)
+
+        min_wait = int(system.min_wait_time.total_seconds())
+        max_wait = int(system.max_wait_time.total_seconds())
+        for flight_id in range(len(database)):
+            arrival = database.arrival[flight_id]
+            expected = database.get_departures_within(database.destination[flight_id],
+                                                      arrival + min_wait, arrival + max_wait)
+            assert list(graph.get_next_flight_ids(flight_id)) == expected
+
+        # parameters the graph was built for
+        system.bags = 2
+        assert system.get_time_expanded_graph() is not graph
+        assert all(database.bags_allowed[f] >= 2 for f in system.get_time_expanded_graph().targets)
+        system.bags = 0
+        graph = system.get_time_expanded_graph()
+        system.max_wait_time = datetime.timedelta(hours=2)
+        assert system.get_time_expanded_graph() is not graph
+        graph = system.get_time_expanded_graph()
+        assert system.get_time_expanded_graph() is graph
+
+        # changes of flights
+        flight = system.flight_database.flights[0]
+        system.flight_database.unregister(flight.flight_number)
+        assert system.get_time_expanded_graph() is not graph
+        assert system.get_time_expanded_graph().flight_count == len(database) - 1
+
+        graph = system.get_time_expanded_graph()
+        system.flight_database.register(flight)
+        assert system.get_time_expanded_graph() is not graph
+
+        graph = system.get_time_expanded_graph()
+        updated = Flight(source=flight.source, destination=flight.destination,
+                         departure=flight.departure + datetime.timedelta(minutes=30),
+                         arrival=flight.arrival + datetime.timedelta(minutes=30),
+                         flight_number=flight.flight_number, price=flight.price,
+                         bags_allowed=flight.bags_allowed, bag_price=flight.bag_price)
+        system.flight_database.update(updated)
+        assert system.get_time_expanded_graph() is not graph
+
+    def test_time_expanded_graph_columnar_register(self):
+        with open(os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv'), 'r') as f:
+            system = System.from_csv_file(f, columnar=True)
+
+        graph = system.get_time_expanded_graph()
+        flight = system.flight_database.flights[0]
+        system.flight_database.register(Flight(
+            source=flight.destination, destination=flight.source,
+            departure=flight.arrival + datetime.timedelta(hours=2),
+            arrival=flight.arrival + datetime.timedelta(hours=3),
+            flight_number='NEW001', price=10, bags_allowed=1, bag_price=1))
+        assert system.get_time_expanded_graph() is not graph
+        assert system.get_time_expanded_graph().flight_count == graph.flight_count + 1
+
+    @pytest.mark.parametrize("input_file",
+                             ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
+    def test_parallel_search(self, input_file):
+        with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
+            system = System.from_csv_file(f)
+
+        itineraries = [i.to_dict() for i in system.compute_itineraries(jobs=2)]
+        assert _sorted_itineraries(itineraries) == _sorted_itineraries(_load_reference(input_file))
+
+    @pytest.mark.parametrize("input_file",
+                             ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
+    def test_search(self, input_file):
+        with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
+            system = System.from_csv_file(f)
+
+        all_itineraries = system.compute_itineraries()
+        if not all_itineraries:
+            return
+
+        times = sorted(f.departure for f in system.flight_database.flights)
+        middle = times[len(times) // 2]
+        codes = [a.code for a in system.airport_database.airports]
+
+        for source in codes:
+            for destination in codes:
+                for depart_after, arrive_before in ((None, None), (middle, None), (None, middle)):
+                    expected = [i.to_dict() for i in all_itineraries
+                                if i.flights_taken[0].source.code == source
+                                and i.flight.destination.code == destination
+                                and (depart_after is None
+                                     or i.flights_taken[0].departure >= depart_after)
+                                and (arrive_before is None or i.flight.arrival <= arrive_before)]
+                    found = system.search(source, destination,
+                                          depart_after=depart_after, arrive_before=arrive_before)
+                    assert [i.to_dict() for i in found] == expected
+
+    @pytest.mark.parametrize("input_file",
+                             ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
+    @pytest.mark.parametrize("key", RankedSearch.KEYS)
+    @pytest.mark.parametrize("bags", [0, 1, 2])
+    def test_best_itineraries(self, input_file, key, bags):
+        with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
+            system = System.from_csv_file(f)
+
+        search = RankedSearch(system, key=key, bags=bags)
+        expected = sorted(search.get_key(i) for i in system.compute_itineraries()
+                          if i.bags_allowed >= bags)
+
+        for count in (1, 3, len(expected) + 1):
+            assert [search.get_key(i) for i in system.best_itineraries(count, key=key, bags=bags)] \
+                == expected[:count]
+
+    @pytest.mark.parametrize("input_file",
+                             ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
+    @pytest.mark.parametrize("max_stops", [None, 1])
+    @pytest.mark.parametrize("bags", [0, 1])
+    def test_pareto_search(self, input_file, max_stops, bags):
+        from kiwiflights.pareto_search import ParetoSearch
+
+        with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
+            system = System.from_csv_file(f)
+
+        system.max_stops = max_stops
+        system.bags = bags
+
+        # filter dominated itineraries out of all itineraries
+        groups = {}
+        for itinerary in system.compute_itineraries():
+            key = (itinerary.flights_taken[0].source.code, itinerary.flight.destination.code,
+                   itinerary.flight.arrival)
+            groups.setdefault(key, []).append(itinerary)
+
+        expected = []
+        for group in groups.values():
+            for itinerary in group:
+                key = ParetoSearch.get_key(itinerary)
+                if not any(ParetoSearch.dominates(ParetoSearch.get_key(other), key)
+                           for other in group):
+                    expected.append(itinerary.to_dict())
+
+        found = [i.to_dict() for i in system.iter_pareto_itineraries()]
+        assert _sorted_itineraries(found) == _sorted_itineraries(expected)
+
+        codes = [a.code for a in system.airport_database.airports]
+        for source in codes[:3]:
+            for destination in codes[-3:]:
+                found = [i.to_dict() for i in system.iter_pareto_itineraries(source, destination)]
+                assert _sorted_itineraries(found) == _sorted_itineraries(
+                    [i for i in expected if i['source'] == source
+                     and i['destination'] == destination])
+
+    def test_pareto_search_prunes(self):
+        from kiwiflights.pareto_search import ParetoSearch
+
+        with open(os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv'), 'r') as f:
+            system = System.from_csv_file(f)
+
+        search = ParetoSearch(system)
+        found = list(search.iter_itineraries())
+        assert 0 < len(found) < len(system.compute_itineraries())
+        assert search.pruned > 0
+
+        assert ParetoSearch.dominates((10.0, 1, 60), (10.0, 1, 61))
+        assert ParetoSearch.dominates((10.0, 2, 60), (10.0, 1, 60))
+        assert not ParetoSearch.dominates((10.0, 1, 60), (10.0, 1, 60))
+        assert not ParetoSearch.dominates((9.0, 1, 61), (10.0, 1, 60))
+
+    @pytest.mark.parametrize("input_file",
+                             ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
+    @pytest.mark.parametrize("shard_count", [1, 3, 50])
+    def test_shards(self, input_file, shard_count, tmpdir):
+        from kiwiflights.sharding import ShardManifest
+
+        with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
+            system = System.from_csv_file(f)
+        system.max_stops = 2
+
+        directory = str(tmpdir.join('shards'))
+        ShardManifest.create(system, directory, shard_count)
+        manifest = ShardManifest.load(directory)
+        assert len(manifest.shards) == shard_count
+        assert sum(len(shard) for shard in manifest.shards) == \
+            len(system._get_initialized_stack())
+        assert manifest.max_stops == 2
+
+        assert manifest.get_missing_shards() == list(range(shard_count))
+        with pytest.raises(ValueError):
+            manifest.merge(io.StringIO())
+
+        worker_system = manifest.load_system()
+        for shard_id in range(shard_count):
+            manifest.run_shard(shard_id, system=worker_system)
+        assert manifest.get_missing_shards() == []
+
+        for pretty in (True, False):
+            output = io.StringIO()
+            expected = io.StringIO()
+            assert manifest.merge(output, pretty=pretty) == \
+                write_itineraries_json(system.iter_itineraries(), expected, pretty=pretty)
+            assert output.getvalue() == expected.getvalue()
+
+    def test_shards_run_local(self, tmpdir):
+        from kiwiflights.sharding import ShardManifest
+
+        with open(os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv'), 'r') as f:
+            system = System.from_csv_file(f)
+
+        manifest = ShardManifest.create(system, str(tmpdir), 4)
+        manifest.run_shard(1)
+        assert sorted(manifest.run_local(jobs=2)) == [0, 2, 3]
+        assert manifest.run_local(jobs=2) == []
+
+        output = io.StringIO()
+        expected = io.StringIO()
+        manifest.merge(output)
+        write_itineraries_json(system.iter_itineraries(), expected)
+        assert output.getvalue() == expected.getvalue()
+
+    def test_shards_invalid(self, tmpdir):
+        from kiwiflights.sharding import ShardManifest
+
+        with open(os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv'), 'r') as f:
+            system = System.from_csv_file(f)
+
+        with pytest.raises(ValueError):
+            ShardManifest.create(system, str(tmpdir), 0)
+
+        manifest = ShardManifest.create(system, str(tmpdir), 2)
+        with pytest.raises(IndexError):
+            manifest.run_shard(2)
+
+        for content in ('{', '{"version": 2}', '{"version": 1}'):
+            with open(manifest.path, 'w') as f:
+                f.write(content)
+            with pytest.raises(ValueError):
+                ShardManifest.load(manifest.path)
+
+    @staticmethod
+    async def _request(address, method, target):
+        reader, writer = await asyncio.open_connection(*address)
+        writer.write(('%s %s HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n'
+                      % (method, target)).encode('ascii'))
+        response = await reader.read()
+        writer.close()
+        head, _, body = response.partition(b'\r\n\r\n')
+        return int(head.split()[1]), json.loads(body.decode('utf-8'))
+
+    def test_server(self, tmpdir):
+        from kiwiflights.server import QueryServer
+
+        path = os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv')
+        with open(path, 'r') as f:
+            system = System.from_csv_file(f)
+        system.max_stops = 1
+        expected = io.StringIO()
+        write_itineraries_json(system.iter_search('BWN', 'HKT'), expected, pretty=False)
+        expected = json.loads(expected.getvalue())
+        assert expected['itineraries']
+
+        async def run():
+            server = QueryServer(inputs=[path], jobs=1)
+            address = await server.start()
+            try:
+                requests = [('GET', '/itineraries?source=BWN&destination=HKT&max_stops=1'),
+                            ('GET', '/itineraries?source=USM&destination=XXX'),
+                            ('GET', '/itineraries?source=USM&destination=HKT&bags=x'),
+                            ('GET', '/itineraries?source=USM'),
+                            ('GET', '/itineraries?source=USM&destination=HKT&bags=-1'),
+                            ('POST', '/itineraries?source=USM&destination=HKT'),
+                            ('GET', '/unknown'),
+                            ('GET', '/health')]
+                return await asyncio.gather(*[self._request(address, method, target)
+                                              for method, target in requests])
+            finally:
+                await server.close()
+
+        responses = asyncio.run(run())
+        assert responses[0] == (200, expected)
+        assert [status for status, _ in responses[1:-1]] == [404, 400, 400, 400, 405, 404]
+        assert responses[-1] == (200, {'flights': len(system.flight_database.flights),
+                                       'generation': 1})
+
+    def test_server_reload(self, tmpdir):
+        from kiwiflights.server import QueryServer
+
+        with open(os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv'), 'r') as f:
+            lines = f.readlines()
+        path = str(tmpdir.join('flights.csv'))
+        with open(path, 'w') as f:
+            f.writelines(lines[:11])
+
+        async def run():
+            server = QueryServer(inputs=[str(tmpdir)], jobs=1)
+            address = await server.start()
+            try:
+                assert server.flight_count == 10
+                assert not await server.reload_if_changed()
+
+                with open(path, 'w') as f:
+                    f.writelines(lines)
+                assert await server.reload_if_changed()
+                assert server.flight_count == len(lines) - 1
+                assert server.generation == 2
+
+                with open(path, 'a') as f:
+                    f.write('USM,HKT,invalid\n')
+                status, response = await self._request(address, 'POST', '/reload')
+                assert status == 500 and 'error' in response
+
+                status, response = await self._request(address, 'GET', '/health')
+                assert response == {'flights': len(lines) - 1, 'generation': 2}
+            finally:
+                await server.close()
+
+        asyncio.run(run())
+
+        with pytest.raises(ValueError):
+            QueryServer()
+
+    def test_result_cache(self):
+        from kiwiflights.result_cache import ResultCache
+
+        cache = ResultCache(max_entries=3, max_bytes=10)
+        assert cache.put('a', 1, ['AAA'], size=4)
+        assert cache.put('b', 2, ['AAA', 'BBB'], size=4)
+        assert cache.get('a') == 1
+        assert cache.get('c') is None
+        # 'b' is the least recently used one
+        assert cache.put('c', 3, ['CCC'], size=3)
+        assert 'b' not in cache and len(cache) == 2 and cache.size == 7
+        assert not cache.put('d', 4, ['DDD'], size=11)
+        assert cache.put('d', 4, ['DDD'], size=1)
+        assert cache.put('e', 5, ['EEE'], size=1)
+        assert 'a' not in cache and len(cache) == 3
+
+        assert cache.invalidate_airports(['AAA', 'DDD', 'EEE']) == 2
+        assert cache.to_dict() == {'entries': 1, 'size': 3, 'hits': 1, 'misses': 1,
+                                   'evictions': 2, 'invalidations': 2}
+
+        with pytest.raises(ValueError):
+            ResultCache(max_entries=0)
+
+    def test_result_cache_system(self):
+        from kiwiflights.result_cache import ResultCache
+        from kiwiflights.incremental_search import IncrementalSearch
+
+        with open(os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv'), 'r') as f:
+            system = System.from_csv_file(f)
+        system.result_cache = cache = ResultCache()
+
+        def search(cached=True):
+            result_cache = system.result_cache
+            system.result_cache = None if not cached else result_cache
+            try:
+                return [i.to_dict() for i in system.search('BWN', 'HKT')]
+            finally:
+                system.result_cache = result_cache
+
+        expected = search()
+        assert expected and search() == expected
+        system.max_stops = 0
+        assert search() == []
+        assert (cache.hits, cache.misses, len(cache)) == (1, 2, 2)
+
+        # flights between other airports do not invalidate results
+        source, destination = Airport('XXX'), Airport('YYY')
+        flight = Flight(source=source, destination=destination,
+                        departure=datetime.datetime(2017, 1, 1, 10),
+                        arrival=datetime.datetime(2017, 1, 1, 12),
+                        flight_number='XY001', price=10, bags_allowed=1, bag_price=1)
+        IncrementalSearch(system).apply(added=[flight])
+        assert len(cache) == 2
+
+        system.max_stops = None
+        removed = system.search('BWN', 'HKT')[0].flights_taken[-1]
+        assert cache.hits == 2
+        system.flight_database.unregister(removed.flight_number)
+        assert len(cache) == 0 and cache.invalidations == 2
+        assert search() == search(cached=False) != expected
+
+        system.flight_database.register(removed)
+        removed.source.register_flight(removed)
+        removed.destination.register_flight(removed)
+        assert len(cache) == 0
+        assert search() == expected
+
+        system.result_cache = None
+        system.flight_database.unregister(removed.flight_number)
+        assert len(cache) == 1
+
+    def test_server_cache(self, tmpdir):
+        from kiwiflights.server import QueryServer
+        from kiwiflights.result_cache import ResultCache
+
+        with open(os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv'), 'r') as f:
+            lines = f.readlines()
+        path = str(tmpdir.join('flights.csv'))
+        with open(path, 'w') as f:
+            f.writelines(lines)
+
+        target = '/itineraries?source=BWN&destination=HKT'
+        changed = [line for line in lines if line.startswith('DPS,HKT,')][0]
+
+        async def run():
+            server = QueryServer(inputs=[path], jobs=1, result_cache=ResultCache())
+            address = await server.start()
+            try:
+                expected = await self._request(address, 'GET', target)
+                assert await self._request(address, 'GET', target) == expected
+                assert server.result_cache.hits == 1
+
+                # flights between other airports do not invalidate responses
+                with open(path, 'a') as f:
+                    f.write('XXX,YYY,2017-02-11T06:25:00,2017-02-11T07:25:00,XY001,24,1,9\n')
+                await server.reload()
+                assert len(server.result_cache) == 1
+
+                with open(path, 'w') as f:
+                    f.writelines(line for line in lines if line is not changed)
+                await server.reload()
+                assert len(server.result_cache) == 0
+
+                status, response = await self._request(address, 'GET', '/health')
+                assert response['cache']['invalidations'] == 1
+                return expected
+            finally:
+                await server.close()
+
+        status, response = asyncio.run(run())
+        assert status == 200 and response['itineraries']
+
+    @pytest.mark.parametrize("input_file",
+                             ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
+    @pytest.mark.parametrize("max_stops,bags", [(None, 0), (0, 0), (1, 0), (2, 1), (3, 2)])
+    @pytest.mark.parametrize("columnar", [False, True])
+    def test_count_itineraries(self, input_file, max_stops, bags, columnar):
+        with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
+            system = System.from_csv_file(f, columnar=columnar)
+        system.max_stops = max_stops
+        system.bags = bags
+
+        expected = {}
+        for item in system.iter_itineraries():
+            flights = item.flights_taken
+            key = (flights[0].source.code, flights[-1].destination.code)
+            duration = int((flights[-1].arrival - flights[0].departure).total_seconds())
+            entry = expected.setdefault(key, [0, item.price, item.price, duration, duration])
+            entry[0] += 1
+            entry[1:] = [min(entry[1], item.price), max(entry[2], item.price),
+                         min(entry[3], duration), max(entry[4], duration)]
+
+        summaries = system.count_itineraries()
+        assert [(s.source, s.destination) for s in summaries] == sorted(expected)
+        assert {(s.source, s.destination): [s.count, s.min_price, s.max_price,
+                                            s.min_duration_seconds, s.max_duration_seconds]
+                for s in summaries} == expected
+
+    def test_write_pair_summaries(self):
+        from kiwiflights.utils import write_pair_summaries
+
+        with open(os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv'), 'r') as f:
+            system = System.from_csv_file(f)
+
+        output = io.StringIO()
+        assert write_pair_summaries(system.count_itineraries(), output) == 3
+        assert output.getvalue() == \
+            'source,destination,count,min_price,max_price,min_duration,max_duration\n' \
+            'BWN,HKT,3,126.0,135.0,7:20:00,9:55:00\n' \
+            'BWN,USM,3,148.0,159.0,11:05:00,14:05:00\n' \
+            'DPS,USM,6,89.0,111.0,7:05:00,8:30:00\n'
+
+    @staticmethod
+    def _get_journeys(system, source, destination, depart_after=None):
+        """Departures and arrivals of direct flights and itineraries from source to destination"""
+        ret = [(f.departure, f.arrival)
+               for f in system.airport_database.get_airport(source).departures
+               if f.destination.code == destination and f.bags_allowed >= system.bags
+               and (depart_after is None or f.departure >= depart_after)]
+        ret.extend((i.flights_taken[0].departure, i.flight.arrival)
+                   for i in system.iter_search(source, destination, depart_after=depart_after))
+        return ret
+
+    @staticmethod
+    def _assert_journey(system, item, source, destination, depart_after=None):
+        flights = item.flights_taken
+        assert flights[0].source.code == source and flights[-1].destination.code == destination
+        assert depart_after is None or flights[0].departure >= depart_after
+        assert system.max_stops is None or len(flights) <= system.max_stops + 1
+        assert all(f.bags_allowed >= system.bags for f in flights)
+        for flight, next_flight in zip(flights, flights[1:]):
+            assert flight.destination is next_flight.source
+            assert system._inside_wait_window(flight, next_flight)
+        # the cycle rule is not enforced, such journeys are not found by itinerary search
+        return len(set(f.segment for f in flights)) == len(flights)
+
+    @pytest.mark.parametrize("input_file",
+                             ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
+    @pytest.mark.parametrize("max_stops,bags", [(None, 0), (0, 0), (1, 0), (2, 1)])
+    def test_connection_scan(self, input_file, max_stops, bags):
+        with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
+            system = System.from_csv_file(f)
+        system.max_stops = max_stops
+        system.bags = bags
+
+        codes = sorted(airport.code for airport in system.airport_database.airports)
+        for source, destination in ((s, d) for s in codes for d in codes if s != d):
+            journeys = self._get_journeys(system, source, destination)
+            departures = sorted(set(departure for departure, _ in journeys))
+            depart_after = departures[len(departures) // 2] if departures else None
+
+            for after in (None, depart_after):
+                item = system.earliest_arrival(source, destination, depart_after=after)
+                arrivals = [a for d, a in journeys if after is None or d >= after]
+                if item is None:
+                    assert not arrivals
+                    continue
+                if self._assert_journey(system, item, source, destination, after):
+                    assert item.flight.arrival == min(arrivals)
+                else:
+                    assert item.flight.arrival <= min(arrivals)
+
+            profile = system.profile(source, destination)
+            points = [(i.flights_taken[0].departure, i.flight.arrival) for i in profile]
+            assert points == sorted(points)
+            if all([self._assert_journey(system, i, source, destination) for i in profile]):
+                assert points == sorted(set(
+                    p for p in journeys
+                    if not any(q[0] >= p[0] and q[1] <= p[1] and q != p for q in journeys)))
+
+    def test_connection_scan_reuse(self):
+        with open(os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv'), 'r') as f:
+            system = System.from_csv_file(f)
+
+        connection_scan = system.get_connection_scan()
+        assert system.get_connection_scan() is connection_scan
+        departures = list(connection_scan.departures)
+        assert departures == sorted(departures) and len(departures) == 42
+
+        item = system.earliest_arrival('BWN', 'USM')
+        assert item.flights_taken[-1] is system.flight_database.get_flight(
+            item.flights_taken[-1].flight_number)
+        last_departure = max(f.departure for f in system.flight_database.flights)
+        assert system.profile('BWN', 'USM', depart_after=last_departure) == []
+        assert system.earliest_arrival('BWN', 'BWN') is None
+
+        flight = Flight(source=system.airport_database.get_airport('BWN'),
+                        destination=system.airport_database.get_airport('USM'),
+                        departure=datetime.datetime(2017, 1, 1, 10),
+                        arrival=datetime.datetime(2017, 1, 1, 12),
+                        flight_number='BU001', price=10, bags_allowed=1, bag_price=1)
+        system.flight_database.register(flight)
+        flight.source.register_flight(flight)
+        flight.destination.register_flight(flight)
+        assert system.get_connection_scan() is not connection_scan
+        assert system.earliest_arrival('BWN', 'USM').flight is flight
+
+        with pytest.raises(KeyError):
+            system.profile('BWN', 'XXX')
+
+    @pytest.mark.parametrize("input_file",
+                             ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
+    @pytest.mark.parametrize("engine", System.get_engines() + ['parallel'])
+    @pytest.mark.parametrize("max_stops,bags,min_wait,max_wait", [
+        (0, 0, 1, 4),
+        (1, 0, 1, 4),
+        (None, 1, 1, 4),
+        (1, 2, 1, 4),
+        (None, 0, 1, 2),
+        (None, 0, 2, 4),
+    ])
+    def test_search_parameters(self, input_file, engine, max_stops, bags, min_wait, max_wait):
+        if engine == System.ENGINE_NUMPY:
+            pytest.importorskip('numpy')
+
+        with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
+            system = System.from_csv_file(f)
+
+        min_wait_time = datetime.timedelta(hours=min_wait)
+        max_wait_time = datetime.timedelta(hours=max_wait)
+
+        def is_expected(itinerary):
+            flights = itinerary.flights_taken
+            return (max_stops is None or len(flights) - 1 <= max_stops) \
+                and itinerary.bags_allowed >= bags \
+                and all(min_wait_time <= n.departure - p.arrival <= max_wait_time
+                        for p, n in zip(flights, flights[1:]))
+
+        # the default wait window is the widest one used, all the other results are its subset
+        expected = [i.to_dict() for i in system.compute_itineraries() if is_expected(i)]
+
+        system.min_wait_time = min_wait_time
+        system.max_wait_time = max_wait_time
+        system.max_stops = max_stops
+        system.bags = bags
+
+        if engine == 'parallel':
+            found = [i.to_dict() for i in system.compute_itineraries(jobs=2)]
+        else:
+            system.engine = engine
+            found = [i.to_dict() for i in system.compute_itineraries()]
+
+        if engine in (System.ENGINE_DFS, System.ENGINE_COLUMNAR):
+            assert found == expected
+        else:
+            assert _sorted_itineraries(found) == _sorted_itineraries(expected)
+
+    @pytest.mark.parametrize("input_file",
+                             ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
+    @pytest.mark.parametrize("bags", [0, 1])
+    def test_search_stats(self, input_file, bags):
+        from kiwiflights.search_stats import SearchStats
+
+        with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
+            system = System.from_csv_file(f)
+
+        system.bags = bags
+        expected = [i.to_dict() for i in system.compute_itineraries()]
+
+        stats = system.stats = SearchStats(fan_out=True)
+        itineraries = [i.to_dict() for i in stats.iter_timed('search', system.iter_itineraries())]
+        assert itineraries == expected
+
+        # every itinerary including the seeds is expanded once
+        seeds = sum(1 for a in system.airport_database.airports for f in a.departures
+                    if f.bags_allowed >= bags)
+        assert stats.nodes_expanded == seeds + len(itineraries)
+        assert stats.candidates == len(itineraries) + stats.rejected_by_cycle \
+            + stats.rejected_by_bags
+        assert stats.rejected_by_stops == 0
+        assert sum(sum(h.values()) for h in stats.fan_out.values()) == stats.nodes_expanded
+        assert sum(k * v for h in stats.fan_out.values() for k, v in h.items()) == len(itineraries)
+        assert stats.max_stack_depth <= seeds + len(itineraries)
+        assert stats.timers['search'] >= 0
+        assert set(stats.to_dict()) >= {'nodes_expanded', 'timers', 'fan_out'}
+
+    def test_search_parameters_invalid(self):
+        for parameters in ({'min_wait_time': datetime.timedelta(hours=-1)},
+                           {'min_wait_time': datetime.timedelta(hours=5)},
+                           {'max_stops': -1},
+                           {'bags': -1}):
+            with pytest.raises(ValueError):
+                System(**parameters)
+
+        system = System()
+        system.max_wait_time = datetime.timedelta(0)
+        with pytest.raises(ValueError):
+            system.compute_itineraries()
+
+    @pytest.mark.parametrize("input_file",
+                             ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
+    @pytest.mark.parametrize("columnar", [True, False])
+    def test_snapshot(self, input_file, columnar, tmpdir):
+        with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
+            System.from_csv_file(f, columnar=columnar).save_snapshot(str(tmpdir.join('snapshot')))
+
+        system = System.load_snapshot(str(tmpdir.join('snapshot')), columnar=columnar)
+        assert system.is_columnar() == columnar
+
+        itineraries = [i.to_dict() for i in system.compute_itineraries()]
+        assert itineraries == _load_reference(input_file)
+
+    def test_snapshot_invalid(self, tmpdir):
+        path = str(tmpdir.join('snapshot'))
+        with open(os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv'), 'r') as f:
+            System.from_csv_file(f).save_snapshot(path)
+
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        for corrupted in (data[:-1], b'X' + data[1:], data[:16]):
+            with open(path, 'wb') as f:
+                f.write(corrupted)
+            with pytest.raises(ValueError):
+                System.load_snapshot(path)
+
     @pytest.mark.parametrize("input_file",
                              ["errorcase_%02d.csv" % i for i in range(1, _ERRORCASE_COUNT + 1)])
-    def test_errorcase(self, input_file):
+    @pytest.mark.parametrize("columnar", [True, False])
+    def test_errorcase(self, input_file, columnar):
         with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
             with pytest.raises(ValueError):
-                System.from_csv_file(f)
+                System.from_csv_file(f, columnar=columnar)
+
+
+    @staticmethod
+    def _split_csv(input_file, tmpdir, parts):
+        with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
+            header = f.readline()
+            lines = f.readlines()
+
+        paths = []
+        for part in range(parts):
+            path = str(tmpdir.join('part_%02d.csv' % part))
+            with open(path, 'w') as f:
+                f.write(header + ''.join(lines[part::parts]))
+            paths.append(path)
+
+        return paths
+
+    @pytest.mark.parametrize("input_file",
+                             ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
+    @pytest.mark.parametrize("jobs", [1, 2])
+    @pytest.mark.parametrize("columnar", [True, False])
+    def test_csv_files(self, input_file, jobs, columnar, tmpdir):
+        paths = self._split_csv(input_file, tmpdir, 3)
+        # the same flights in the same order as if files were concatenated
+        expected = []
+        for path in paths:
+            with open(path, 'r') as f:
+                flights = System.from_csv_file(f).flight_database.flights
+            expected.extend(flight.to_dict() for flight in flights)
+
+        for source in (paths, str(tmpdir), str(tmpdir.join('part_*.csv'))):
+            system = System.from_csv_files(source, columnar=columnar, jobs=jobs)
+            assert [f.to_dict() for f in system.flight_database.flights] == expected
+            itineraries = [i.to_dict() for i in system.compute_itineraries()]
+            assert _sorted_itineraries(itineraries) == \
+                _sorted_itineraries(_load_reference(input_file))
+
+    @pytest.mark.parametrize("jobs", [1, 2])
+    def test_csv_files_duplicate(self, jobs, tmpdir):
+        paths = self._split_csv('testcase_01.csv', tmpdir, 2)
+        with open(paths[0], 'r') as f:
+            flight_number = System.from_csv_file(f).flight_database.flights[0].flight_number
+
+        with pytest.raises(ValueError) as exc_info:
+            System.from_csv_files(paths + [paths[0]], jobs=jobs)
+        assert str(exc_info.value) == "Flight with number '%s' is already in database" \
+            % flight_number
+
+        with pytest.raises(ValueError):
+            System.from_csv_files(str(tmpdir.join('*.json')), jobs=jobs)
+
+    def test_load_csv_file(self, tmpdir):
+        paths = self._split_csv('testcase_01.csv', tmpdir, 2)
+
+        system = System()
+        for path in paths:
+            with open(path, 'r') as f:
+                row_count = len(f.readlines()) - 1
+            with open(path, 'r') as f:
+                assert system.load_csv_file(f) == row_count
+
+        with open(os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv'), 'r') as f:
+            reference = System.from_csv_file(f)
+
+        assert len(system.flight_database.flights) == len(reference.flight_database.flights)
+        assert sorted(a.code for a in system.airport_database.airports) == \
+            sorted(a.code for a in reference.airport_database.airports)
+        itineraries = [i.to_dict() for i in system.compute_itineraries()]
+        assert _sorted_itineraries(itineraries) == \
+            _sorted_itineraries(_load_reference('testcase_01.csv'))
+
+
+class TestIncrementalSearch(object):
+    @staticmethod
+    def _assert_consistent(search):
+        # a fresh computation has to give the same itineraries
+        expected = [i.to_dict() for i in search.system.compute_itineraries()]
+        assert _sorted_itineraries([i.to_dict() for i in search.itineraries]) == \
+            _sorted_itineraries(expected)
+
+    @pytest.mark.parametrize("input_file",
+                             ["testcase_%02d.csv" % i for i in range(1, _TESTCASE_COUNT + 1)])
+    def test_apply(self, input_file):
+        from kiwiflights.incremental_search import IncrementalSearch
+
+        with open(os.path.join(_TEST_INPUT_DIR, input_file), 'r') as f:
+            system = System.from_csv_file(f)
+
+        search = IncrementalSearch(system)
+        self._assert_consistent(search)
+
+        flights = list(system.flight_database.flights)
+        if not flights:
+            return
+
+        for flight in flights[::3]:
+            search.apply(removed=[flight.flight_number])
+            self._assert_consistent(search)
+
+            search.apply(added=[flight])
+            self._assert_consistent(search)
+
+        for flight in flights[::2]:
+            updated = Flight(source=flight.source, destination=flight.destination,
+                             departure=flight.departure + datetime.timedelta(minutes=45),
+                             arrival=flight.arrival + datetime.timedelta(minutes=45),
+                             flight_number=flight.flight_number, price=flight.price + 1,
+                             bags_allowed=flight.bags_allowed, bag_price=flight.bag_price)
+            added, removed = search.apply(updated=[updated])
+            assert all(any(f is updated for f in i.flights_taken) for i in added)
+            assert all(any(f is flight for f in i.flights_taken) for i in removed)
+            self._assert_consistent(search)
+
+        airport = Airport('NEW')
+        new_flight = Flight(source=flights[0].destination, destination=airport,
+                            departure=flights[0].arrival + datetime.timedelta(hours=2),
+                            arrival=flights[0].arrival + datetime.timedelta(hours=3),
+                            flight_number='NEW001', price=10, bags_allowed=1, bag_price=1)
+        search.apply(added=[new_flight])
+        self._assert_consistent(search)
+        assert system.airport_database.get_airport('NEW') is airport
+
+    def test_apply_invalid(self):
+        from kiwiflights.incremental_search import IncrementalSearch
+
+        with open(os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv'), 'r') as f:
+            system = System.from_csv_file(f)
+
+        search = IncrementalSearch(system)
+        flight = system.flight_database.flights[0]
+        count = len(search)
+
+        with pytest.raises(KeyError):
+            search.apply(removed=[flight.flight_number, 'UNKNOWN'])
+        with pytest.raises(ValueError):
+            search.apply(added=[flight])
+
+        other = system.flight_database.flights[1]
+        same_airport = Flight(source=other.source, destination=other.source,
+                              departure=other.departure, arrival=other.arrival,
+                              flight_number=other.flight_number, price=other.price,
+                              bags_allowed=other.bags_allowed, bag_price=other.bag_price)
+        with pytest.raises(ValueError):
+            search.apply(removed=[flight.flight_number], updated=[same_airport])
+        with pytest.raises(ValueError):
+            search.apply(removed=[flight.flight_number, flight.flight_number])
+        with pytest.raises(ValueError):
+            search.apply(removed=[flight.flight_number], updated=[flight])
+
+        flight_count = len(system.flight_database.flights)
+        assert system.flight_database.get_flight(flight.flight_number) is flight
+        assert system.flight_database.get_flight(other.flight_number) is other
+        assert len(search) == count
+        self._assert_consistent(search)
+
+        search.apply(removed=[flight.flight_number])
+        assert len(system.flight_database.flights) == flight_count - 1
+
+
+class TestAirport(object):
+    def test_departures_within(self):
+        source = Airport('USM')
+        destination = Airport('HKT')
+        base = datetime.datetime(2017, 2, 11)
+
+        flights = []
+        for idx, hour in enumerate((9, 3, 6, 4, 12)):
+            flight = Flight(source=source,
+                            destination=destination,
+                            departure=base + datetime.timedelta(hours=hour),
+                            arrival=base + datetime.timedelta(hours=hour + 1),
+                            flight_number='PV%d' % idx,
+                            price=1.0,
+                            bags_allowed=1,
+                            bag_price=1.0)
+            source.register_flight(flight)
+            flights.append(flight)
+
+        departures = source.get_departures_within(base + datetime.timedelta(hours=4),
+                                                  base + datetime.timedelta(hours=9))
+        # boundaries are included, registration order is kept
+        assert departures == [flights[0], flights[2], flights[3]]
+        assert source.get_departures_within(base, base + datetime.timedelta(hours=2)) == []
+        assert source.get_departures_within(None, base + datetime.timedelta(hours=4)) == \
+            [flights[1], flights[3]]
+
+    def test_unregister_and_update(self):
+        from kiwiflights import FlightDatabase
+
+        source = Airport('USM')
+        destination = Airport('HKT')
+        base = datetime.datetime(2017, 2, 11)
+        database = FlightDatabase()
+
+        flights = []
+        for idx, hour in enumerate((9, 3, 6)):
+            flight = Flight(source=source,
+                            destination=destination,
+                            departure=base + datetime.timedelta(hours=hour),
+                            arrival=base + datetime.timedelta(hours=hour + 1),
+                            flight_number='PV%d' % idx,
+                            price=1.0,
+                            bags_allowed=1,
+                            bag_price=1.0)
+            database.register(flight)
+            source.register_flight(flight)
+            destination.register_flight(flight)
+            flights.append(flight)
+
+        # boundaries are included, registration order is kept
+        assert destination.get_arrivals_within(base + datetime.timedelta(hours=5),
+                                               base + datetime.timedelta(hours=10)) \
+            == [flights[0], flights[2]]
+
+        assert database.unregister('PV2') is flights[2]
+        assert source.departures == flights[:2]
+        assert destination.get_arrivals_within(base, base + datetime.timedelta(hours=10)) \
+            == flights[:2]
+        with pytest.raises(KeyError):
+            database.unregister('PV2')
+
+        # same airports - position is kept
+        updated = Flight(source=source, destination=destination,
+                         departure=base + datetime.timedelta(hours=1),
+                         arrival=base + datetime.timedelta(hours=2), flight_number='PV0',
+                         price=2.0, bags_allowed=1, bag_price=1.0)
+        assert database.update(updated) is flights[0]
+        assert source.departures == [updated, flights[1]]
+        assert source.get_departures_within(base, base + datetime.timedelta(hours=2)) == [updated]
+
+        # reversed direction - flight is moved between departures and arrivals
+        reversed_flight = Flight(source=destination, destination=source,
+                                 departure=base + datetime.timedelta(hours=5),
+                                 arrival=base + datetime.timedelta(hours=6), flight_number='PV1',
+                                 price=2.0, bags_allowed=1, bag_price=1.0)
+        database.update(reversed_flight)
+        assert source.departures == [updated]
+        assert source.arrivals == [reversed_flight]
+        assert destination.departures == [reversed_flight]
+        assert destination.arrivals == [updated]
+        assert database.flights == [updated, reversed_flight]
+
+
+class TestColumnarFlightDatabase(object):
+    def test_flight_views(self):
+        with open(os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv'), 'r') as f:
+            system = System.from_csv_file(f)
+
+        database = system.flight_database.to_columnar()
+        assert len(database.flights) == len(system.flight_database.flights)
+        assert [f.to_dict() for f in database.flights] == \
+            [f.to_dict() for f in system.flight_database.flights]
+        assert database.flights[-1].flight_number == \
+            system.flight_database.flights[-1].flight_number
+        assert database.flights[0].segment == system.flight_database.flights[0].segment
+
+    def test_dfs_engine_rejected(self):
+        with open(os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv'), 'r') as f:
+            system = System.from_csv_file(f, columnar=True)
+
+        with pytest.raises(ValueError):
+            system.engine = System.ENGINE_DFS
+
+        with pytest.raises(ValueError):
+            System(flight_database=system.flight_database, engine=System.ENGINE_DFS)
+
+
+class TestItinerary(object):
+    def test_flights_registered_to_airports_only(self):
+        base = datetime.datetime(2017, 2, 11)
+        system = System()
+        airports = [system.airport_database.get_airport_or_create(code)
+                    for code in ('USM', 'HKT', 'USM')]
+
+        for idx, (source, destination) in enumerate(zip(airports, airports[1:])):
+            flight = Flight(source=source,
+                            destination=destination,
+                            departure=base + datetime.timedelta(hours=3 * idx),
+                            arrival=base + datetime.timedelta(hours=3 * idx + 1),
+                            flight_number='PV%d' % idx,
+                            price=1.0,
+                            bags_allowed=1,
+                            bag_price=1.0)
+            source.register_flight(flight)
+            destination.register_flight(flight)
+
+        # USM -> HKT -> USM flies twice on the same segment
+        assert system.compute_itineraries() == []
+
+    def test_segments_seen(self):
+        with open(os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv'), 'r') as f:
+            system = System.from_csv_file(f)
+
+        itinerary = system.compute_itineraries()[0]
+        assert itinerary.segments_seen == {
+            frozenset((f.source, f.destination)): True for f in itinerary.flights_taken
+        }
+
+    def test_aggregates(self):
+        with open(os.path.join(_TEST_INPUT_DIR, 'testcase_01.csv'), 'r') as f:
+            system = System.from_csv_file(f)
+
+        for itinerary in system.compute_itineraries():
+            assert not hasattr(itinerary, '__dict__')
+
+            flights = itinerary.flights_taken
+            assert itinerary.total_flight_duration == \
+                sum((f.arrival - f.departure for f in flights), datetime.timedelta(0))
+            assert itinerary.total_wait_time == sum((n.departure - p.arrival
+                                                     for p, n in zip(flights, flights[1:])),
+                                                    datetime.timedelta(0))
+            assert itinerary.total_flight_seconds == \
+                itinerary.total_flight_duration.total_seconds()
+            assert itinerary.total_wait_seconds == itinerary.total_wait_time.total_seconds()